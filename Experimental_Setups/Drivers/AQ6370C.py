@@ -14,6 +14,7 @@ Provides support for the Yokogawa 6370 optical spectrum analyzer.
 
 
 from enum import IntEnum, Enum
+import time
 
 #from instruments.units import ureg as u
 
@@ -311,6 +312,24 @@ class Yokogawa6370(OpticalSpectrumAnalyzer):
         """
         self.sendcmd("*CLS;:init")
 
+    def wait_for_sweep(self, timeout=600, period=0.05, max_period=1.0):
+        """
+        Block until the sweep started by `start_sweep` has finished.
+
+        Polls bit 0 (sweep finished) of the operation event register,
+        starting at `period` seconds between reads and doubling up to
+        `max_period`. Note that reading the register clears it.
+
+        :return: True if the sweep finished within `timeout` seconds.
+        """
+        start = time.time()
+        while time.time() - start < timeout:
+            if int(self.operation_event) & 1:
+                return True
+            time.sleep(period)
+            period = min(2 * period, max_period)
+        return False
+
     def abort(self):
         """Abort a running sweep or calibration etc."""
         self.sendcmd(":ABORT")
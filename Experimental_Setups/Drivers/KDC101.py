@@ -19,8 +19,11 @@ from pylablib.devices import Thorlabs # pip install --user pylablib
 # pip install --upgrade pylablib
 from pylablib.core.utils import strpack
 import time
-import math
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import get_logger
+
+log = get_logger('KDC101')
 
 # you will need to download and install Thorlabs APT software if you do not already have it
 # after installation of APT, open anaconda prompt and execute the following command
@@ -30,12 +33,19 @@ from datetime import datetime
 
 
 class KDC101():
-    def __init__(self, indx):
-        self.SN = Thorlabs.list_kinesis_devices()[indx][0]
-        self.Description = Thorlabs.list_kinesis_devices()[indx][1]
-        # self.obj = Thorlabs.kinesis.KinesisDevice(self.SN)
-        self.obj = Thorlabs.kinesis.KinesisMotor(self.SN)
+    def __init__(self, indx, device=None):
+        if device is not None:
+            # e.g. simulators.SimulatedKinesisMotor
+            self.SN = device.SN
+            self.Description = device.Description
+            self.obj = device
+        else:
+            self.SN = Thorlabs.list_kinesis_devices()[indx][0]
+            self.Description = Thorlabs.list_kinesis_devices()[indx][1]
+            # self.obj = Thorlabs.kinesis.KinesisDevice(self.SN)
+            self.obj = Thorlabs.kinesis.KinesisMotor(self.SN)
         self.ManualURL = 'https://www.thorlabs.com/software/apt/APT_Communications_Protocol_Rev_15.pdf'
+        self.mover = ThreadPoolExecutor(max_workers=1) # runs move_async() requests in order
 
     
     def SetStageModel(self, StageModelStr):
@@ -43,50 +53,42 @@ class KDC101():
         self.Stage = StageModelStr
         if self.Stage.startswith('PRMT') == True:
             self.ScalingFactor = 1919.6418578623391
-            now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            print('{}   |   <SET SCALING>'.format(now))
-            print('<< Scaling factor set to {} >>'.format(self.ScalingFactor))
+            log.debug('<SET SCALING>')
+            log.debug('<< Scaling factor set to %s >>', self.ScalingFactor)
         if self.Stage.startswith('PRM1') == True:
             self.ScalingFactor = 1919.6418578623391
-            now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            print('{}   |   <SET SCALING>'.format(now))
-            print('<< Scaling factor set to {} >>'.format(self.ScalingFactor))
+            log.debug('<SET SCALING>')
+            log.debug('<< Scaling factor set to %s >>', self.ScalingFactor)
         if self.Stage.startswith('Z8') == True:
             self.ScalingFactor = 34304.10969
-            now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            print('{}   |   <SET SCALING>'.format(now))
-            print('<< Scaling factor set to {} >>'.format(self.ScalingFactor))            
+            log.debug('<SET SCALING>')
+            log.debug('<< Scaling factor set to %s >>', self.ScalingFactor)
         #elif, else for other stages
         else:
-            print('<< WARNING: Scaling factor was not automatically set. >>')
+            log.warning('<< WARNING: Scaling factor was not automatically set. >>')
             
     def debug(self, hexcmd):
-         now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-         print('{}   |   <DEBUGGING>'.format(now))     
-         self.obj.send_comm(hexcmd, 0x01)
-         data = self.obj.recv_comm().data
+         log.debug('<DEBUGGING>')
+         # APT replies to a MGMSG_..._REQ with the next message ID (..._GET)
+         data = self.request(hexcmd, hexcmd + 1).data
          return strpack.unpack_uint(data[2:6],"<")
     
     def GetInfo(self):
-         now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-         print('{}   |   <GET INFO>'.format(now))
+         log.debug('<GET INFO>')
          tmp = self.obj.get_device_info()
          return tmp
          
     def GetInfoDetailed(self):
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET FULL INFO>'.format(now))
+        log.debug('<GET FULL INFO>')
         tmp = self.obj.get_full_info()
         return tmp
         
     def BlinkScreen(self):
         self.obj.blink()
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <BLINK SCREEN>'.format(now))
+        log.debug('<BLINK SCREEN>')
  
     def GetScale(self):
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET SCALE>'.format(now))
+        log.debug('<GET SCALE>')
         tmp = self.obj._get_scale()
         #(position velociy acceleration)
         return tmp
@@ -98,8 +100,7 @@ class KDC101():
 
         For details, see APT communications protocol.
         """
-        self.obj.send_comm(0x0429,0x01)
-        data=self.obj.recv_comm().data
+        data = self.request(0x0429, 0x042A).data
         return strpack.unpack_uint(data[2:6],"<")
 
     status_bits=[(1<<0,"sw_bk_lim"),(1<<1,"sw_fw_lim"),
@@ -118,17 +119,16 @@ class KDC101():
         """
         status_n=self.get_status_n()
         
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET STATUS>'.format(now))
+        log.debug('<GET STATUS>')
         return [s for (m,s) in self.status_bits if status_n&m]
     
     def is_homed(self):
         tmp = self.GetStatus()
         res = 'homed' in tmp
         if res == True:
-            print('<< Stage is homed. >>')
+            log.debug('<< Stage is homed. >>')
         else: 
-            print('<< Stage is NOT homed. >>')
+            log.debug('<< Stage is NOT homed. >>')
         return res
     
     def is_moving(self):
@@ -138,16 +138,16 @@ class KDC101():
         res_fw = 'moving_fw' in tmp
         res_bk = 'moving_bk' in tmp
         if res_fw == True:
-            print('<< Stage is moving Forward. >>')
+            log.debug('<< Stage is moving Forward. >>')
             return True
         elif res_bk == True:
-            print('<< Stage is moving Backward. >>')
+            log.debug('<< Stage is moving Backward. >>')
             return True
         elif res_bk | res_fw == False:
-            print(' << Stage is NOT moving. >>')
+            log.debug(' << Stage is NOT moving. >>')
             return False
         else:
-            print(' << Error: Check code at is_moving(). >>')
+            log.error(' << Error: Check code at is_moving(). >>')
             
         
     def wait_for_status(self, status, Timeout = 60, Period = 5):
@@ -170,7 +170,7 @@ class KDC101():
                 flag = 1
                 elapsed = time.time()-start
                 time.sleep(Period)
-        print('<< Time elapsed is {:.3f} seconds.'.format(elapsed))
+        log.debug('<< Time elapsed is %.3f seconds.', elapsed)
         
         
     def Dev_GetPosition_APT(self):
@@ -183,16 +183,13 @@ class KDC101():
                 flag = self.is_moving()
                 count = count + 1
 
-        self.obj.send_comm(0x0411, 0x01)
-        msg = self.obj.recv_comm()
-        data = msg.data
+        data = self.request(0x0411, 0x0412).data
         return strpack.unpack_int(data[2:6], "<")
     
     def GetPosition(self):
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET POSITION>'.format(now))       
+        log.debug('<GET POSITION>')
         res = self.Dev_GetPosition_APT()/self.ScalingFactor
-        print('<< Current Position is {:.4f} >>'.format(res))
+        log.debug('<< Current Position is %.4f >>', res)
         return res
         
     def StepFwd(self, stepsize=1):
@@ -208,51 +205,99 @@ class KDC101():
         self.obj.send_comm(0x0443,0x01)
         self.wait_for_status(Status, timeout, period)
         
-    def Dev_SetPosition_APT(self, position, Status='homed', period=1):
-        # move to a given position.
-        if self.ScalingFactor != 1919.6418578623391:
-            Status = 'enabled'
-        self.obj.send_comm_data(0x0453,b'\x01\x00'+strpack.pack_int(int(position),4,'<'))
-        self.wait_for_status(Status, Period = period)
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET POSITION>'.format(now))
-        time.sleep(3)
-        pos = self.GetPosition()
-        flag = math.isclose(float(pos), float(position)/self.ScalingFactor, abs_tol = 0.01)
-        if  flag == True:
-            print('<< Position is properly set. >>')
-            print('<< Current position is {:.4f}'.format(pos))
+    def recv_until(self, messageIDs, timeout=60):
+        # Read messages until one of messageIDs arrives. Unsolicited messages
+        # such as MOT_MOVE_COMPLETED would otherwise be taken as the reply to
+        # the next request.
+        start = time.time()
+        while time.time() - start < timeout:
+            try:
+                msg = self.obj.recv_comm()
+            except Thorlabs.ThorlabsError:
+                continue
+            if msg.messageID in messageIDs:
+                return msg
+        return None
+
+    def request(self, messageID, replyID, timeout=5):
+        # Send a request and return its reply, skipping unsolicited messages.
+        self.obj.send_comm(messageID, 0x01)
+        msg = self.recv_until([replyID], timeout)
+        if msg is None:
+            raise TimeoutError('KDC101 {}: no reply 0x{:04X} to 0x{:04X} within {} s'.format(
+                self.SN, replyID, messageID, timeout))
+        return msg
+
+    def get_position_n(self):
+        """
+        Get position in APT units without waiting for the stage to stop.
+        Raises TimeoutError if the controller does not answer.
+        """
+        return strpack.unpack_int(self.request(0x0411, 0x0412).data[2:6], "<")
+
+    def wait_for_move(self, position, tol, timeout=60, wait='message', period=0.02):
+        """
+        Wait for a move to `position` (APT units) to finish.
+
+        With ``wait='message'`` this blocks on the MOT_MOVE_COMPLETED (0x0464)
+        message the controller sends at the end of the move. With
+        ``wait='poll'`` the status bits are read every `period` seconds until
+        neither moving bit is set. Either way the move only counts as done
+        once the position is within `tol` (APT units).
+
+        Return True if the stage settled in time.
+        """
+        start = time.time()
+        if wait == 'message':
+            self.recv_until([0x0464], timeout)
         else:
-            print('<< ERROR: Unable to set desired position. >>')
-            print('<< Current position is {:.4f}'.format(pos))
-            
-        if self.ScalingFactor == 1919.6418578623391:
-            Status = 'enabled'
-        self.obj.send_comm_data(0x0453,b'\x01\x00'+strpack.pack_int(int(position),4,'<'))
-        self.wait_for_status(Status, Period = period)
-        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print('{}   |   <GET POSITION>'.format(now))
-        time.sleep(3)
-        pos = self.GetPosition()
-        flag = math.isclose(float(pos), float(position)/self.ScalingFactor, abs_tol = 0.01)
+            while time.time() - start < timeout:
+                self.obj.send_comm(0x0429, 0x01)
+                msg = self.recv_until([0x042A, 0x0464], timeout=5)
+                if msg is None:
+                    continue
+                if msg.messageID == 0x0464:
+                    break
+                if not strpack.unpack_uint(msg.data[2:6], "<") & 0x30: # moving_bk | moving_fw
+                    break
+                time.sleep(period)
+        # Settling after the controller reports the end of the move.
+        while abs(self.get_position_n() - position) > tol:
+            if time.time() - start > timeout:
+                return False
+            time.sleep(period)
+        return True
+
+    def Dev_SetPosition_APT(self, position, tol=0.01, timeout=60, wait='message'):
+        # move to a given position (APT units) with a single move command.
+        # tol is in stage units (degrees or mm).
+        position = int(round(position))
+        self.obj.send_comm_data(0x0453,b'\x01\x00'+strpack.pack_int(position,4,'<'))
+        start = time.time()
+        flag = self.wait_for_move(position, tol*self.ScalingFactor, timeout, wait)
+        pos = self.get_position_n()/self.ScalingFactor
+        log.debug('<SET POSITION>')
         if  flag == True:
-            print('<< Position is properly set. >>')
-            print('<< Current position is {:.4f}'.format(pos))
+            log.debug('<< Position is properly set in %.3f seconds. >>', time.time()-start)
         else:
-            print('<< ERROR: Unable to set desired position. >>')
-            print('<< Current position is {:.4f}'.format(pos))            
-            
+            log.error('<< ERROR: Unable to set desired position. >>')
+        log.debug('<< Current position is %.4f', pos)
+        return pos
+
+    def MoveTo(self, position, tol=0.01, timeout=60, wait='message'):
+        """
+        Move once to `position` in stage units and return the final position
+        as soon as the stage is within `tol` of it.
+        """
+        return self.Dev_SetPosition_APT(position*self.ScalingFactor, tol, timeout, wait)
+
+    def move_async(self, position, tol=0.01, timeout=60, wait='message'):
+        """
+        Non-blocking MoveTo(). Returns a concurrent.futures.Future whose
+        result is the final position. Moves are run in submission order.
+        """
+        return self.mover.submit(self.MoveTo, position, tol, timeout, wait)
 
     def SetPosition(self, position):
-        #optional arguments can be changed in Dev_SetPosition_APT()
-        APT_pos = position*self.ScalingFactor
-        self.Dev_SetPosition_APT(APT_pos)
-        print('<< Unresolvable error has magnitude {:.4f}'.format(abs(position - self.Dev_GetPosition_APT()/self.ScalingFactor)))
-        return self.GetPosition()
-        
-    
-    
-    
-    
-    
-    
+        #optional arguments can be changed in MoveTo()
+        return self.MoveTo(position)
@@ -11,68 +11,84 @@ import pyvisa as visa
 import matplotlib.pyplot as plt
 import numpy as np
 import time
+import re
+
+from instrumentation import get_logger
+
+log = get_logger('Newport2936R')
 
 class Newport2936R:
+
+    # Below this many readings, repeated PM:PWS? queries are faster than
+    # arming and downloading the data store
+    BUFFER_MIN = 10
         
-    def __init__(self, usb_address):
+    def __init__(self, usb_address, resource_manager=None):
         self.usb_address = usb_address
-        self.rm = visa.ResourceManager()
+        self.ds_config = None  # (samples, channel, interval) the data store is set up for
+        # resource_manager lets simulators.SimulatedResourceManager stand in for VISA
+        self.rm = resource_manager if resource_manager is not None else visa.ResourceManager()
         self.instrument = self.rm.open_resource(usb_address)
         
     def write(self, cmd_str):
         try:
             self.instrument.write(cmd_str)
-            print("({}) write command successfully sent to Power Meter.".format(cmd_str))
+            log.debug("(%s) write command successfully sent to Power Meter.", cmd_str)
         except:
-            print("ERROR: Failed to send write command to Power Meter. Try using the built-in __write__() function.")
+            log.error("ERROR: Failed to send write command to Power Meter. Try using the built-in __write__() function.")
         
     def read(self, cmd_str):
         try:
             out = self.instrument.query(cmd_str)
-            print("{} read command successfully sent to Power Meter.".format(cmd_str))
-            print(out)
+            log.debug("%s read command successfully sent to Power Meter.", cmd_str)
+            log.info(out)
+            return out
         except:
-            print("ERROR: Failed to send read command to Power Meter. Try using the built-in __query__() function.")
-            print(out)       
+            log.error("ERROR: Failed to send read command to Power Meter. Try using the built-in __query__() function.")
+            log.info(out)
       
     def GetInfo(self):
         try:
             info = self.instrument.query('*IDN?')
-            print(info)
+            log.info(info)
+            return info
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
 
     def GetChannel(self):
         try:
             chn = self.instrument.query('PM:CHANnel?')
-            print('Current channel is number {}'.format(chn))
+            log.debug('Current channel is number %s', chn)
+            return chn
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
             
     def SetChannel(self, channel):
     # channel = 1 or 2
+        self.ds_config = None
         self.instrument.write('PM:CHANnel {}'.format(channel))
         chn = int(self.instrument.query('PM:CHANnel?'))
         if chn==channel:
-            print('Channel has been correctly set to {}.'.format(channel))
+            log.debug('Channel has been correctly set to %s.', channel)
         else:
-            print('ERROR: Unable to set channel to desired value.')
+            log.error('ERROR: Unable to set channel to desired value.')
             
     def GetLambda(self):
         try:
             lbd = self.instrument.query('PM:Lambda?')
-            print('Current lambda is {} nm'.format(lbd))
+            log.debug('Current lambda is %s nm', lbd)
+            return lbd
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
             
     def SetLambda(self, channel, lamb):
         Newport2936R.SetChannel(self, channel)
         self.instrument.write('PM:Lambda {}'.format(lamb))
         lbd = int(self.instrument.query('PM:Lambda?'))
         if lbd==lamb:
-            print('Lambda of channel {} has been correctly set to {} nm.'.format(channel,lamb))
+            log.debug('Lambda of channel %s has been correctly set to %s nm.', channel,lamb)
         else:
-            print('ERROR: Unable to set channel to desired value.')    
+            log.error('ERROR: Unable to set channel to desired value.')
             
     def GetPowerCH1(self):
         try:
@@ -80,7 +96,7 @@ class Newport2936R:
             pwr = float(pwr.split()[0])
             return pwr
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
             
     def GetPowerCH2(self):
         try:
@@ -88,15 +104,97 @@ class Newport2936R:
             pwr = float(pwr.split()[2])
             return pwr
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
             
     def GetPowerBoth(self):
+        # PM:PWS? reports both channels, so one query gives a simultaneous pair.
         try:
-            pwr1 = Newport2936R.GetPowerCH1(self)
-            pwr2 = Newport2936R.GetPowerCH2(self)
-            return print(pwr1,pwr2)
+            pwr = self.instrument.query('PM:PWS?').split()
+            return float(pwr[0]), float(pwr[2])
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
+            
+    def ConfigureBuffer(self, samples, channel=1, interval=1):
+        """
+        Set up the data store for `samples` readings of `channel`, one every
+        `interval` x 100 us. AcquireBuffer calls this only when the settings
+        change, so a run with fixed settings configures the meter once.
+        """
+        Newport2936R.SetChannel(self, channel)
+        self.instrument.write('PM:DS:BUFfer 0') # fixed size, stop when full
+        self.instrument.write('PM:DS:SIZE {}'.format(samples))
+        self.instrument.write('PM:DS:INTerval {}'.format(interval))
+        self.ds_config = (samples, channel, interval)
+            
+    def AcquireBuffer(self, samples, channel=1, interval=1, timeout=60):
+        """
+        Collect a number of power readings in the meter's data store and
+        download them in one transfer.
+
+        :param samples: number of readings to take
+        :param channel: 1 or 2
+        :param interval: time between readings in units of 100 us, e.g.
+            interval=10 gives 1 kHz
+        :param timeout: time in seconds to wait for the store to fill
+
+        Returns a numpy array of powers in W, empty if no reading was stored.
+        """
+        if samples < 1:
+            raise ValueError('AcquireBuffer needs at least one sample, got {}'.format(samples))
+        if self.ds_config != (samples, channel, interval):
+            Newport2936R.ConfigureBuffer(self, samples, channel, interval)
+        # Re-arm only; size, interval and channel are kept from the last run
+        self.instrument.write('PM:DS:Clear')
+        self.instrument.write('PM:DS:ENable 1')
+        
+        start = time.time()
+        time.sleep(samples*interval*1e-4)
+        count = int(self.instrument.query('PM:DS:COUNT?'))
+        while count < samples and time.time() - start < timeout:
+            time.sleep(0.01)
+            count = int(self.instrument.query('PM:DS:COUNT?'))
+        if count == 0:
+            log.error('ERROR: Data store holds no readings after %s s.', timeout)
+            return np.array([])
+        if count < samples:
+            log.error('ERROR: Data store only holds %s of %s readings.', count, samples)
+            
+        self.instrument.write('PM:DS:GET? 1-{}'.format(count))
+        raw = ''
+        while 'End of Data' not in raw:
+            raw += self.instrument.read()
+        # Keep the numeric lines only; the reply has a header and a trailer.
+        values = re.findall(r'^\s*([-+]?\d[\d.]*(?:[eE][-+]?\d+)?)\s*$', raw, re.MULTILINE)
+        return np.array(values, dtype=float)
+    
+    def GetPowers(self, samples, channel=1, interval=1):
+        """
+        `samples` power readings of one channel in W: from the data store
+        for BUFFER_MIN readings or more, else from repeated queries.
+        """
+        if samples >= self.BUFFER_MIN:
+            return Newport2936R.AcquireBuffer(self, samples, channel, interval)
+        query = Newport2936R.GetPowerCH1 if channel == 1 else Newport2936R.GetPowerCH2
+        return np.array([query(self) for _ in range(samples)], dtype=float)
+    
+    def GetPowersBoth(self, samples, interval=1):
+        """
+        `samples` readings of each channel in W, as two arrays. Below
+        BUFFER_MIN every pair comes from one query; above it each channel
+        fills the data store in turn.
+        """
+        if samples >= self.BUFFER_MIN:
+            return (Newport2936R.AcquireBuffer(self, samples, 1, interval),
+                    Newport2936R.AcquireBuffer(self, samples, 2, interval))
+        pairs = np.array([Newport2936R.GetPowerBoth(self) for _ in range(samples)], dtype=float)
+        return pairs[:, 0], pairs[:, 1]
+    
+    def GetPowerAverage(self, samples, channel=1, interval=1):
+        """
+        Mean and standard deviation of `samples` readings, in W.
+        """
+        pwr = Newport2936R.GetPowers(self, samples, channel, interval)
+        return pwr.mean(), pwr.std()
             
     ##Add functions to add sensitivity input
             
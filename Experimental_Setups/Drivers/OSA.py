@@ -13,11 +13,16 @@ import numpy as np
 import matplotlib.pyplot as plt
 import time
 
+from instrumentation import get_logger
+
+log = get_logger('AQ6315B')
+
 class AQ6315B:
 
-    def __init__(self, visa_address):
+    def __init__(self, visa_address, resource_manager=None):
         self.visa_address = visa_address
-        self.rm = visa.ResourceManager()
+        # resource_manager lets simulators.SimulatedResourceManager stand in for VISA
+        self.rm = resource_manager if resource_manager is not None else visa.ResourceManager()
         self.instrument = self.rm.open_resource(visa_address)
              
 #    def __del__(self):
@@ -27,33 +32,46 @@ class AQ6315B:
     def reset_inst(self):
         try: 
             self.instrument.write('*RST')
-            print('OSA successfully reset.')
+            log.debug('OSA successfully reset.')
         except:
-            print('Unable to reset OSA.')
+            log.error('Unable to reset OSA.')
             
     def GetInfo(self):
         # identifies manufacturer, model, PN, firmware version.
         try:
             info = self.instrument.query('*IDN?')
-            print(info)
+            log.info(info)
+            return info
         except:
-            print("Unable to retreive instrument information.")
+            log.error("Unable to retreive instrument information.")
                 
     def write(self, cmd_str):
         try:
             self.instrument.write(cmd_str)
-            print("({}) write command successfully sent to OSA.".format(cmd_str))
+            log.debug("(%s) write command successfully sent to OSA.", cmd_str)
         except:
-            print("ERROR: Failed to send write command to OSA. Try using the built-in __write__() function.")
+            log.error("ERROR: Failed to send write command to OSA. Try using the built-in __write__() function.")
         
     def read(self, cmd_str):
         try:
             out = self.instrument.query(cmd_str)
-            print("{} read command successfully sent to OSA.".format(cmd_str))
-            print(out)
+            log.debug("%s read command successfully sent to OSA.", cmd_str)
+            log.info(out)
+            return out
         except:
-            print("ERROR: Failed to send read command to OSA. Try using the built-in __query__() function.")
+            log.error("ERROR: Failed to send read command to OSA. Try using the built-in __query__() function.")
             
+    def _WaitForValue(self, getter, target, tol=0, timeout=2, period=0.05, max_period=0.5):
+        # Poll a readback until it matches the requested value, backing off
+        # between queries. Returns the last value read, matched or not.
+        start = time.time()
+        value = getter(self)
+        while abs(value - target) > tol and time.time() - start < timeout:
+            time.sleep(period)
+            period = min(2*period, max_period)
+            value = getter(self)
+        return value
+
     def GetStartWavelength(self):
         WL = self.instrument.query('STAWL?')
         WL = float(WL)#*1e9
@@ -71,12 +89,11 @@ class AQ6315B:
         wavelength = round(wavelength,2)
         #self.instrument.write(':sense:wav:star {} M'.format(wavelength*1e-9))
         self.instrument.write('STAWL{}'.format(wavelength))
-        time.sleep(1)
-        WL = AQ6315B.GetStartWavelength(self)
+        WL = AQ6315B._WaitForValue(self, AQ6315B.GetStartWavelength, wavelength)
         if WL==wavelength:
-            print('Start wavelength has been correctly set to {} nm.'.format(wavelength))
+            log.debug('Start wavelength has been correctly set to %s nm.', wavelength)
         else:
-            print('ERROR: Unable to set start wavelength to desired value.')
+            log.error('ERROR: Unable to set start wavelength to desired value.')
     
     def GetStopWavelength(self):
         WL = self.instrument.query('STPWL?')
@@ -93,12 +110,11 @@ class AQ6315B:
             self.instrument.write('STAWL{}'.format((wavelength-span)))
         #self.instrument.write('STPWL{}'.format(wavelength/1e9))
         self.instrument.write('STPWL{}'.format(wavelength))
-        time.sleep(1)
-        WL = AQ6315B.GetStopWavelength(self)
+        WL = AQ6315B._WaitForValue(self, AQ6315B.GetStopWavelength, wavelength)
         if WL == wavelength:
-            print('Stop wavelength has been correctly set to {} nm'.format(wavelength))
+            log.debug('Stop wavelength has been correctly set to %s nm', wavelength)
         else:
-            print('ERROR: Unable to set stop wavelength to desired value.')
+            log.error('ERROR: Unable to set stop wavelength to desired value.')
          
     def GetCenterWavelength(self):
         WL = self.instrument.query('CTRWL?')
@@ -108,12 +124,11 @@ class AQ6315B:
     def SetCenterWavelength(self, wavelength):
         wavelength = round(wavelength,2)
         self.instrument.write('CTRWL{}'.format(wavelength))
-        time.sleep(1)
-        WL = AQ6315B.GetCenterWavelength(self)
+        WL = AQ6315B._WaitForValue(self, AQ6315B.GetCenterWavelength, wavelength, tol=0.1)
         if abs(WL-wavelength)<=0.1:
-            print('Center wavelength has been set correctly to {} nm'.format(wavelength))
+            log.debug('Center wavelength has been set correctly to %s nm', wavelength)
         else:
-            print('ERROR: Unable to set center wavelength to desired value.')
+            log.error('ERROR: Unable to set center wavelength to desired value.')
     
     def GetSpanWavelength(self):
         WL = self.instrument.query('SPAN?')
@@ -123,12 +138,11 @@ class AQ6315B:
     def SetSpanWavelength(self, wavelength):
         wavelength = round(wavelength,2)
         self.instrument.write('SPAN{}'.format(wavelength))
-        time.sleep(1)
-        WL = AQ6315B.GetSpanWavelength(self)
+        WL = AQ6315B._WaitForValue(self, AQ6315B.GetSpanWavelength, wavelength, tol=0.5)
         if abs(WL-wavelength)<0.5:
-            print('Span wavelength has been set correctly.')
+            log.debug('Span wavelength has been set correctly.')
         else:
-            print('ERROR: Unable to set span wavelength to desired value.')
+            log.error('ERROR: Unable to set span wavelength to desired value.')
 
     def GetReference(self):
         refGet = self.instrument.query('REFL?')
@@ -144,6 +158,11 @@ class AQ6315B:
     #         else:
     #             print('ERROR: Unable to set reference level to desired value.') 
     
+    def GetScale(self):
+        # LSCL? returns the log scale in dB/div, or LIN in linear scale
+        scale = self.instrument.query('LSCL?').strip().upper()
+        return 'LIN' if scale.startswith('LIN') else 'LOG'
+    
     def GetResolution(self):
         WL = self.instrument.query('RESLN?')
         WL = float(WL)#*1e9
@@ -151,12 +170,11 @@ class AQ6315B:
     
     def SetResolution(self, rbwSet):
         self.instrument.write('RESLN{}'.format(rbwSet))
-        time.sleep(1)
-        rbwGet = AQ6315B.GetResolution(self)
+        rbwGet = AQ6315B._WaitForValue(self, AQ6315B.GetResolution, rbwSet)
         if rbwGet == rbwSet:
-            print('Resolution is set correctly to {}'.format(rbwSet))
+            log.debug('Resolution is set correctly to %s', rbwSet)
         else:
-            print('ERROR: Unable to set resolution to desired value.')        
+            log.error('ERROR: Unable to set resolution to desired value.')
     
     def GetSensitivity(self):
         sens = self.instrument.query('SENS?')
@@ -179,12 +197,11 @@ class AQ6315B:
     
     def SetPoints(self, Point):
         self.instrument.write('SMPL{}'.format(Point))
-        time.sleep(1)
-        PT = AQ6315B.GetPoints(self)
+        PT = AQ6315B._WaitForValue(self, AQ6315B.GetPoints, Point)
         if PT==Point:
-            print('Point has been set correctly to {}'.format(Point))
+            log.debug('Point has been set correctly to %s', Point)
         else:
-            print('ERROR: Unable to set Point to desired value')
+            log.error('ERROR: Unable to set Point to desired value')
         
     def GetAverage(self):
         PT = self.instrument.query('AVG?')
@@ -192,12 +209,46 @@ class AQ6315B:
     
     def SetAverage(self, Average):
         self.instrument.write('AVG{}'.format(Average))
-        time.sleep(1)
-        AVG = AQ6315B.GetAverage(self)
+        AVG = AQ6315B._WaitForValue(self, AQ6315B.GetAverage, Average)
         if AVG==Average:
-            print('Averaging times has been set correctly to {}'.format(Average))
+            log.debug('Averaging times has been set correctly to %s', Average)
+        else:
+            log.error('ERROR: Unable to set Averaging times to desired value')
+        
+    def configure(self, start, stop, res=None, points=None, avg=None):
+        """
+        Apply the sweep window, resolution, number of points and averaging
+        in one batch, then read all of them back once. Settings passed as
+        None are left untouched.
+
+        Returns a dict of the readback values.
+        """
+        start = round(start,2)
+        # Write the stop wavelength first when moving the window up so the
+        # start never ends up above the stop.
+        if start >= AQ6315B.GetStopWavelength(self):
+            self.instrument.write('STPWL{}'.format(stop))
+            self.instrument.write('STAWL{}'.format(start))
+        else:
+            self.instrument.write('STAWL{}'.format(start))
+            self.instrument.write('STPWL{}'.format(stop))
+        requested = {'start': start, 'stop': stop}
+        getters = {'start': AQ6315B.GetStartWavelength, 'stop': AQ6315B.GetStopWavelength}
+        for key, cmd, value, getter in [('res', 'RESLN', res, AQ6315B.GetResolution),
+                                        ('points', 'SMPL', points, AQ6315B.GetPoints),
+                                        ('avg', 'AVG', avg, AQ6315B.GetAverage)]:
+            if value is not None:
+                self.instrument.write('{}{}'.format(cmd, value))
+                requested[key] = value
+                getters[key] = getter
+        
+        settings = {k: AQ6315B._WaitForValue(self, getters[k], requested[k]) for k in requested}
+        wrong = [k for k in settings if settings[k] != requested[k]]
+        if len(wrong) == 0:
+            log.debug('OSA configured: %s', settings)
         else:
-            print('ERROR: Unable to set Averaging times to desired value')        
+            log.error('ERROR: Unable to set %s to desired value.', ', '.join(wrong))
+        return settings
         
     def SingleScan(self):
         self.instrument.clear()
@@ -205,10 +256,49 @@ class AQ6315B:
             self.instrument.write('SGL')
             #AQ6315B.write(self, '*CLS') CHECK EQUIPMENT SCREEN
             #AQ6315B.write(self, 'INIT') CHECK EQUIPMENT SCREEN
-            print('---------------------------------------')
-            print('Scan commands successfully sent to OSA.')
+            log.debug('Scan commands successfully sent to OSA.')
         except:
-            print("ERROR: Unable to send single scan commands to OSA.")   
+            log.error("ERROR: Unable to send single scan commands to OSA.")
+        
+    def GetSweepStatus(self):
+        # 0: stop, 1: single, 2: repeat, 3: auto
+        status = self.instrument.query('SWEEP?')
+        return int(status)
+        
+    def WaitForSweepFinish(self, timeout=600, period=0.05, max_period=1.0, use_srq=False):
+        """
+        Block until the running sweep has finished.
+
+        By default the sweep status is polled, starting at `period` seconds
+        between queries and doubling up to `max_period`. With `use_srq=True`
+        the OSA is told to raise a service request at the end of the sweep
+        and the call waits on the GPIB SRQ line instead of polling.
+
+        Returns True if the sweep finished within `timeout` seconds.
+        """
+        start = time.time()
+        if use_srq:
+            self.instrument.write('SRQ1')
+            finished = AQ6315B.GetSweepStatus(self) == 0
+            if not finished:
+                try:
+                    self.instrument.wait_for_srq(int(timeout*1000))
+                    self.instrument.read_stb()
+                    finished = True
+                except visa.errors.VisaIOError:
+                    finished = False
+            self.instrument.write('SRQ0')
+        else:
+            finished = AQ6315B.GetSweepStatus(self) == 0
+            while not finished and time.time() - start < timeout:
+                time.sleep(period)
+                period = min(2*period, max_period)
+                finished = AQ6315B.GetSweepStatus(self) == 0
+        if finished:
+            log.debug('Sweep finished after %.3f seconds.', time.time()-start)
+        else:
+            log.error('ERROR: Sweep did not finish within %s seconds.', timeout)
+        return finished
         
     # def GetTrace(self, scan_exists):
     #     # self.instrument.clear()
@@ -223,25 +313,43 @@ class AQ6315B:
     #     else:
     #         AQ6315B.SingleScan(self)
             
-    def GetIntensity(self):
-        yvals = self.instrument.query('LDATA')
-        yvals = yvals.split(',')
-        yvals[-1] = yvals[-1][:-2] # deletes terminating \n in string of last element
-        
-        for i,y in enumerate(yvals):
-            yvals[i] = float(y) # convert data strings to float values
-            yvals = np.array(yvals) # convert to numpy array   
-        return yvals
+    def _ParseTrace(self, reply):
+        # LDATA/WDATA reply is "<n>,<d1>,...,<dn>\r\n"; parse it in one pass
+        # instead of splitting and converting every element in Python.
+        return np.fromstring(reply.strip(), dtype=float, sep=',')
+
+    def _TraceCommand(self, cmd_str, limits=None):
+        if limits is None:
+            return cmd_str
+        elif isinstance(limits, (tuple, list)) and len(limits) == 2:
+            return '{}R{}-R{}'.format(cmd_str, limits[0]+1, limits[1]+1)
+        else:
+            raise ValueError("limits has to be a list or tuple with two members")
+
+    def GetIntensity(self, limits=None):
+        yvals = self.instrument.query(AQ6315B._TraceCommand(self, 'LDATA', limits))
+        return AQ6315B._ParseTrace(self, yvals)
     
-    def GetWavelength(self):
-        xvals = self.instrument.query('WDATA')
-        xvals = xvals.split(',')
-        xvals[-1] = xvals[-1][:-2] # deletes terminating \n in string of last element
-        
-        for i,y in enumerate(xvals):
-            xvals[i] = float(y) # convert data strings to float values
-        xvals = np.array(xvals) # convert to numpy array
-        return xvals
+    def GetWavelength(self, limits=None):
+        xvals = self.instrument.query(AQ6315B._TraceCommand(self, 'WDATA', limits))
+        return AQ6315B._ParseTrace(self, xvals)
+
+    def GetTrace(self, limits=None):
+        """
+        Return the active trace as a structured array with the fields
+        'wavelength' (nm) and 'level'.
+
+        :param limits: Range of samples to transfer as a tuple of min and
+            max value, e.g. (0, 99) transfers the first 100 samples.
+            Transfers the whole trace if None.
+        """
+        # First element of each reply is the sample count, not data.
+        wavelength = AQ6315B.GetWavelength(self, limits)[1:]
+        intensity = AQ6315B.GetIntensity(self, limits)[1:]
+        trace = np.empty(len(wavelength), dtype=[('wavelength', float), ('level', float)])
+        trace['wavelength'] = wavelength
+        trace['level'] = intensity
+        return trace
     
     def PlotScan(self):
         wavelength = AQ6315B.GetWavelength(self)
@@ -251,12 +359,15 @@ class AQ6315B:
         plt.grid()
         return plt.show()  
     
+    def SaveTrace(self, trace, filename_str):
+        # Writes a trace from GetTrace() in the ExportScan file layout. Does not
+        # talk to the instrument, so it can run while the next sweep is taken.
+        np.savetxt('{}'.format(filename_str), np.column_stack((trace['wavelength'][:-1], trace['level'][:-1])),fmt='%s',delimiter='\t')
+    
     def ExportScan(self, filename_str):
-        wavelength = AQ6315B.GetWavelength(self)
-        intensity = AQ6315B.GetIntensity(self)
-        name = filename_str
-        np.savetxt('{}'.format(name), np.column_stack((wavelength[1:-1], intensity[1:-1])),fmt='%s',delimiter='\t')
-        return print('Data exported.')
+        trace = AQ6315B.GetTrace(self)
+        AQ6315B.SaveTrace(self, trace, filename_str)
+        log.debug('Data exported.')
         
         
         
@@ -1,4 +1,7 @@
 from ctypes import *
+import time
+
+import numpy as np
 
 
 class ChannelInfo (Structure):
@@ -1208,3 +1211,126 @@ class TC300:
         if self.hdl >= 0:
             ret = TC300.tc300Lib.LoadFactoryParameter(self.hdl)
         return ret
+
+
+class TC300Settling:
+    """ Settling detector for the TC300 channels
+        Reads both channels with one get_monitor_message call per sample and
+        keeps a short history per channel. A channel counts as settled when,
+        over the last `window` samples, the fitted slope and the scatter about
+        that fit are both small and the mean is within `tolerance` of the
+        target. While the channel is still approaching, an exponential fit of
+        the error predicts how long is left, so the wait sleeps until then
+        instead of polling every second.
+    """
+
+    def __init__(self, tc, period=0.5, window=10, tolerance=0.1, max_slope=0.002, max_std=0.02):
+        """
+        Args:
+            tc: opened TC300 instance
+            period: time between samples in (s)
+            window: number of samples used for the settling criterion
+            tolerance: allowed distance of the mean from the target in (degree celsius)
+            max_slope: allowed drift over the window in (degree celsius/s)
+            max_std: allowed scatter about the linear fit in (degree celsius)
+        """
+        self.tc = tc
+        self.period = period
+        self.window = window
+        self.tolerance = tolerance
+        self.max_slope = max_slope
+        self.max_std = max_std
+        self.targets = {1: None, 2: None}
+        self.history = {1: [], 2: []}
+
+    def read_temperatures(self):
+        """ Read both channels in one call
+        Returns:
+            ((target1, actual1), (target2, actual2)) in degree celsius
+        """
+        info1 = [None]
+        info2 = [None]
+        ret = self.tc.get_monitor_message(info1, info2)
+        if ret < 0:
+            raise IOError("TC300 GetMonitorMessage failed with {}".format(ret))
+        return (info1[0][0], info1[0][1]), (info2[0][0], info2[0][1])
+
+    def sample(self):
+        """ Take one reading of both channels and add it to the history
+        Returns:
+            (actual1, actual2) in degree celsius
+        """
+        now = time.time()
+        channels = self.read_temperatures()
+        for channel, (target, actual) in zip((1, 2), channels):
+            self.history[channel].append((now, actual))
+        return channels[0][1], channels[1][1]
+
+    def step(self, channel, temperature):
+        """ Command a new target and restart the settling history
+        Args:
+            channel: channel index, 1 or 2
+            temperature: the target temperature in degree celsius
+        """
+        self.tc.set_target_temperature(channel, temperature)
+        self.targets[channel] = temperature
+        self.history[channel] = []
+
+    # Commanding the next setpoint early, e.g. while the last trace is read
+    # out, is the same operation; the name documents the intent in scripts.
+    precommand = step
+
+    def is_settled(self, channel):
+        """ Slope-and-variance settling criterion on the last `window` samples
+        """
+        if len(self.history[channel]) < self.window or self.targets[channel] is None:
+            return False
+        t, temp = np.array(self.history[channel][-self.window:]).T
+        slope, offset = np.polyfit(t - t[0], temp, 1)
+        scatter = np.std(temp - (slope*(t - t[0]) + offset))
+        return (abs(slope) <= self.max_slope and scatter <= self.max_std
+                and abs(temp.mean() - self.targets[channel]) <= self.tolerance)
+
+    def predict(self, channel):
+        """ Predict the time left until the channel is within tolerance
+        Fits |T - target| = A*exp(-t/tau) to the samples taken since the
+        last step.
+        Returns:
+            remaining time in (s), or None if there is no approach to fit yet
+        """
+        target = self.targets[channel]
+        if target is None or len(self.history[channel]) < 3:
+            return None
+        t, temp = np.array(self.history[channel]).T
+        error = np.abs(temp - target)
+        approach = error > 2*self.tolerance
+        if approach.sum() < 3:
+            return 0
+        # Time relative to the first sample, as in is_settled
+        t = t - t[0]
+        rate, log_amplitude = np.polyfit(t[approach], np.log(error[approach]), 1)
+        if rate >= 0:
+            return None
+        return max(0, (np.log(self.tolerance) - log_amplitude)/rate - t[-1])
+
+    def wait_settled(self, channel, timeout=600):
+        """ Block until the channel is settled
+        Args:
+            channel: channel index, 1 or 2
+            timeout: time in (s) after which to give up
+        Returns:
+            True if the channel settled, False on timeout
+        """
+        start = time.time()
+        while time.time() - start < timeout:
+            self.sample()
+            if self.is_settled(channel):
+                return True
+            remaining = self.predict(channel)
+            if remaining is not None and remaining > 2*self.period:
+                # Far from the target: skip ahead, keeping a margin to
+                # collect the settling window.
+                time.sleep(min(remaining/2, 30, max(0, timeout - (time.time() - start))))
+            else:
+                time.sleep(self.period)
+        return False
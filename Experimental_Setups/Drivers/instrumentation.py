@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:02:47 2026
+
+Logging and bus-latency profiling shared by the drivers in this folder.
+
+Drivers log through get_logger() instead of printing. Nothing is shown unless
+a script asks for it, so production sweeps pay no console I/O:
+
+    import instrumentation
+    instrumentation.enable_console()            # show driver messages
+
+To find out where the bus time goes, wrap a driver's connection:
+
+    profiler = instrumentation.Profiler()
+    instrumentation.profile(osa, profiler)      # AQ6315B, Newport2936R, ...
+    instrumentation.profile(kdc, profiler)      # KDC101 (APT messages)
+    ...
+    print(profiler.report())
+
+Unprofiled drivers are not wrapped at all, so profiling costs nothing
+unless it is switched on.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+LOGGER_NAME = 'drivers'
+
+# Quiet by default: driver messages go nowhere unless a handler is added,
+# either here or by the script's own logging.basicConfig().
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name, **extra):
+    """
+    Return the logger for one driver, e.g. get_logger('KDC101').
+
+    Per-call messages are logged at DEBUG so they are filtered out cheaply
+    even when a script logs INFO to file. Failures are logged at ERROR.
+    """
+    extra.setdefault('instrument', name)
+    return logging.LoggerAdapter(logging.getLogger('{}.{}'.format(LOGGER_NAME, name)), extra)
+
+
+def enable_console(level=logging.DEBUG):
+    """
+    Print driver messages to the console with a timestamp, like the old
+    banners did. Returns the handler so it can be removed again.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s   |   %(instrument)s   |   %(message)s',
+                                           datefmt='%d/%m/%Y %H:%M:%S'))
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
+
+
+def _command_key(cmd):
+    # 'STAWL1550.0' -> 'STAWL', 'PM:Lambda 1550' -> 'PM:Lambda'
+    if isinstance(cmd, int):
+        return '0x{:04X}'.format(cmd)
+    if isinstance(cmd, bytes):
+        cmd = cmd.decode('ascii', 'replace')
+    cmd = str(cmd).strip()
+    match = re.match(r'[A-Za-z*:?]+', cmd)
+    return match.group() if match else cmd
+
+
+def _size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    data = getattr(value, 'data', None)  # APT messages
+    return len(data) if data is not None else 0
+
+
+class Profiler:
+    """
+    Collects the round-trip time and number of bytes of every bus call made
+    through a profiled driver, keyed by driver and command.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(list)  # (driver, command) -> [(seconds, bytes), ...]
+        self.lock = threading.Lock()
+
+    def record(self, driver, command, seconds, nbytes):
+        with self.lock:
+            self.calls[(driver, command)].append((seconds, nbytes))
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+
+    def histogram(self, driver, command, bins=20):
+        """
+        Return (counts, bin_edges) of the round-trip times in seconds.
+        """
+        times = np.array([c[0] for c in self.calls[(driver, command)]])
+        return np.histogram(times, bins=bins)
+
+    def summary(self):
+        """
+        Return one row per (driver, command), slowest total first:
+        (driver, command, count, total s, mean ms, p95 ms, total bytes)
+        """
+        rows = []
+        with self.lock:
+            for (driver, command), calls in self.calls.items():
+                times = np.array([c[0] for c in calls])
+                rows.append((driver, command, len(calls), times.sum(), 1e3*times.mean(),
+                             1e3*np.percentile(times, 95), sum(c[1] for c in calls)))
+        rows.sort(key=lambda r: r[3], reverse=True)
+        return rows
+
+    def report(self):
+        lines = ['{:<14}{:<14}{:>7}{:>10}{:>10}{:>10}{:>12}'.format(
+            'driver', 'command', 'calls', 'total s', 'mean ms', 'p95 ms', 'bytes')]
+        for r in self.summary():
+            lines.append('{:<14}{:<14}{:>7}{:>10.3f}{:>10.2f}{:>10.2f}{:>12}'.format(*r))
+        return '\n'.join(lines)
+
+
+class ProfiledConnection:
+    """
+    Wraps a connection object and times the listed methods, keyed by the
+    command they send. Everything else is passed through untouched. With
+    methods=None every call is timed and keyed by the function name, which
+    suits DLL wrappers such as the TC300 library.
+    """
+
+    def __init__(self, connection, driver, profiler, methods=None):
+        self._connection = connection
+        self._driver = driver
+        self._profiler = profiler
+        self._wrap_all = methods is None
+        for name in methods or []:
+            if hasattr(connection, name):
+                setattr(self, name, self._timed(getattr(connection, name), name))
+
+    def _timed(self, method, name):
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            out = method(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            command = _command_key(args[0]) if args and not self._wrap_all else name
+            nbytes = sum(_size(a) for a in args if isinstance(a, (str, bytes, bytearray))) + _size(out)
+            self._profiler.record(self._driver, command, seconds, nbytes)
+            return out
+        return call
+
+    def __getattr__(self, name):
+        attr = getattr(self._connection, name)
+        if self._wrap_all and callable(attr):
+            return self._timed(attr, name)
+        return attr
+
+
+VISA_METHODS = ['write', 'query', 'read', 'read_raw', 'query_binary_values', 'query_ascii_values']
+APT_METHODS = ['send_comm', 'send_comm_data', 'recv_comm', 'move_by']
+PYMEASURE_METHODS = ['write', 'read', 'write_bytes', 'read_bytes']
+
+
+def profile(driver, profiler):
+    """
+    Start recording bus calls of `driver` into `profiler`. Works on drivers
+    holding a pyvisa resource in `instrument` (AQ6315B, Newport2936R), a
+    pylablib device in `obj` (KDC101), a pymeasure adapter in `adapter`
+    (Keithley2450) or a DLL in `tc300Lib` (TC300).
+
+    The TC300 library is shared by the class, so profiling one TC300
+    profiles all of them.
+    """
+    name = type(driver).__name__
+    if hasattr(driver, 'instrument'):
+        driver.instrument = ProfiledConnection(driver.instrument, name, profiler, VISA_METHODS)
+    elif hasattr(driver, 'obj'):
+        driver.obj = ProfiledConnection(driver.obj, name, profiler, APT_METHODS)
+    elif hasattr(driver, 'adapter'):
+        driver.adapter = ProfiledConnection(driver.adapter, name, profiler, PYMEASURE_METHODS)
+    elif hasattr(driver, 'tc300Lib'):
+        type(driver).tc300Lib = ProfiledConnection(type(driver).tc300Lib, name, profiler)
+    else:
+        raise ValueError('{} has no connection to profile'.format(name))
+    return driver
+
+
+def unprofile(driver):
+    """
+    Remove the wrapper added by profile().
+    """
+    for attr in ['instrument', 'obj', 'adapter']:
+        conn = getattr(driver, attr, None)
+        if isinstance(conn, ProfiledConnection):
+            setattr(driver, attr, conn._connection)
+    if isinstance(getattr(driver, 'tc300Lib', None), ProfiledConnection):
+        type(driver).tc300Lib = type(driver).tc300Lib._connection
+    return driver
@@ -556,6 +556,113 @@ class Keithley2450(KeithleyBuffer, Instrument):
         """
         return self.write("*TRG")
 
+    def config_current_sweep(self, currents, delay=0.05, buffer="defbuffer1"):
+        """ Loads a list of source currents into the trigger model as a
+        list sweep. Each point is sourced, held for the delay and measured
+        into the reading buffer, all timed by the instrument. Configure the
+        measurement (e.g. :meth:`~.Keithley2450.measure_voltage`) first.
+
+        :param currents: A list or array of currents in Amps
+        :param delay: A source delay in seconds before each measurement
+        :param buffer: The name of the reading buffer to store the results in
+        """
+        currents = np.asarray(currents, dtype=float)
+        log.info("%s is loading a %d point current sweep.", self.name, len(currents))
+        self.write(":TRAC:CLE \"%s\"" % buffer)
+        if buffer == "defbuffer1":
+            self.buffer_points = max(len(currents), 10)
+        # The list is sent in chunks to stay within the command length limit
+        for i in range(0, len(currents), 100):
+            chunk = ",".join("%g" % c for c in currents[i:i + 100])
+            if i == 0:
+                self.write(":SOUR:LIST:CURR %s" % chunk)
+            else:
+                self.write(":SOUR:LIST:CURR:APP %s" % chunk)
+        self.write(":SOUR:SWE:CURR:LIST 1, %g, 1, OFF, \"%s\"" % (delay, buffer))
+        self.check_errors()
+
+    def start_sweep(self):
+        """ Starts the trigger model loaded by
+        :meth:`~.Keithley2450.config_current_sweep`. """
+        self.write(":INIT")
+
+    def sweep_points(self, buffer="defbuffer1"):
+        """ Returns the number of readings stored in the buffer. """
+        return int(self.ask(":TRAC:ACT? \"%s\"" % buffer))
+
+    def wait_for_sweep(self, points, buffer="defbuffer1", should_stop=lambda: False,
+                       timeout=60, interval=0.1):
+        """ Blocks until the buffer holds the given number of readings,
+        like :meth:`~.KeithleyBuffer.wait_for_buffer` does for the fixed
+        size buffer of the older SourceMeters.
+
+        :param points: The number of readings expected
+        :param buffer: The name of the reading buffer
+        :param should_stop: A function that returns True to abort waiting
+        :param timeout: A time in seconds after which an exception is raised
+        :param interval: A time in seconds between buffer count queries
+        """
+        t = time.time()
+        while self.sweep_points(buffer) < points:
+            time.sleep(interval)
+            if should_stop():
+                return
+            if (time.time() - t) > timeout:
+                raise Exception("Timed out waiting for Keithley sweep to complete.")
+
+    def sweep_data(self, points, buffer="defbuffer1"):
+        """ Reads the source and measured values of the first readings in
+        the buffer in one binary transfer.
+
+        :param points: The number of readings to read
+        :param buffer: The name of the reading buffer
+        :returns: Two numpy arrays, the sourced and the measured values
+        """
+        self.write(":FORM:DATA REAL;:FORM:BORD SWAP")
+        try:
+            self.write(":TRAC:DATA? 1, %d, \"%s\", SOUR, READ" % (points, buffer))
+            data = self.read_block()
+        finally:
+            self.write(":FORM:DATA ASCII")
+        data = np.frombuffer(data, dtype="<f8").reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def read_block(self):
+        """ Reads one IEEE 488.2 definite length block, #<n><length><data>,
+        and the terminator after it, and returns the data bytes. """
+        header = self.read_bytes(2)
+        if header[:1] != b"#":
+            raise ValueError("Expected a binary block from the Keithley, got %r" % header)
+        length = int(self.read_bytes(int(header[1:2])))
+        data = self.read_bytes(length)
+        self.read_bytes(1)
+        return data
+
+    def sweep_current(self, currents, delay=0.05, timeout=None, buffer="defbuffer1"):
+        """ Runs a hardware timed current sweep with the source enabled and
+        returns the sourced currents and measured voltages.
+
+        .. code-block:: python
+
+            keithley.apply_current(compliance_voltage=5)
+            keithley.measure_voltage()
+            keithley.enable_source()
+            currents, voltages = keithley.sweep_current(np.linspace(0, 0.2, 400))
+
+        :param currents: A list or array of currents in Amps
+        :param delay: A source delay in seconds before each measurement
+        :param timeout: A time in seconds to wait for the sweep, by default
+                        twice the expected sweep time plus 10 s
+        :param buffer: The name of the reading buffer
+        """
+        points = len(currents)
+        if timeout is None:
+            timeout = 2 * points * delay + 10
+        self.config_current_sweep(currents, delay, buffer)
+        self.start_sweep()
+        self.wait_for_sweep(points, buffer, timeout=timeout)
+        return self.sweep_data(points, buffer)
+
     @property
     def mean_voltage(self):
         """ Returns the mean voltage from the buffer """
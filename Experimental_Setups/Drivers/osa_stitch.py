@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:02:17 2026
+
+Wideband OSA spectra stitched from adjacent sweep windows.
+
+Simulations/MZI_Attempt2.py stepped the OSA window 1 nm at a time, wrote every
+trace to a text file and concatenated the files, so every overlap appeared
+twice. Here each window is added to one array on a common wavelength grid as
+soon as it is read:
+
+    stitcher = TraceStitcher(1500, 1600, step=0.01)
+    wl, level = acquire(source_for(osa), stitcher, window=5, overlap=0.5)
+
+Every window is resampled onto the grid points it covers and weighted by a
+ramp that rises from 0 at its edges to 1 at `overlap` nm inside, so in an
+overlap the two windows cross-fade instead of jumping from one to the other.
+Before it is added, a window is shifted by the median level difference (dB)
+to what is already on the grid in its overlap, which takes out drifts of
+the source or the coupling between sweeps. Averaging is done in linear
+power; traces in dBm come back in dBm.
+
+source_for() wraps an AQ6315B or a Yokogawa6370 so both are driven the same
+way: set_window(start, stop), sweep(), trace() -> (wavelength nm, level).
+"""
+
+import numpy as np
+
+from instrumentation import get_logger
+
+log = get_logger('osa_stitch')
+
+
+class AQ6315BSource:
+
+    def __init__(self, osa, dbm=None, **settings):
+        """
+        :param osa: AQ6315B
+        :param dbm: True if the OSA is in log scale (levels in dBm), False
+            for linear; read from the OSA if None
+        :param settings: res, points, avg passed to configure() with
+            every window
+        """
+        self.osa = osa
+        self.dbm = osa.GetScale() == 'LOG' if dbm is None else dbm
+        self.settings = settings
+
+    def set_window(self, start, stop):
+        self.osa.configure(start, stop, **self.settings)
+
+    def sweep(self, timeout=600):
+        self.osa.SingleScan()
+        return self.osa.WaitForSweepFinish(timeout=timeout)
+
+    def trace(self):
+        trace = self.osa.GetTrace()
+        return trace['wavelength'], trace['level']
+
+
+class Yokogawa6370Source:
+
+    def __init__(self, osa, points=None, resolution=None):
+        """
+        :param osa: Yokogawa6370, always in dBm
+        :param points: samples per window
+        :param resolution: resolution bandwidth in nm
+        """
+        self.osa = osa
+        self.dbm = True
+        self.stop = None
+        osa.sweep_mode = osa.SweepModes.SINGLE
+        if points is not None:
+            osa.points = points
+        if resolution is not None:
+            osa.bandwidth = resolution * 1e-9
+
+    def set_window(self, start, stop):
+        # Write the stop first when moving the window up, so start < stop
+        # holds at every step
+        if self.stop is None:
+            self.stop = float(getattr(self.osa.stop_wl, 'magnitude', self.osa.stop_wl)) * 1e9
+        if start >= self.stop:
+            self.osa.stop_wl = stop * 1e-9
+            self.osa.start_wl = start * 1e-9
+        else:
+            self.osa.start_wl = start * 1e-9
+            self.osa.stop_wl = stop * 1e-9
+        self.stop = stop
+
+    def sweep(self, timeout=600):
+        self.osa.start_sweep()
+        return self.osa.wait_for_sweep(timeout=timeout)
+
+    def trace(self):
+        return np.asarray(self.osa.wavelength(), dtype=float) * 1e9, np.asarray(self.osa.data(), dtype=float)
+
+
+def source_for(osa, **kwargs):
+    """
+    Window source for an AQ6315B or a Yokogawa6370.
+    """
+    if hasattr(osa, 'GetTrace'):
+        return AQ6315BSource(osa, **kwargs)
+    if hasattr(osa, 'start_sweep'):
+        return Yokogawa6370Source(osa, **kwargs)
+    raise TypeError('No stitching source for {}'.format(type(osa).__name__))
+
+
+class TraceStitcher:
+
+    def __init__(self, start, stop, step=None, overlap=0.2, match_levels=True, dbm=True):
+        """
+        :param start, stop: wavelength range of the result in nm
+        :param step: grid spacing in nm; the sample spacing of the first
+            window if None
+        :param overlap: width in nm of the weight ramp at each window edge;
+            at most the overlap between neighbouring windows
+        :param match_levels: shift every window to the level of the windows
+            before it in their overlap
+        :param dbm: levels are given and returned in dBm, else linear
+        """
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.overlap = overlap
+        self.match_levels = match_levels
+        self.dbm = dbm
+        self.offsets = []  # dB applied to every window, in order
+        self.grid = None
+        if step is not None:
+            self._allocate(step)
+
+    def _allocate(self, step):
+        self.step = step
+        self.grid = np.linspace(self.start, self.stop, int(round((self.stop - self.start) / step)) + 1)
+        self.weighted = np.zeros(len(self.grid))
+        self.weights = np.zeros(len(self.grid))
+
+    def add(self, wavelength, level):
+        """
+        Resample one window onto the grid and blend it in. Returns the level
+        offset in dB applied to it.
+        """
+        wavelength = np.asarray(wavelength, dtype=float)
+        level = np.asarray(level, dtype=float)
+        order = np.argsort(wavelength)
+        wavelength, level = wavelength[order], level[order]
+        if self.grid is None:
+            self._allocate(np.median(np.diff(wavelength)))
+
+        lo = np.searchsorted(self.grid, wavelength[0], side='left')
+        hi = np.searchsorted(self.grid, wavelength[-1], side='right')
+        x = self.grid[lo:hi]
+        power = np.interp(x, wavelength, 10**(level / 10) if self.dbm else level)
+        ramp = np.clip(np.minimum(x - wavelength[0], wavelength[-1] - x) / self.overlap, 0, 1)
+        # The outer edges of the whole range keep full weight
+        ramp = np.where((x - self.start < self.overlap) & (wavelength[0] <= self.start), 1, ramp)
+        ramp = np.where((self.stop - x < self.overlap) & (wavelength[-1] >= self.stop), 1, ramp)
+
+        offset = 0.0
+        weights = self.weights[lo:hi]
+        if self.match_levels:
+            shared = (weights > 0) & (ramp > 0) & (power > 0)
+            if shared.any():
+                current = self.weighted[lo:hi][shared] / weights[shared]
+                offset = float(np.median(10 * np.log10(current / power[shared])))
+                power = power * 10**(offset / 10)
+        self.weighted[lo:hi] += ramp * power
+        self.weights[lo:hi] += ramp
+        self.offsets.append(offset)
+        log.debug('Window %.3f-%.3f nm added with %+.3f dB', wavelength[0], wavelength[-1], offset)
+        return offset
+
+    def result(self):
+        """
+        (grid, level) so far; NaN where no window has been added.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            power = self.weighted / self.weights
+            level = 10 * np.log10(power) if self.dbm else power
+        return self.grid, np.where(self.weights > 0, level, np.nan)
+
+
+def windows(start, stop, window, overlap):
+    """
+    (start, stop) of sweep windows `window` nm wide, neighbours sharing
+    `overlap` nm, covering start to stop.
+    """
+    pitch = window - overlap
+    count = max(1, int(np.ceil((stop - start - overlap) / pitch - 1e-9)))
+    starts = start + pitch * np.arange(count)
+    return [(round(float(a), 4), round(float(min(a + window, stop)), 4)) for a in starts]
+
+
+def acquire(source, stitcher, window=1.0, overlap=None, before_sweep=None, timeout=600):
+    """
+    Sweep the range of `stitcher` window by window and blend every trace in
+    as it is read. before_sweep(start, stop) is called after the window is
+    set, e.g. to tune a laser to its centre. Returns stitcher.result().
+
+    :param overlap: nm shared by neighbouring windows; twice the blending
+        ramp of the stitcher if None
+    """
+    if overlap is None:
+        overlap = 2 * stitcher.overlap
+    if stitcher.overlap > overlap:
+        log.warning('Blending ramp %.3f nm is wider than the window overlap %.3f nm', stitcher.overlap, overlap)
+    stitcher.dbm = source.dbm
+    for start, stop in windows(stitcher.start, stitcher.stop, window, overlap):
+        source.set_window(start, stop)
+        if before_sweep is not None:
+            before_sweep(start, stop)
+        if not source.sweep(timeout):
+            log.error('Sweep %.3f-%.3f nm did not finish; window skipped', start, stop)
+            continue
+        stitcher.add(*source.trace())
+    return stitcher.result()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:14:03 2026
+
+Tap to incident power calibration, fitted per OPO wavelength and cached.
+
+The acquisition scripts convert the tap reading on the power meter to the
+power incident on the chip with calibration(x, m, b) = m*x + b, x in mW and
+the result in W. m and b used to be constants pasted into every script.
+Pinc_Measurement.py now sweeps the HWP at every OPO wavelength, fits one line
+per wavelength and saves the result; the scripts load the latest one:
+
+    cache = CalibrationCache(CALIBRATION_DIR)
+    cache.save(PinCalibration.fit('SPM-OPO', wavelengths, tap_mw, pinc_w))
+    ...
+    pin = cache.load('SPM-OPO')              # newest for this setup
+    pin(tap_mw, 1550.0)                      # W, m and b interpolated
+    pin.function(1550.0)                     # x -> W, as calibration(x, m, b)
+
+Calibrations are JSON files under <directory>/<setup>/<date>-v<revision>.json.
+Saving again on the same day adds a revision instead of overwriting, and load
+returns the last revision of the newest date, optionally not after a given
+date so older data can be reprocessed with the calibration of its day.
+"""
+
+import os
+import re
+import json
+import glob
+import datetime
+
+import numpy as np
+
+from instrumentation import get_logger
+
+log = get_logger('pin_calibration')
+
+SCHEMA = 1
+FILENAME = re.compile(r'^(?P<date>\d{4}-\d{2}-\d{2})-v(?P<revision>\d+)\.json$')
+
+
+def fit_lines(x, y):
+    """
+    Least-squares line y = m*x + b along the last axis, for every row at
+    once. NaNs are left out of the fit of their row.
+
+    Returns (m, b, rms) with the shape of x without its last axis.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ok = ~(np.isnan(x) | np.isnan(y))
+    n = ok.sum(axis=-1)
+    x0 = np.where(ok, x, 0)
+    y0 = np.where(ok, y, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = x0.sum(axis=-1) / n
+        my = y0.sum(axis=-1) / n
+        dx = np.where(ok, x - mx[..., None], 0)
+        dy = np.where(ok, y - my[..., None], 0)
+        m = (dx * dy).sum(axis=-1) / (dx * dx).sum(axis=-1)
+        b = my - m * mx
+        rms = np.sqrt((np.where(ok, dy - m[..., None] * dx, 0)**2).sum(axis=-1) / n)
+    return m, b, rms
+
+
+class PinCalibration:
+
+    def __init__(self, setup, wavelengths, m, b, rms=None, date=None, revision=None, **meta):
+        """
+        :param setup: name of the optical setup, e.g. 'SPM-OPO'
+        :param wavelengths: OPO wavelengths in nm, ascending
+        :param m, b: slope (W/mW) and offset (W) at each wavelength
+        :param date: day of the calibration, datetime.date or 'YYYY-MM-DD'
+        :param meta: anything else worth keeping, e.g. hwp_positions
+        """
+        order = np.argsort(wavelengths)
+        self.setup = setup
+        self.wavelengths = np.asarray(wavelengths, dtype=float)[order]
+        self.m = np.asarray(m, dtype=float)[order]
+        self.b = np.asarray(b, dtype=float)[order]
+        self.rms = None if rms is None else np.asarray(rms, dtype=float)[order]
+        self.date = str(date or datetime.date.today())
+        self.revision = revision
+        self.meta = meta
+
+    @classmethod
+    def fit(cls, setup, wavelengths, tap_mw, pinc_w, **kwargs):
+        """
+        Fit from a sweep: tap_mw and pinc_w have one row per wavelength and
+        one column per HWP setting.
+        """
+        m, b, rms = fit_lines(tap_mw, pinc_w)
+        return cls(setup, wavelengths, m, b, rms, **kwargs)
+
+    @property
+    def name(self):
+        return '{}/{}-v{}'.format(self.setup, self.date, self.revision)
+
+    def at(self, wavelength):
+        """
+        (m, b) at `wavelength` in nm, linearly interpolated between the
+        calibrated wavelengths and held constant beyond them.
+        """
+        if not self.wavelengths[0] <= wavelength <= self.wavelengths[-1]:
+            log.warning('%s nm is outside the calibration %s (%s-%s nm)', wavelength, self.name,
+                        self.wavelengths[0], self.wavelengths[-1])
+        return (float(np.interp(wavelength, self.wavelengths, self.m)),
+                float(np.interp(wavelength, self.wavelengths, self.b)))
+
+    def __call__(self, tap_mw, wavelength):
+        m, b = self.at(wavelength)
+        return m * np.asarray(tap_mw) + b
+
+    def function(self, wavelength):
+        """
+        The calibration at one wavelength as a function of the tap reading
+        in mW, e.g. for SPMAcquisition(calibration=...).
+        """
+        m, b = self.at(wavelength)
+        return lambda x: m * x + b
+
+    def to_dict(self):
+        return {'schema': SCHEMA, 'setup': self.setup, 'date': self.date,
+                'revision': self.revision, 'wavelengths': self.wavelengths.tolist(),
+                'm': self.m.tolist(), 'b': self.b.tolist(),
+                'rms': None if self.rms is None else self.rms.tolist(), 'meta': self.meta}
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get('schema', 1) > SCHEMA:
+            raise ValueError('Calibration schema {} is newer than this module ({})'.format(d['schema'], SCHEMA))
+        return cls(d['setup'], d['wavelengths'], d['m'], d['b'], d.get('rms'), d['date'],
+                   d.get('revision'), **d.get('meta', {}))
+
+
+class CalibrationCache:
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _files(self, setup):
+        files = []
+        for path in glob.glob(os.path.join(self.directory, setup, '*.json')):
+            match = FILENAME.match(os.path.basename(path))
+            if match:
+                files.append((match.group('date'), int(match.group('revision')), path))
+        return sorted(files)
+
+    def save(self, calibration):
+        """
+        Write `calibration` as the next revision of its setup and date.
+        Returns the path written.
+        """
+        folder = os.path.join(self.directory, calibration.setup)
+        os.makedirs(folder, exist_ok=True)
+        revisions = [r for d, r, _ in self._files(calibration.setup) if d == calibration.date]
+        calibration.revision = max(revisions, default=0) + 1
+        path = os.path.join(folder, '{}-v{}.json'.format(calibration.date, calibration.revision))
+        with open(path, 'x') as f:
+            json.dump(calibration.to_dict(), f, indent=1)
+        log.debug('Saved calibration %s', calibration.name)
+        return path
+
+    def load(self, setup, date=None, max_age=None):
+        """
+        Latest calibration of `setup`, or the latest one made on or before
+        `date`. Raises FileNotFoundError if there is none.
+
+        :param max_age: log a warning if the calibration is older than this
+            many days
+        """
+        files = self._files(setup)
+        if date is not None:
+            files = [f for f in files if f[0] <= str(date)]
+        if not files:
+            raise FileNotFoundError('No calibration for {} in {}'.format(setup, self.directory))
+        with open(files[-1][2]) as f:
+            calibration = PinCalibration.from_dict(json.load(f))
+        age = (datetime.date.today() - datetime.date.fromisoformat(calibration.date)).days
+        if max_age is not None and age > max_age:
+            log.warning('Calibration %s is %d days old', calibration.name, age)
+        return calibration
+
+    def history(self, setup):
+        """
+        (date, revision) of every saved calibration of `setup`, oldest first.
+        """
+        return [(d, r) for d, r, _ in self._files(setup)]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:51:36 2026
+
+Model-based power setting with the HWP on the KDC101 and a Newport2936R.
+
+The scripts used to step the HWP one unit at a time until the power meter
+agreed with the target, reading the meter twice per step for up to 100
+steps. A half-wave plate in front of a polarizer follows Malus' law
+
+    P(theta) = A*sin^2(2*(theta - theta0)) + B
+
+which is linear in (1, cos 4theta, sin 4theta), so a few readings give A,
+theta0 and B by least squares. They are taken over a small span around the
+current angle, so calibrating never swings the sample through full power. The angle for a target power is then
+computed directly, and a Newton step or two on the fitted slope absorbs the
+drift since the fit:
+
+    controller = MalusPowerController(kdc, pm)
+    controller.calibrate()            # once per session, or after realignment
+    controller.set_power(20e-6)       # W, usually 1-3 moves
+
+adjust_power_level(target, pm, kdc) keeps the old call of the scripts and
+holds one controller per (pm, kdc) pair, fitted on first use.
+"""
+
+import time
+
+import numpy as np
+
+from instrumentation import get_logger
+
+log = get_logger('power_control')
+
+PERIOD = 90.0  # deg, period of P(theta)
+
+
+class MalusPowerController:
+
+    def __init__(self, kdc, pm, read=None, settle_time=0.5, atol=1e-6, rtol=0.0, max_moves=5,
+                 max_step=10.0, limits=None, calibration_span=10.0):
+        """
+        :param kdc: KDC101 holding the HWP, stage model already set
+        :param pm: Newport2936R, channel 1 on the controlled beam
+        :param read: function of pm returning the controlled power in W;
+            pm.GetPowerCH1() if None
+        :param settle_time: wait in seconds after a move before reading
+        :param atol, rtol: set_power() is done when |P - target| is within
+            max(atol, rtol*target), in W
+        :param max_moves: moves allowed per set_power(), including the first
+        :param max_step: largest Newton correction in degrees
+        :param limits: (min, max) HWP positions allowed, e.g. to stay below
+            the damage threshold of a sample
+        :param calibration_span: width in degrees of the default
+            calibration, centred on the current position
+        """
+        self.kdc = kdc
+        self.pm = pm
+        self.read = read if read is not None else (lambda pm: pm.GetPowerCH1())
+        self.settle_time = settle_time
+        self.atol = atol
+        self.rtol = rtol
+        self.max_moves = max_moves
+        self.max_step = max_step
+        self.limits = limits
+        self.calibration_span = calibration_span
+        self.amplitude = None
+        self.theta0 = None
+        self.offset = None
+        self.position = None
+        self.moves = 0
+
+    def measure(self, position):
+        self.position = self.kdc.SetPosition(position)
+        self.moves += 1
+        time.sleep(self.settle_time)
+        return self.read(self.pm)
+
+    def fit(self, positions, powers):
+        """
+        Least-squares fit of A, theta0 and B to at least three readings.
+        """
+        positions = np.asarray(positions, dtype=float)
+        phase = np.radians(4 * positions)
+        design = np.column_stack([np.ones_like(phase), np.cos(phase), np.sin(phase)])
+        (c0, c1, c2), *_ = np.linalg.lstsq(design, np.asarray(powers, dtype=float), rcond=None)
+        # A*sin^2(2u) + B = B + A/2 - A/2*cos(4u)
+        self.amplitude = 2 * np.hypot(c1, c2)
+        self.theta0 = np.degrees(np.arctan2(-c2, -c1)) / 4 % PERIOD
+        self.offset = c0 - self.amplitude / 2
+        log.debug('Malus fit: A = %.4g W, theta0 = %.3f deg, B = %.4g W',
+                  self.amplitude, self.theta0, self.offset)
+        return self.amplitude, self.theta0, self.offset
+
+    def calibrate(self, positions=None):
+        """
+        Read the power at `positions` (deg) and fit the model. The default
+        is five points over calibration_span around the current position,
+        within the limits if set.
+        """
+        if positions is None:
+            start = self.kdc.GetPosition()
+            positions = start + np.linspace(-0.5, 0.5, 5) * self.calibration_span
+            if self.limits is not None:
+                positions = np.unique(np.clip(positions, *self.limits))
+        powers = [self.measure(p) for p in positions]
+        return self.fit(positions, powers)
+
+    def model(self, theta):
+        return self.amplitude * np.sin(np.radians(2 * (theta - self.theta0)))**2 + self.offset
+
+    def slope(self, theta):
+        # dP/dtheta in W per degree
+        return self.amplitude * np.sin(np.radians(4 * (theta - self.theta0))) * np.radians(2)
+
+    def angle_for(self, power, near=None):
+        """
+        HWP position giving `power` according to the fit, on the branch
+        closest to `near` (the current position by default) and within the
+        limits. Targets outside the fitted range go to the nearest extreme.
+        """
+        if near is None:
+            near = self.position if self.position is not None else self.kdc.GetPosition()
+        ratio = np.clip((power - self.offset) / self.amplitude, 0, 1)
+        half = np.degrees(np.arcsin(np.sqrt(ratio))) / 2
+        base = np.array([self.theta0 + half, self.theta0 - half])
+        turns = np.round((near - base[:, None]) / PERIOD) + np.array([-1, 0, 1])
+        candidates = (base[:, None] + turns * PERIOD).ravel()
+        if self.limits is not None:
+            inside = candidates[(candidates >= self.limits[0]) & (candidates <= self.limits[1])]
+            candidates = inside if len(inside) else np.clip(candidates, *self.limits)
+        return float(candidates[np.argmin(np.abs(candidates - near))])
+
+    def converged(self, power, target):
+        return abs(power - target) <= max(self.atol, self.rtol * target)
+
+    def set_power(self, target):
+        """
+        Move the HWP so the power reads `target` (W). Returns True when
+        within tolerance, False when max_moves ran out.
+        """
+        if self.amplitude is None:
+            self.calibrate()
+        self.moves = 0
+        theta = self.angle_for(target)
+        power = self.measure(theta)
+        while not self.converged(power, target):
+            if self.moves >= self.max_moves:
+                log.warning('Power %.4g W after %d moves, target %.4g W', power, self.moves, target)
+                return False
+            slope = self.slope(theta)
+            if slope == 0:
+                # At an extreme of the curve; nothing better to move to
+                log.warning('Target %.4g W at the edge of the HWP range (%.4g W)', target, power)
+                return False
+            theta += np.clip((target - power) / slope, -self.max_step, self.max_step)
+            if self.limits is not None:
+                theta = float(np.clip(theta, *self.limits))
+            power = self.measure(theta)
+        log.debug('Power %.4g W at %.3f deg after %d moves', power, theta, self.moves)
+        return True
+
+
+_controllers = {}
+
+
+def adjust_power_level(target, pm, kdc, atol=1e-6, rtol=0.0, max_moves=5, **kwargs):
+    """
+    Set the power on pm channel 1 to `target` (W) with the HWP on kdc. The
+    Malus fit is done on the first call for a given pm and kdc and reused
+    afterwards. Returns True once within tolerance.
+    """
+    key = (id(pm), id(kdc))
+    if key not in _controllers:
+        _controllers[key] = MalusPowerController(kdc, pm, **kwargs)
+    controller = _controllers[key]
+    controller.atol, controller.rtol, controller.max_moves = atol, rtol, max_moves
+    return controller.set_power(target)
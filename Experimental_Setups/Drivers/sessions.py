@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:40:12 2026
+
+Process-wide pool of instrument sessions.
+
+Scripts that repeat a measurement many times (e.g. PIV_measurement_automated.py)
+used to open a ResourceManager and every instrument again for each run. With
+a pool each instrument is opened once, on first use, and lent out to every
+run after that:
+
+    pool = SessionPool()
+    pool.register('pm', lambda rm: Newport2936R(PM_address, resource_manager=rm),
+                  check=lambda pm: pm.instrument.query('*IDN?'),
+                  reset=lambda pm: pm.instrument.write('*CLS'))
+
+    for run in range(50):
+        pool.reset()                     # bring instruments to a known state
+        with pool.lease('pm') as pm:
+            pm.GetPowerCH1()
+
+    pool.close()                         # also done at interpreter exit
+
+A lease checks the instrument first (if a check was registered) and reopens
+it when the check fails. An I/O error raised while the instrument is leased
+drops the session, so the next lease reconnects instead of reusing a dead
+handle.
+"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+
+from instrumentation import get_logger
+
+log = get_logger('sessions')
+
+# Errors that mean the connection is gone, as opposed to a bad value in a script.
+CONNECTION_ERRORS = (IOError, OSError, ConnectionError, TimeoutError)
+try:
+    import pyvisa as visa
+    CONNECTION_ERRORS += (visa.errors.VisaIOError, visa.errors.InvalidSession)
+except ImportError:
+    visa = None
+
+
+class Session:
+
+    def __init__(self, name, factory, check=None, reset=None, close=None):
+        self.name = name
+        self.factory = factory
+        self.check = check
+        self.reset = reset
+        self.close = close
+        self.instrument = None
+        self.lock = threading.RLock()
+        self.opens = 0
+
+
+class SessionPool:
+
+    def __init__(self, resource_manager=None):
+        """
+        :param resource_manager: shared VISA resource manager handed to the
+            factories; a pyvisa.ResourceManager() is created on first use if
+            none is given (e.g. simulators.SimulatedResourceManager).
+        """
+        self._rm = resource_manager
+        self.sessions = {}
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def rm(self):
+        if self._rm is None:
+            if visa is None:
+                raise ImportError('pyvisa is needed to open instruments; install it or give the '
+                                  'SessionPool a resource manager')
+            self._rm = visa.ResourceManager()
+        return self._rm
+
+    def register(self, name, factory, check=None, reset=None, close=None):
+        """
+        Declare an instrument. Nothing is opened until it is first leased.
+
+        :param factory: function of the resource manager returning the
+            driver, e.g. lambda rm: Newport2936R(address, resource_manager=rm)
+        :param check: function of the driver that raises if it no longer
+            answers, called at the start of every lease
+        :param reset: function of the driver bringing it back to a known
+            state, called by reset()
+        :param close: function of the driver closing it; defaults to the
+            driver's close() or its adapter's close()
+        """
+        with self.lock:
+            if name in self.sessions:
+                self._close(self.sessions[name])
+            self.sessions[name] = Session(name, factory, check, reset, close)
+
+    def _open(self, session):
+        session.instrument = session.factory(self.rm)
+        session.opens += 1
+        log.debug('%s opened (%d times so far)', session.name, session.opens)
+
+    def _close(self, session):
+        inst, session.instrument = session.instrument, None
+        if inst is None:
+            return
+        try:
+            if session.close is not None:
+                session.close(inst)
+            elif hasattr(inst, 'close'):
+                inst.close()
+            elif hasattr(inst, 'adapter'):
+                inst.adapter.close()
+        except Exception as e:
+            log.error('%s did not close cleanly: %s', session.name, e)
+
+    def _healthy(self, session):
+        if session.check is None:
+            return True
+        try:
+            session.check(session.instrument)
+            return True
+        except Exception as e:
+            log.error('%s failed its check, reconnecting: %s', session.name, e)
+            return False
+
+    def get(self, name):
+        """
+        Return the open driver for `name`, opening or reconnecting it if
+        needed. Prefer lease() when several threads share the pool.
+        """
+        session = self.sessions[name]
+        with session.lock:
+            if session.instrument is not None and not self._healthy(session):
+                self._close(session)
+            if session.instrument is None:
+                self._open(session)
+            return session.instrument
+
+    @contextmanager
+    def lease(self, name):
+        """
+        Lend the driver for `name` for the duration of a with-block. Other
+        threads leasing the same instrument wait until it is returned.
+        """
+        session = self.sessions[name]
+        with session.lock:
+            inst = self.get(name)
+            try:
+                yield inst
+            except CONNECTION_ERRORS:
+                log.error('%s raised a connection error, dropping the session', name)
+                self._close(session)
+                raise
+
+    def reset(self, *names):
+        """
+        Bring the named instruments (all if none given) back to a known state
+        between runs without reopening them. Instruments not opened yet are
+        skipped; they start fresh anyway.
+        """
+        for name in names or list(self.sessions):
+            session = self.sessions[name]
+            with session.lock:
+                if session.instrument is None or session.reset is None:
+                    continue
+                try:
+                    session.reset(session.instrument)
+                except CONNECTION_ERRORS as e:
+                    log.error('%s reset failed, reconnecting: %s', name, e)
+                    self._close(session)
+                    self._open(session)
+
+    def close(self):
+        for session in list(self.sessions.values()):
+            with session.lock:
+                self._close(session)
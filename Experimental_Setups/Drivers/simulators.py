@@ -0,0 +1,836 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:25:09 2026
+
+Simulated instruments for running the drivers and measurement scripts
+without hardware, e.g. in CI or to benchmark acquisition loops.
+
+Every simulated instrument talks to one shared OpticalBench, so the readings
+are coupled the way they are on the table: the HWP angle sets the power on
+the tap and through the sample, the OPO wavelength and the power set the SPM
+spectrum on the OSA, the Keithley current drives the DFB and the TC300
+temperature tunes it. Bus latency, sweep and move times and readout noise
+are modelled; `speedup` runs all of them faster than real time.
+
+    import simulators
+    sim = simulators.Simulation(speedup=10)
+    osa = AQ6315B('GPIB0::1::INSTR', resource_manager=sim.rm)
+    pm = Newport2936R('USB0::0x104D::0xCEC7::NI-VISA-10002::RAW', resource_manager=sim.rm)
+    kdc = KDC101(1, device=sim.kinesis_motor())
+    opo = sim.opo()
+    sim.install_tc300()                  # TC300() now loads the fake DLL
+    keithley = Keithley2450(sim.keithley_adapter())
+    yokogawa = Yokogawa6370(sim.yokogawa_communicator())
+
+Any VISA address opens a simulated instrument; the model is picked from
+the address (GPIB -> AQ6315B, 0x104D -> Newport2936R, 0x05E6 -> Keithley2450,
+TCPIP -> Yokogawa6370) unless registered explicitly with sim.rm.register().
+"""
+
+import io
+import re
+import abc
+import time
+import struct
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from pylablib.devices.Thorlabs import ThorlabsError
+except ImportError:
+    ThorlabsError = IOError
+
+
+class OpticalBench:
+    """
+    Shared physical state of the simulated setup and the models that turn it
+    into readings. Times are real seconds multiplied by `speedup`.
+    """
+
+    def __init__(self, speedup=1, seed=None):
+        self.speedup = speedup
+        self.rng = np.random.default_rng(seed)
+        self.start = time.time()
+        self.lock = threading.Lock()
+        # SPM setup
+        self.opo_wavelength = 1550.0      # nm
+        self.hwp_angle = 204.0            # deg
+        self.max_power = 0.1              # W incident at the HWP maximum
+        self.hwp_zero = 204.0             # deg of the power minimum
+        self.tap_m = 0.45059              # calibration(x, m, b) of the scripts
+        self.tap_b = -476.216e-7
+        self.transmission = 0.3           # linear sample transmission
+        self.saturation_power = 0.05      # W, nonlinear absorption
+        self.spm_width = 0.8              # nm, input FWHM
+        self.spm_gamma = 40.0             # SPM broadening per W
+        # DFB setup
+        self.current = 0.0                # A
+        self.threshold = 0.02             # A
+        self.slope_efficiency = 0.25      # W/A
+        self.rollover_current = 0.18      # A
+        self.dfb_wavelength = 1275.0      # nm at 25 C
+        self.dfb_tuning = 0.09            # nm/C
+        self.temperatures = {1: 25.0, 2: 25.0}
+        # noise
+        self.power_noise = 0.005          # relative
+        self.osa_floor = 1e-9             # W
+
+    def now(self):
+        # Simulated time in seconds
+        return (time.time() - self.start)*self.speedup
+
+    def sleep(self, seconds):
+        # Sleep for a simulated duration
+        if seconds > 0:
+            time.sleep(seconds/self.speedup)
+
+    def noise(self, value, relative=None):
+        relative = self.power_noise if relative is None else relative
+        return value*(1 + relative*self.rng.standard_normal())
+
+    def incident_power(self):
+        # Malus law for a HWP in front of a polarizer, in W
+        theta = np.radians(self.hwp_angle - self.hwp_zero)
+        return self.max_power*np.sin(2*theta)**2 + 1e-6
+
+    def tap_power(self):
+        # Inverse of the calibration used by the scripts: Pin = m*tap[mW] + b
+        return max((self.incident_power() - self.tap_b)/self.tap_m*1e-3, 0)
+
+    def output_power(self):
+        pin = self.incident_power()
+        return self.transmission*pin/(1 + pin/self.saturation_power)
+
+    def dfb_power(self):
+        i = self.current
+        if i <= self.threshold:
+            return 1e-6*i/self.threshold
+        p = self.slope_efficiency*(i - self.threshold)
+        # thermal rollover
+        return p*max(0, 1 - ((i - self.threshold)/(self.rollover_current - self.threshold))**4/4)
+
+    def dfb_voltage(self):
+        return 0.9 + 0.026*1.5*np.log1p(self.current/1e-9) + 4.0*self.current
+
+    def dfb_center(self):
+        return self.dfb_wavelength + self.dfb_tuning*(self.temperatures[2] - 25.0)
+
+    def spectrum(self, wavelength, resolution):
+        """
+        Spectrum in W per resolution bandwidth on the given wavelength grid
+        """
+        level = np.full(len(wavelength), self.osa_floor)
+        pin = self.incident_power()
+        if pin > 1e-5:
+            # SPM: the spectrum broadens with peak power and grows side lobes
+            width = np.hypot(self.spm_width*np.sqrt(1 + (self.spm_gamma*pin)**2), resolution)
+            x = (wavelength - self.opo_wavelength)/width
+            phi = self.spm_gamma*pin
+            shape = np.exp(-4*np.log(2)*x**2)*(1 + 0.3*np.tanh(phi/3)*np.cos(2*np.pi*x*phi/2)**2)
+            level += self.output_power()*shape*resolution/width
+        pdfb = self.dfb_power()
+        if pdfb > 0:
+            x = (wavelength - self.dfb_center())/max(resolution, 0.01)
+            level += pdfb/(1 + 4*x**2)
+        return level*(1 + 0.02*self.rng.standard_normal(len(wavelength)))
+
+
+class SimulatedResource(abc.ABC):
+    """
+    Stand-in for a pyvisa message based resource. Subclasses answer commands
+    in handle(); replies are queued as bytes and read back in order.
+    """
+
+    def __init__(self, bench, address, latency=5e-3, bytes_per_second=200e3):
+        self.bench = bench
+        self.resource_name = address
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.timeout = 2000
+        self.output = b''
+        self.lock = threading.Lock()
+        self.closed = False
+        self.srq = threading.Event()
+
+    def _transfer(self, nbytes):
+        self.bench.sleep(self.latency + nbytes/self.bytes_per_second)
+
+    @abc.abstractmethod
+    def handle(self, command):
+        """
+        Answer one command: a str or bytes reply to queue, or None.
+        """
+
+    def write(self, command, termination=None, encoding=None):
+        with self.lock:
+            self._transfer(len(command))
+            for cmd in command.strip().split(';'):
+                if cmd.strip():
+                    reply = self.handle(cmd.strip())
+                    if reply is not None:
+                        self.output += reply if isinstance(reply, bytes) else (str(reply) + '\r\n').encode()
+        return len(command)
+
+    def read_raw(self, size=None):
+        with self.lock:
+            if not self.output:
+                raise IOError('VI_ERROR_TMO: nothing to read from {}'.format(self.resource_name))
+            size = len(self.output) if size is None or size < 0 else size
+            data, self.output = self.output[:size], self.output[size:]
+            self._transfer(len(data))
+            return data
+
+    def read(self, termination=None, encoding=None):
+        with self.lock:
+            end = self.output.find(b'\n')
+            end = len(self.output) if end < 0 else end + 1
+        return self.read_raw(end).decode()
+
+    def query(self, command, delay=None):
+        self.write(command)
+        return self.read()
+
+    def clear(self):
+        self.output = b''
+
+    def wait_for_srq(self, timeout=25000):
+        if not self.srq.wait(timeout/1000/self.bench.speedup):
+            raise IOError('VI_ERROR_TMO: no service request from {}'.format(self.resource_name))
+
+    def read_stb(self):
+        fired = self.srq.is_set()
+        self.srq.clear()
+        return 0x41 if fired else 0
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedAQ6315B(SimulatedResource):
+    """
+    Ando AQ6315B: ASCII trace transfer, 'SWEEP?' sweep status, SRQ at the
+    end of a sweep.
+    """
+
+    def __init__(self, bench, address, **kwargs):
+        kwargs.setdefault('bytes_per_second', 100e3)  # GPIB with the Ando
+        SimulatedResource.__init__(self, bench, address, **kwargs)
+        self.settings = {'STAWL': 1530.0, 'STPWL': 1570.0, 'RESLN': 1.0, 'SMPL': 1001,
+                         'AVG': 1, 'SENS': 1, 'REFL': -30.0}
+        self.sweep_end = 0
+        self.sweep_mode = 0
+        self.srq_enabled = False
+        self.trace = None
+
+    def sweep_time(self):
+        return 0.5 + 1e-3*self.settings['SMPL']*self.settings['AVG']
+
+    def _take_trace(self):
+        wl = np.linspace(self.settings['STAWL'], self.settings['STPWL'], int(self.settings['SMPL']))
+        with self.bench.lock:
+            self.trace = (wl, self.bench.spectrum(wl, self.settings['RESLN']))
+
+    def _finish_sweep(self, token):
+        self.bench.sleep(self.sweep_time())
+        if token == self.sweep_end:
+            self._take_trace()
+            self.sweep_mode = 0
+            if self.srq_enabled:
+                self.srq.set()
+
+    def _trace_reply(self, values, window):
+        if window:
+            lo, hi = int(window.group(1)) - 1, int(window.group(2))
+            values = values[lo:hi]
+        return '{},'.format(len(values)) + ','.join('{:.6e}'.format(v) for v in values)
+
+    def handle(self, cmd):
+        cmd = cmd.upper()
+        if cmd == '*IDN?':
+            return 'ANDO,AQ6315B,SIMULATED,0'
+        if cmd == '*RST':
+            self.__init__(self.bench, self.resource_name)
+            return None
+        if cmd in ('CTRWL?', 'SPAN?'):
+            start, stop = self.settings['STAWL'], self.settings['STPWL']
+            return '{:.2f}'.format((start + stop)/2 if cmd == 'CTRWL?' else stop - start)
+        if cmd == 'SWEEP?':
+            return str(self.sweep_mode)
+        if cmd == 'LSCL?':
+            return 'LIN'  # traces are in W, as the SPM setup uses the Ando
+        if cmd in ('SMPL?', 'AVG?', 'SENS?'):
+            return str(int(self.settings[cmd[:-1]]))
+        if cmd.endswith('?') and cmd[:-1] in self.settings:
+            return '{:.2f}'.format(self.settings[cmd[:-1]])
+        if cmd == 'SGL':
+            if self.trace is None:
+                self._take_trace()
+            self.sweep_mode = 1
+            self.sweep_end += 1
+            threading.Thread(target=self._finish_sweep, args=(self.sweep_end,), daemon=True).start()
+            return None
+        if cmd in ('SRQ0', 'SRQ1'):
+            self.srq_enabled = cmd == 'SRQ1'
+            self.srq.clear()
+            return None
+        if cmd.startswith('LDATA') or cmd.startswith('WDATA'):
+            if self.trace is None:
+                self._take_trace()
+            window = re.match(r'[LW]DATA\s*R(\d+)-R(\d+)', cmd)
+            return self._trace_reply(self.trace[0] if cmd[0] == 'W' else self.trace[1], window)
+        match = re.match(r'([A-Z]+)\s*([-+.\dE]+)$', cmd)
+        if match:
+            key, value = match.group(1), float(match.group(2))
+            if key == 'CTRWL':
+                span = self.settings['STPWL'] - self.settings['STAWL']
+                self.settings['STAWL'], self.settings['STPWL'] = value - span/2, value + span/2
+            elif key == 'SPAN':
+                center = (self.settings['STPWL'] + self.settings['STAWL'])/2
+                self.settings['STAWL'], self.settings['STPWL'] = center - value/2, center + value/2
+            elif key in self.settings:
+                self.settings[key] = value
+        return None
+
+
+class SimulatedSCPI(SimulatedResource):
+    """
+    Generic SCPI instrument: 'KEY value' stores a setting and 'KEY?' returns
+    it. Subclasses add the commands that need a model.
+    """
+
+    idn = 'SIMULATED,SCPI,0,0'
+
+    def __init__(self, bench, address, **kwargs):
+        SimulatedResource.__init__(self, bench, address, **kwargs)
+        self.settings = {}
+
+    @staticmethod
+    def key(cmd):
+        return re.sub(r'[a-z]', '', cmd.split(' ')[0]).upper().lstrip(':')
+
+    def handle(self, cmd):
+        if cmd.upper() == '*IDN?':
+            return self.idn
+        if cmd.upper() in ('*RST', '*CLS'):
+            return None
+        key = self.key(cmd)
+        if key.endswith('?'):
+            return self.settings.get(key[:-1], '0')
+        parts = cmd.split(' ', 1)
+        self.settings[key] = parts[1].strip() if len(parts) > 1 else ''
+        return None
+
+
+class SimulatedNewport2936R(SimulatedSCPI):
+    """
+    Newport 2936-R dual channel power meter with the PM:DS data store.
+    Channel 1 reads the tap (plus the DFB), channel 2 the sample output.
+    """
+
+    idn = 'NEWPORT,2936-R,SIMULATED,0'
+
+    def __init__(self, bench, address, **kwargs):
+        SimulatedSCPI.__init__(self, bench, address, **kwargs)
+        self.settings.update({'PM:CHAN': '1', 'PM:LAMBDA': '1550', 'PM:DS:SIZE': '100',
+                              'PM:DS:INT': '1', 'PM:DS:BUF': '0'})
+        self.ds_start = None
+
+    def power(self, channel):
+        with self.bench.lock:
+            if channel == 1:
+                pwr = self.bench.tap_power() + self.bench.dfb_power()
+            else:
+                pwr = self.bench.output_power()
+        return self.bench.noise(pwr)
+
+    def ds_count(self):
+        if self.ds_start is None:
+            return 0
+        interval = 1e-4*float(self.settings['PM:DS:INT'])
+        return int(min(int(self.settings['PM:DS:SIZE']), (self.bench.now() - self.ds_start)/interval))
+
+    def handle(self, cmd):
+        key = self.key(cmd)
+        if key == 'PM:PWS?':
+            return '{:e} 0 {:e} 0'.format(self.power(1), self.power(2))
+        if key == 'PM:DS:CLEAR':
+            self.ds_start = None
+            return None
+        if key == 'PM:DS:EN' and cmd.split()[-1] == '1':
+            self.ds_start = self.bench.now()
+            return None
+        if key == 'PM:DS:COUNT?':
+            return str(self.ds_count())
+        if key == 'PM:DS:GET?':
+            channel = int(self.settings['PM:CHAN'])
+            match = re.search(r'(\d+)-(\d+)', cmd)
+            first, last = (int(match.group(1)), int(match.group(2))) if match else (1, self.ds_count())
+            values = [self.power(channel) for _ in range(first, min(last, self.ds_count()) + 1)]
+            return ('Newport Corporation\r\nSimulated data store\r\n' +
+                    ''.join('{:e}\r\n'.format(v) for v in values) + 'End of Data')
+        return SimulatedSCPI.handle(self, cmd)
+
+
+class SimulatedKeithley2450(SimulatedSCPI):
+    """
+    Keithley 2450 sourcing current into the DFB, with the list sweep
+    trigger model and binary buffer readout.
+    """
+
+    idn = 'KEITHLEY INSTRUMENTS,MODEL 2450,SIMULATED,0'
+
+    def __init__(self, bench, address, **kwargs):
+        SimulatedSCPI.__init__(self, bench, address, **kwargs)
+        self.settings.update({'SOUR:FUNC': 'CURR', 'OUTP': '0', 'FORM:DATA': 'ASCII', 'FORM:BORD': 'NORM'})
+        self.sweep_list = []
+        self.sweep_delay = 0.0
+        self.buffer = []
+
+    def _run_sweep(self):
+        for current in self.sweep_list:
+            with self.bench.lock:
+                self.bench.current = current
+            self.bench.sleep(self.sweep_delay + 0.02)
+            with self.bench.lock:
+                self.buffer.append((current, self.bench.noise(self.bench.dfb_voltage(), 1e-4)))
+
+    def _block(self, values):
+        if self.settings['FORM:DATA'].startswith('REAL'):
+            order = '<' if self.settings['FORM:BORD'] == 'SWAP' else '>'
+            data = struct.pack('{}{}d'.format(order, len(values)), *values)
+            size = str(len(data)).encode()
+            return b'#' + str(len(size)).encode() + size + data + b'\n'
+        return ','.join('{:e}'.format(v) for v in values)
+
+    def handle(self, cmd):
+        key = self.key(cmd)
+        if key in ('READ?', 'MEAS:VOLT?'):
+            with self.bench.lock:
+                return '{:e}'.format(self.bench.noise(self.bench.dfb_voltage(), 1e-4))
+        if key == 'SOUR:CURR:LEV':
+            with self.bench.lock:
+                self.bench.current = float(cmd.split()[-1])
+            return None
+        if key == 'SOUR:CURR?':
+            return '{:e}'.format(self.bench.current)
+        if key in ('OUTPUT', 'OUTP'):
+            self.settings['OUTP'] = '1' if cmd.split()[-1].upper() == 'ON' else '0'
+            if self.settings['OUTP'] == '0':
+                self.bench.current = 0.0
+            return None
+        if key in ('OUTPUT?', 'OUTP?'):
+            return self.settings['OUTP']
+        if key in ('SYST:ERR?', 'SYST:ERR:NEXT?'):
+            return '0,"No error;0;0 0"'
+        if key == 'SOUR:LIST:CURR':
+            self.sweep_list = [float(v) for v in cmd.split(' ', 1)[1].split(',')]
+            return None
+        if key == 'SOUR:LIST:CURR:APP':
+            self.sweep_list += [float(v) for v in cmd.split(' ', 1)[1].split(',')]
+            return None
+        if key == 'SOUR:SWE:CURR:LIST':
+            self.sweep_delay = float(cmd.split(' ', 1)[1].split(',')[1])
+            return None
+        if key in ('INIT', 'INIT:IMM'):
+            self.buffer = []
+            threading.Thread(target=self._run_sweep, daemon=True).start()
+            return None
+        if key == 'TRAC:CLE':
+            self.buffer = []
+            return None
+        if key == 'TRAC:ACT?':
+            return str(len(self.buffer))
+        if key == 'TRAC:DATA?':
+            n = int(cmd.split(' ', 1)[1].split(',')[1])
+            return self._block([v for row in self.buffer[:n] for v in row])
+        return SimulatedSCPI.handle(self, cmd)
+
+
+class SimulatedYokogawa6370(SimulatedSCPI):
+    """
+    Yokogawa AQ6370 with REAL,64 binary trace transfer and the operation
+    event register.
+    """
+
+    idn = 'YOKOGAWA,AQ6370D,SIMULATED,02.08'
+
+    def __init__(self, bench, address, **kwargs):
+        kwargs.setdefault('bytes_per_second', 1e6)  # ethernet
+        SimulatedSCPI.__init__(self, bench, address, **kwargs)
+        self.settings.update({'SENS:WAV:STAR': '1.53e-06', 'SENS:WAV:STOP': '1.57e-06',
+                              'SENS:BAND:RES': '1e-10', 'SENS:SWE:POIN': '1001', 'TRAC:ACTIVE': 'TRA'})
+        self.event = 0
+        self.trace = None
+
+    def _run_sweep(self):
+        points = int(float(self.settings['SENS:SWE:POIN']))
+        self.bench.sleep(0.3 + 2e-4*points)
+        wl = np.linspace(float(self.settings['SENS:WAV:STAR']), float(self.settings['SENS:WAV:STOP']), points)
+        with self.bench.lock:
+            level = self.bench.spectrum(wl*1e9, float(self.settings['SENS:BAND:RES'])*1e9)
+        self.trace = (wl, 10*np.log10(level*1e3))
+        self.event |= 1
+
+    def handle(self, cmd):
+        key = self.key(cmd)
+        if key == 'INIT':
+            self.event = 0
+            threading.Thread(target=self._run_sweep, daemon=True).start()
+            return None
+        if key == 'STATUS:OPERATION:EVENT?' or key == 'STAT:OPER:EVEN?':
+            event, self.event = self.event, 0
+            return str(event)
+        if key == '*STB?':
+            return '0'
+        if key in ('SENS:WAV:SPAN?', 'SENS:WAV:CENT?'):
+            start, stop = float(self.settings['SENS:WAV:STAR']), float(self.settings['SENS:WAV:STOP'])
+            return '{:e}'.format(stop - start if 'SPAN' in key else (start + stop)/2)
+        if key in ('TRAC:X?', 'TRAC:Y?'):
+            if self.trace is None:
+                self._run_sweep()
+            args = cmd.split(' ', 1)[1].split(',')
+            values = self.trace[0] if key == 'TRAC:X?' else self.trace[1]
+            if len(args) == 3:
+                values = values[int(args[1]) - 1:int(args[2])]
+            data = struct.pack('<{}d'.format(len(values)), *values)
+            size = str(len(data)).encode()
+            return b'#' + str(len(size)).encode() + size + data + b'\n'
+        if key == 'CALC:DATA?':
+            return '0,0,0'
+        return SimulatedSCPI.handle(self, cmd)
+
+
+class SimulatedResourceManager:
+    """
+    Stand-in for pyvisa.ResourceManager handing out simulated instruments.
+    """
+
+    models = [('GPIB', SimulatedAQ6315B), ('0x104D', SimulatedNewport2936R),
+              ('0x05E6', SimulatedKeithley2450), ('TCPIP', SimulatedYokogawa6370)]
+
+    def __init__(self, bench):
+        self.bench = bench
+        self.registered = {}
+        self.resources = {}
+
+    def register(self, address, model):
+        self.registered[address] = model
+
+    def list_resources(self, query='?*::INSTR'):
+        return tuple(self.registered)
+
+    def open_resource(self, address, **kwargs):
+        if address in self.resources and not self.resources[address].closed:
+            return self.resources[address]
+        model = self.registered.get(address)
+        if model is None:
+            model = next((m for key, m in self.models if key.upper() in address.upper()), None)
+        if model is None:
+            raise ValueError('No simulated instrument for {}'.format(address))
+        self.resources[address] = model(self.bench, address)
+        return self.resources[address]
+
+    def close(self):
+        for resource in self.resources.values():
+            resource.close()
+
+
+AptMessage = namedtuple('AptMessage', ['messageID', 'param1', 'param2', 'source', 'dest', 'data'])
+
+
+class SimulatedKinesisMotor:
+    """
+    Stand-in for pylablib's KinesisMotor driving a PRM1-Z8 rotation stage.
+    Understands the APT messages used by KDC101 and sends
+    MOT_MOVE_COMPLETED at the end of a move.
+    """
+
+    def __init__(self, bench, SN='27000001', scale=1919.6418578623391, velocity=10.0, latency=2e-3):
+        self.bench = bench
+        self.SN = SN
+        self.Description = 'Simulated Brushed Motor Controller'
+        self.scale = scale              # counts per degree
+        self.velocity = velocity        # deg/s
+        self.latency = latency
+        self.position = int(bench.hwp_angle*scale)
+        self.move_from = self.position
+        self.move_to = self.position
+        self.move_start = 0
+        self.move_time = 0
+        self.completed_sent = True
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def _update(self):
+        elapsed = self.bench.now() - self.move_start
+        if elapsed >= self.move_time:
+            self.position = self.move_to
+            if not self.completed_sent:
+                self.completed_sent = True
+                self.messages.append(AptMessage(0x0464, 1, 0, 0x01, 0x50, struct.pack('<Hi', 1, self.position) + bytes(8)))
+        else:
+            self.position = int(self.move_from + (self.move_to - self.move_from)*elapsed/self.move_time)
+        with self.bench.lock:
+            self.bench.hwp_angle = self.position/self.scale
+
+    def _move(self, target):
+        self._update()
+        self.move_from = self.position
+        self.move_to = int(target)
+        self.move_start = self.bench.now()
+        self.move_time = abs(self.move_to - self.move_from)/self.scale/self.velocity + 0.05
+        self.completed_sent = False
+
+    def send_comm(self, messageID, param1=0x00, param2=0x00, source=0x50, dest=0x01):
+        self.bench.sleep(self.latency)
+        with self.lock:
+            self._update()
+            if messageID == 0x0411:
+                self.messages.append(AptMessage(0x0412, 1, 0, 0x01, 0x50, struct.pack('<Hi', 1, self.position)))
+            elif messageID == 0x0429:
+                moving = 0x20 if self.move_to > self.position else 0x10 if self.move_to < self.position else 0
+                status = 0x80000000 | 0x400 | (0 if moving else 0x2000) | moving
+                self.messages.append(AptMessage(0x042A, 1, 0, 0x01, 0x50, struct.pack('<HI', 1, status)))
+            elif messageID == 0x0443:
+                self._move(0)
+
+    def send_comm_data(self, messageID, data, source=0x50, dest=0x01):
+        self.bench.sleep(self.latency)
+        with self.lock:
+            if messageID == 0x0453:
+                self._move(struct.unpack('<i', data[2:6])[0])
+
+    def recv_comm(self, expected_id=None):
+        deadline = time.time() + 3
+        while time.time() < deadline:
+            with self.lock:
+                self._update()
+                if self.messages:
+                    return self.messages.pop(0)
+            time.sleep(1e-3)
+        raise ThorlabsError('simulated APT read timed out')
+
+    def move_by(self, distance=1, scale=True):
+        with self.lock:
+            self._update()
+            self._move(self.position + distance)
+
+    def wait_move(self, timeout=None):
+        while True:
+            with self.lock:
+                self._update()
+                if self.position == self.move_to:
+                    return
+            time.sleep(1e-3)
+
+    def get_device_info(self):
+        return (self.SN, 'KDC101', 'simulated', 1)
+
+    def get_full_info(self):
+        return {'device_info': self.get_device_info(), 'position': self.position}
+
+    def blink(self):
+        pass
+
+    def _get_scale(self):
+        return (self.scale, self.scale, self.scale)
+
+    def close(self):
+        pass
+
+
+class SimulatedOPO:
+    """
+    Stand-in for the OPO driver used by the SPM and NLA scripts.
+    Wavelengths are in angstroms, as in the scripts.
+    """
+
+    def __init__(self, bench, tuning_time=1.0):
+        self.bench = bench
+        self.tuning_time = tuning_time
+
+    def connect(self):
+        pass
+
+    def SetWavelength(self, wavelength):
+        self.bench.sleep(self.tuning_time)
+        with self.bench.lock:
+            self.bench.opo_wavelength = wavelength*0.1
+
+    def close(self):
+        pass
+
+
+class SimulatedTC300Lib:
+    """
+    Stand-in for TC300COMMANDLIB_win64.dll. Channels follow a first order
+    thermal response to their target. Arguments passed with byref() are
+    written through, as the DLL does; unknown calls succeed and do nothing.
+    """
+
+    def __init__(self, bench, tau=20.0, noise=0.005, latency=5e-3):
+        self.bench = bench
+        self.tau = tau
+        self.noise = noise
+        self.latency = latency
+        self.targets = {1: 25.0, 2: 25.0}
+        self.enabled = {1: 0, 2: 0}
+        self.last = {1: bench.now(), 2: bench.now()}
+        self.open = False
+
+    def _temperature(self, channel):
+        now = self.bench.now()
+        with self.bench.lock:
+            if self.enabled[channel]:
+                temps = self.bench.temperatures
+                temps[channel] = self.targets[channel] + (temps[channel] - self.targets[channel])*np.exp(-(now - self.last[channel])/self.tau)
+            self.last[channel] = now
+            return self.bench.temperatures[channel] + self.noise*self.bench.rng.standard_normal()
+
+    def List(self, buffer, size):
+        buffer.value = b'TC300SIM,COM99'
+        return 0
+
+    def Open(self, serialNo, nBaud, timeout):
+        self.open = True
+        return 0
+
+    def IsOpen(self, serialNo):
+        return int(self.open)
+
+    def GetHandle(self, serialNo):
+        return 0 if self.open else -1
+
+    def Close(self, hdl):
+        self.open = False
+        return 0
+
+    def GetId(self, hdl, buffer, size):
+        buffer.value = b'THORLABS TC300 SIMULATED'
+        return 0
+
+    def GetStatus(self, hdl, status):
+        status._obj.value = self.enabled[1] | self.enabled[2] << 1 | 1 << 2
+        return 0
+
+    def EnableChannel(self, hdl, channel, status):
+        self._temperature(channel)
+        self.enabled[channel] = status.value
+        return 0
+
+    def SetTargetTemperature(self, hdl, channel, temperature):
+        self._temperature(channel)
+        self.targets[channel] = temperature.value
+        return 0
+
+    def GetTargetTemperature(self, hdl, channel, temperature):
+        temperature._obj.value = self.targets[channel]
+        return 0
+
+    def GetActualTemperature(self, hdl, channel, temperature):
+        self.bench.sleep(self.latency)
+        temperature._obj.value = self._temperature(channel)
+        return 0
+
+    def GetMonitorMessage(self, hdl, info1, info2):
+        self.bench.sleep(self.latency)
+        for channel, info in ((1, info1._obj), (2, info2._obj)):
+            info.target_temperature = self.targets[channel]
+            info.actual_temperature = self._temperature(channel)
+        return 0
+
+    def __getattr__(self, name):
+        def call(*args):
+            return 0
+        return call
+
+
+class Simulation:
+    """
+    One simulated setup: a bench and the factories for every instrument.
+    """
+
+    def __init__(self, speedup=1, seed=None):
+        self.bench = OpticalBench(speedup, seed)
+        self.rm = SimulatedResourceManager(self.bench)
+
+    def kinesis_motor(self, **kwargs):
+        return SimulatedKinesisMotor(self.bench, **kwargs)
+
+    def opo(self, **kwargs):
+        return SimulatedOPO(self.bench, **kwargs)
+
+    def install_tc300(self, **kwargs):
+        """
+        Make TC300() use the simulated DLL instead of loading the real one.
+        """
+        from TC300_COMMAND_LIB import TC300
+        TC300.tc300Lib = SimulatedTC300Lib(self.bench, **kwargs)
+        TC300.isLoad = True
+        return TC300.tc300Lib
+
+    def keithley_adapter(self, address='USB0::0x05E6::0x2450::SIM::INSTR'):
+        """
+        pymeasure adapter for Keithley2450(adapter).
+        """
+        from pymeasure.adapters import Adapter
+
+        resource = self.rm.open_resource(address)
+
+        class SimulatedAdapter(Adapter):
+            def _write(self, command, **kwargs):
+                resource.write(command)
+
+            def _write_bytes(self, content, **kwargs):
+                resource.write(content.decode())
+
+            def _read(self, **kwargs):
+                return resource.read().rstrip('\r\n')
+
+            def _read_bytes(self, count, break_on_termchar=False, **kwargs):
+                return resource.read_raw(count)
+
+        return SimulatedAdapter()
+
+    def yokogawa_communicator(self, address='TCPIP0::192.168.0.35::INSTR'):
+        """
+        InstrumentKit communicator for Yokogawa6370(communicator).
+        """
+        from instruments.abstract_instruments.comm import AbstractCommunicator
+
+        resource = self.rm.open_resource(address)
+
+        class SimulatedCommunicator(AbstractCommunicator):
+            address = resource.resource_name
+            terminator = '\n'
+            timeout = 2
+
+            def close(self):
+                resource.close()
+
+            def read_raw(self, size=-1):
+                if size < 0:
+                    return resource.read().encode()
+                return resource.read_raw(size)
+
+            def write_raw(self, msg):
+                resource.write(msg.decode())
+
+            def seek(self, offset):
+                raise io.UnsupportedOperation('simulated communicator is not seekable')
+
+            def tell(self):
+                raise io.UnsupportedOperation('simulated communicator is not seekable')
+
+            def flush_input(self):
+                resource.clear()
+
+            def _sendcmd(self, msg):
+                resource.write(msg)
+
+            def _query(self, msg, size=-1):
+                return resource.query(msg).rstrip('\r\n')
+
+        return SimulatedCommunicator()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:21:44 2026
+
+Append-only HDF5 store for OSA spectra, one file per measurement campaign.
+
+Instead of one text file per sweep with the metadata in its name, every sweep
+becomes a row of two chunked 2-D datasets plus one row of a metadata table:
+
+    /spectra/wavelength   (n_sweeps, n_points)  nm
+    /spectra/level        (n_sweeps, n_points)  OSA level
+    /sweeps               (n_sweeps,)           time, wavelength, position,
+                                                power, num, ... per sweep
+
+Campaign-wide information (device, chip, date, OSA settings) goes in the
+file attributes. Writing a sweep is one resize and two slice assignments, and
+the metadata of the whole campaign is read in a single call:
+
+    store = SpectrumStore('SPM-NA-WG-SERP-L1-D0-18dec23.h5', device='NA-WG-SERP-L1-D0')
+    store.append(osa.GetTrace(), wavelength=1550.0, position=204.0, power=0.23869)
+    ...
+    sweeps = store.sweeps()                      # structured array
+    rows = store.select(wavelength=1550.0)       # indices
+    wl, level = store.spectrum(rows[0])
+
+Needs h5py.
+"""
+
+import time
+import threading
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# Per-sweep metadata of the SPM campaigns; extra fields can be given to the store.
+SWEEP_FIELDS = [('time', float), ('wavelength', float), ('position', float),
+                ('power', float), ('num', int)]
+
+
+class SpectrumStore:
+
+    def __init__(self, filename, mode='a', points=None, fields=None, chunk=64, **attrs):
+        """
+        :param filename: HDF5 file of the campaign, created if missing
+        :param mode: 'a' to append, 'r' to read only
+        :param points: number of samples per spectrum; taken from the first
+            spectrum appended if None
+        :param fields: extra per-sweep metadata fields as (name, dtype)
+            pairs, added to SWEEP_FIELDS when the file is created
+        :param chunk: number of sweeps per HDF5 chunk
+        :param attrs: campaign metadata stored as file attributes
+        """
+        if h5py is None:
+            raise ImportError('SpectrumStore needs h5py')
+        self.filename = filename
+        self.file = h5py.File(filename, mode)
+        self.chunk = chunk
+        self.lock = threading.Lock()
+        for key, value in attrs.items():
+            self.file.attrs[key] = value
+        if 'sweeps' not in self.file:
+            self.dtype = np.dtype(SWEEP_FIELDS + list(fields or []))
+            self.file.create_dataset('sweeps', shape=(0,), maxshape=(None,), dtype=self.dtype,
+                                     chunks=(chunk,))
+        else:
+            self.dtype = self.file['sweeps'].dtype
+        if points is not None and 'spectra' not in self.file:
+            self._create_spectra(points)
+
+    def _create_spectra(self, points):
+        group = self.file.create_group('spectra')
+        for name in ['wavelength', 'level']:
+            group.create_dataset(name, shape=(0, points), maxshape=(None, points), dtype=float,
+                                 chunks=(self.chunk, points), compression='gzip', shuffle=True)
+
+    @property
+    def points(self):
+        return self.file['spectra/level'].shape[1] if 'spectra' in self.file else None
+
+    def __len__(self):
+        return len(self.file['sweeps'])
+
+    def append(self, trace, **meta):
+        """
+        Add one spectrum and its metadata, flush it to disk and return its
+        index.
+
+        :param trace: structured array with 'wavelength' and 'level' fields,
+            as returned by AQ6315B.GetTrace(), or a (wavelength, level) pair
+        :param meta: values of the per-sweep fields; 'time' defaults to now,
+            missing numeric fields are stored as NaN or 0
+        """
+        if isinstance(trace, np.ndarray) and trace.dtype.names:
+            wavelength, level = trace['wavelength'], trace['level']
+        else:
+            wavelength, level = trace
+        unknown = set(meta) - set(self.dtype.names)
+        if unknown:
+            raise KeyError('Unknown sweep fields {}'.format(sorted(unknown)))
+        row = np.zeros(1, dtype=self.dtype)
+        for name in self.dtype.names:
+            if self.dtype[name].kind == 'f':
+                row[name] = np.nan
+        row['time'] = time.time()
+        for key, value in meta.items():
+            row[key] = value
+
+        with self.lock:
+            if 'spectra' not in self.file:
+                self._create_spectra(len(level))
+            if len(level) != self.points:
+                raise ValueError('Spectrum has {} points, store holds {}'.format(len(level), self.points))
+            n = len(self)
+            for name, data in [('wavelength', wavelength), ('level', level)]:
+                dset = self.file['spectra'][name]
+                dset.resize(n+1, axis=0)
+                dset[n] = data
+            sweeps = self.file['sweeps']
+            sweeps.resize(n+1, axis=0)
+            sweeps[n] = row[0]
+            self.file.flush()
+        return n
+
+    def sweeps(self):
+        """
+        Metadata of all sweeps as a structured array, one row per spectrum.
+        """
+        return self.file['sweeps'][:]
+
+    def select(self, **conditions):
+        """
+        Indices of the sweeps whose fields equal the given values, e.g.
+        select(wavelength=1550.0, num=1). Floats are compared with np.isclose.
+        """
+        sweeps = self.sweeps()
+        mask = np.ones(len(sweeps), dtype=bool)
+        for key, value in conditions.items():
+            if sweeps.dtype[key].kind == 'f':
+                mask &= np.isclose(sweeps[key], value)
+            else:
+                mask &= sweeps[key] == value
+        return np.flatnonzero(mask)
+
+    def spectrum(self, index):
+        """
+        (wavelength, level) of one sweep, or 2-D arrays for an index array.
+        """
+        if not np.isscalar(index):
+            index = np.sort(np.asarray(index))
+        return self.file['spectra/wavelength'][index], self.file['spectra/level'][index]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -14,7 +14,7 @@ import logging
 
 # Importing custom libraries for the optical instruments
 from OSA import AQ6315B
-from TC300_COMMAND_LIB import TC300
+from TC300_COMMAND_LIB import TC300, TC300Settling
 #from Newport2936R import Newport2936R
 #from KDC101 import KDC101
 import csv
@@ -125,23 +125,23 @@ def main():
             
             
         
-        for level in temperature_levels:
+        settling = TC300Settling(tc, tolerance=0.1)
+        settling.step(channel, temperature_levels[0])
+        
+        for i, level in enumerate(temperature_levels):
             
-            tc.set_target_temperature(channel, level)
             print(f"Setting temperature to {level} °C...")
             
-                    
-                
-            while abs(level - tc.get_actual_temperature(channel, [level])[0] ) >= 0.1:  # Adjust to your required precision 
-                time.sleep(1)
-                print(tc.get_actual_temperature(channel, [level])[0])
+            # Slope-and-variance criterion instead of polling to 0.1 °C plus a fixed 2 s
+            if not settling.wait_settled(channel):
+                print(f"Temperature did not settle at {level} °C")
                 
-            
-            time.sleep(2)
             print("Taking an OSA sweep...")
-            time.sleep(1)  # Time to allow the power to stabilize
             osa.SingleScan()
             osa.WaitForSweepFinish()
+            # The sweep is done, so the next setpoint can be commanded while the trace is read out
+            if i+1 < len(temperature_levels):
+                settling.precommand(channel, temperature_levels[i+1])
             #time.sleep(15)  # Time for the scan to complete Depends on number of points and averag use 15s for p=100 avg =3
             # x = datetime.datetime.now()   # Attempt to insert datetime labeling to each lab file 
             # print(x)
@@ -15,7 +15,7 @@ import time
 import logging
 from TC300_COMMAND_LIB import TC300
 import csv
-from pymeasure.instruments.keithley import Keithley2450
+from keithley2450 import Keithley2450
 import numpy as np
 
 
@@ -78,6 +78,8 @@ def main(run_index):
     ascending = np.linspace(0, 200, 200)  # Adjust range and number of points as needed
     descending = np.linspace(200, 0, 200)  # Adjust range and number of points as needed
     currents = np.append(ascending,descending)
+    # Settling time after each current step before a spectrum is taken
+    settle_time = 0.2
     
     voltages = []
 
@@ -90,17 +92,13 @@ def main(run_index):
         sourcemeter.enable_source()
         sourcemeter.measure_voltage()
 
+        # I-V of the whole up and down sweep in one hardware-timed list sweep
+        _, voltages = sourcemeter.sweep_current(currents*1e-3)
 
-
-        for current in currents:
-            sourcemeter.ramp_to_current((current*1e-3))
-            time.sleep(5)  # Stabilization time
-
-
-
-
-            voltage = sourcemeter.voltage
-            voltages.append(voltage)
+        # Spectra: step to each current again and hold it for the OSA scan
+        for current, voltage in zip(currents, voltages):
+            sourcemeter.source_current = current*1e-3
+            time.sleep(settle_time)
             
             # Configure OSA settings
             osa.SetMeasurementMode(measurement_mode)
@@ -161,14 +159,16 @@ def main(run_index):
         sourcemeter.shutdown()
         osa.close()
         
-        plt.figure()
-        plt.plot(currents, voltages, '-o')
-        plt.xlabel('Current (mA)')
-        plt.ylabel('Voltage (V)')
-        plt.title('Current vs Voltage')
-        plt.grid(True)
-        plt.savefig(f'current_vs_voltage_run{run_index}.png')
-        plt.show()
+        # No I-V if the run was interrupted before the sweep finished
+        if len(voltages) == len(currents):
+            plt.figure()
+            plt.plot(currents, voltages, '-o')
+            plt.xlabel('Current (mA)')
+            plt.ylabel('Voltage (V)')
+            plt.title('Current vs Voltage')
+            plt.grid(True)
+            plt.savefig(f'current_vs_voltage_run{run_index}.png')
+            plt.show()
 
 if __name__ == "__main__":
     for i in range(1, num_runs + 1):
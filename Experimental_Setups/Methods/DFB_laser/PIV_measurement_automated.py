@@ -13,10 +13,11 @@ import pyvisa as visa
 import matplotlib.pyplot as plt
 import time
 import logging
-from TC300_COMMAND_LIB import TC300
 from Newport2936R import Newport2936R
+from sessions import SessionPool
+from piv_analysis import AdaptiveSweep
 import csv
-from pymeasure.instruments.keithley import Keithley2450
+from keithley2450 import Keithley2450
 import numpy as np
 
 # Initialize logging
@@ -27,21 +28,38 @@ time.sleep(120)
 # Number of experiment runs
 num_runs = 50  # Modify this number based on how many times you want the experiment to run
 
+tc_address = 'ASRL3::INSTR'
+PM_address = 'USB0::0x104D::0xCEC7::NI-VISA-30011::RAW'
+keith_address = 'USB0::0x05E6::0x2450::04577394::INSTR'
+
+def reset_sourcemeter(sourcemeter):
+    # Factory state and a clear status; main() sets up the source again
+    sourcemeter.reset()
+    sourcemeter.clear()
+    sourcemeter.isShutdown = False
+
+# Instruments are opened once, on first use, and kept open for all runs
+pool = SessionPool()
+pool.register('pm', lambda rm: Newport2936R(PM_address, resource_manager=rm),
+              check=lambda pm: pm.instrument.query('*IDN?'),
+              reset=lambda pm: pm.instrument.write('*CLS'))
+pool.register('sourcemeter', lambda rm: Keithley2450(keith_address),
+              check=lambda sm: sm.id,
+              reset=reset_sourcemeter)
+
 def main(run_index):
     
 
-    # Initialize instruments
-    tc_address = 'ASRL3::INSTR'
-    tc = TC300()
-    
-    PM_address = 'USB0::0x104D::0xCEC7::NI-VISA-30011::RAW'
-    PM = Newport2936R(PM_address)
-    
-    keith_address = 'USB0::0x05E6::0x2450::04577394::INSTR'
-    sourcemeter = Keithley2450(keith_address)
+    # Lease the instruments from the pool instead of reopening them
+    pool.reset()
+    PM = pool.get('pm')
+    sourcemeter = pool.get('sourcemeter')
 
     # Number of measurements to average for each current step
     num_measurements = 2
+    # Settling time after each current step; the source steps directly
+    # instead of ramping, and the chip is temperature controlled
+    settle_time = 0.2
 
     # Prepare CSV file for storing results, unique filename for each run
     csv_filename = f'PIV_new_chip_wateroff_2avg_MAX140mW_run{run_index}.csv'
@@ -51,7 +69,9 @@ def main(run_index):
 
 
 
-    currents = np.linspace(0, 200, 200)  # Adjust range and number of points as needed
+    # Coarse steps, refined to 0.5 mA around the threshold once it shows up
+    sweep = AdaptiveSweep(0, 200, coarse=4, fine=0.5, window=10)  # Adjust range and step sizes as needed
+    currents = []
     powers = []
     voltages = []
 
@@ -67,35 +87,48 @@ def main(run_index):
         print(sourcemeter.voltage)
         print(PM.GetPowerCH1())
 
-        power_measurements = []
-
-        for current in currents:
-            sourcemeter.ramp_to_current((current*1e-3))
-            time.sleep(5)  # Stabilization time
+        # L-I: step the current and read the power at every point of the sweep
+        for current in sweep:
+            sourcemeter.source_current = current*1e-3
+            time.sleep(settle_time)
 
-            for _ in range(num_measurements):
-                power = PM.GetPowerCH1()
-                # Correction steps
-                if power > 1:
-                    time.sleep(5)
-                    power = PM.GetPowerCH1()
-                power_measurements.append(power)
+            # Few readings are queried directly, many come from the data store
+            power_measurements = PM.GetPowers(num_measurements)
+            # Correction steps
+            if power_measurements.max() > 1:
+                time.sleep(5)
+                power_measurements = PM.GetPowers(num_measurements)
 
-            average_power = sum(power_measurements) / num_measurements
+            average_power = power_measurements.mean()
             print(average_power)
+            currents.append(current)
             powers.append(average_power)
-            voltage = sourcemeter.voltage
-            voltages.append(voltage)
 
-            with open(csv_filename, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([current, voltage, average_power])
+            # Online L-I fit; also decides where the next current goes
+            events = sweep.record(current, average_power)
+            if 'threshold' in events:
+                logging.info(f'Run {run_index}: threshold {sweep.threshold:.2f} mA, '
+                             f'slope efficiency {sweep.slope:.4f} W/A')
+            if 'rollover' in events:
+                logging.info(f'Run {run_index}: rollover at {sweep.rollover:.1f} mA')
+
+        # Refinement points are measured out of order
+        order = np.argsort(currents)
+        currents = np.array(currents)[order]
+        powers = np.array(powers)[order]
+
+        # I-V: the same currents again as one hardware-timed list sweep
+        _, voltages = sourcemeter.sweep_current(currents*1e-3)
+
+        with open(csv_filename, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerows(zip(currents, voltages, powers))
 
     finally:
         # Clean up and plot
+        # Source off between runs; the connections stay open in the pool
         sourcemeter.shutdown()
-        PM.close()
-        tc.close()
+        print(f'Threshold: {sweep.threshold} mA, slope efficiency: {sweep.slope} W/A, rollover: {sweep.rollover} mA')
 
         plt.figure()
         plt.plot(currents, powers, '-o')
@@ -106,15 +139,20 @@ def main(run_index):
         plt.savefig(f'current_vs_power_averaged_run{run_index}.png')
         plt.show()
 
-        plt.figure()
-        plt.plot(currents, voltages, '-o')
-        plt.xlabel('Current (mA)')
-        plt.ylabel('Voltage (V)')
-        plt.title('Current vs Voltage (Averaged over {} measurements)'.format(num_measurements))
-        plt.grid(True)
-        plt.savefig(f'current_vs_voltage_run{run_index}.png')
-        plt.show()
+        # No I-V sweep if the run was interrupted during the L-I
+        if len(voltages) == len(currents):
+            plt.figure()
+            plt.plot(currents, voltages, '-o')
+            plt.xlabel('Current (mA)')
+            plt.ylabel('Voltage (V)')
+            plt.title('Current vs Voltage (Averaged over {} measurements)'.format(num_measurements))
+            plt.grid(True)
+            plt.savefig(f'current_vs_voltage_run{run_index}.png')
+            plt.show()
 
 if __name__ == "__main__":
-    for i in range(1, num_runs + 1):
-        main(i)
+    try:
+        for i in range(1, num_runs + 1):
+            main(i)
+    finally:
+        pool.close()
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:52:10 2026
+
+Streaming statistics of repeated PIV runs.
+
+Runs are folded in one row at a time, from the CSV files written by
+PIV_measurement_automated.py or straight from the acquisition loop, so memory
+only grows with the number of current steps, not with the number of runs:
+
+    agg = PIVAggregator(tolerance=0.05)
+    for path in glob.glob('PIV_..._run*.csv'):
+        agg.add_run(path)
+    table = agg.table()          # mean, std and confidence band per current
+    threshold_current(table['Current (mA)'], table['Average Power (W)'])
+
+Currents are binned on a fixed grid of width `tolerance` (mA), centred on
+its multiples, instead of being grouped on their exact float value, so steps
+from np.linspace that differ in the last digits still land in the same bin.
+Sweeps meant to be averaged should step on multiples of the tolerance, since
+points near a bin edge can fall on either side of it. Each bin keeps Welford
+running mean and variance (Welford 1962; Knuth, TAOCP vol. 2, 4.2.2) of
+every column.
+
+AdaptiveSweep does the same analysis during a single run: it tracks the
+threshold, slope efficiency and rollover as points come in and picks the
+next current, fine near threshold and coarse elsewhere.
+"""
+
+import csv
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.stats import t as student_t
+except ImportError:
+    student_t = None
+
+CURRENT = 'Current (mA)'
+COLUMNS = ['Voltage (V)', 'Average Power (W)']
+
+
+class PIVAggregator:
+
+    def __init__(self, tolerance=0.05, columns=COLUMNS):
+        """
+        :param tolerance: width of a current bin in mA. Bins are a fixed
+            grid centred on multiples of tolerance (round(I/tolerance)), so
+            currents within tolerance/2 of the same multiple are averaged
+            together, while two close currents either side of a bin edge
+            are not
+        :param columns: measured columns accumulated besides the current
+        """
+        self.tolerance = tolerance
+        self.columns = list(columns)
+        self.bins = {}  # bin -> [n, mean, M2], mean and M2 over [current] + columns
+        self.runs = 0
+
+    def add(self, current, *values, **named):
+        """
+        Fold one measurement into its bin. Values are given in the order of
+        `columns`, or by column name; missing values are NaN and do not count.
+        """
+        if named:
+            values = [named.get(c, np.nan) for c in self.columns]
+        x = np.full(len(self.columns) + 1, np.nan)
+        x[0] = current
+        x[1:len(values) + 1] = values
+        key = int(round(current / self.tolerance))
+        if key not in self.bins:
+            self.bins[key] = [np.zeros(len(x)), np.zeros(len(x)), np.zeros(len(x))]
+        n, mean, m2 = self.bins[key]
+        ok = ~np.isnan(x)
+        n[ok] += 1
+        delta = x[ok] - mean[ok]
+        mean[ok] += delta / n[ok]
+        m2[ok] += delta * (x[ok] - mean[ok])
+
+    def add_row(self, row):
+        """
+        Fold one CSV row given as a dict, as read by csv.DictReader.
+        """
+        self.add(float(row[CURRENT]), **{c: float(row[c]) for c in self.columns
+                                          if row.get(c) not in (None, '')})
+
+    def add_run(self, path):
+        """
+        Fold a whole run file in, row by row. Returns the number of rows.
+        """
+        rows = 0
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                self.add_row(row)
+                rows += 1
+        self.runs += 1
+        return rows
+
+    def merge(self, other):
+        """
+        Combine the bins of another aggregator with the same tolerance and
+        columns (Chan et al. parallel update), e.g. one per worker or day.
+        """
+        for key, (nb, mb, m2b) in other.bins.items():
+            if key not in self.bins:
+                self.bins[key] = [nb.copy(), mb.copy(), m2b.copy()]
+                continue
+            na, ma, m2a = self.bins[key]
+            n = na + nb
+            safe = np.where(n > 0, n, 1)
+            delta = mb - ma
+            ma += delta * nb / safe
+            m2a += m2b + delta**2 * na * nb / safe
+            na[:] = n
+        self.runs += other.runs
+
+    def table(self, confidence=0.95):
+        """
+        One row per current bin, sorted by current: the mean current of the
+        bin, the number of samples n, and for every column its mean (under
+        the column name), std, and the lower and upper confidence band of
+        the mean.
+        """
+        keys = sorted(self.bins)
+        if not keys:
+            return pd.DataFrame(columns=[CURRENT, 'n'])
+        n = np.array([self.bins[k][0] for k in keys])
+        mean = np.array([self.bins[k][1] for k in keys])
+        m2 = np.array([self.bins[k][2] for k in keys])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2 / (n - 1))
+            half = _quantile(confidence, n - 1) * std / np.sqrt(n)
+
+        table = pd.DataFrame({CURRENT: mean[:, 0], 'n': n[:, 1:].max(axis=1).astype(int)})
+        for i, column in enumerate(self.columns, start=1):
+            table[column] = mean[:, i]
+            table[column + ' std'] = std[:, i]
+            table[column + ' low'] = mean[:, i] - half[:, i]
+            table[column + ' high'] = mean[:, i] + half[:, i]
+        return table
+
+
+def _quantile(confidence, dof):
+    # Two-sided quantile of Student's t, or of the normal distribution
+    # without scipy (a few percent too narrow below ~30 samples).
+    p = 0.5 + confidence / 2
+    dof = np.asarray(dof, dtype=float)
+    if student_t is not None:
+        with np.errstate(invalid='ignore'):
+            return np.where(dof > 0, student_t.ppf(p, np.maximum(dof, 1)), np.nan)
+    return np.where(dof > 0, NormalDist().inv_cdf(p), np.nan)
+
+
+def threshold_current(current, power, low=0.2, high=0.8):
+    """
+    Lasing threshold and slope efficiency from an L-I curve.
+
+    A line is fitted to the points between `low` and `high` times the peak
+    power, taken on the rising edge up to the peak so thermal rollover is
+    left out. The threshold is where that line crosses zero power.
+
+    :param current: in mA
+    :param power: in W
+    Returns (threshold in mA, slope efficiency in W/A), NaNs if fewer than
+    two points fall in the window.
+    """
+    current = np.asarray(current, dtype=float)
+    power = np.asarray(power, dtype=float)
+    ok = ~(np.isnan(current) | np.isnan(power))
+    current, power = current[ok], power[ok]
+    if len(current) < 2:
+        return np.nan, np.nan
+    order = np.argsort(current)
+    current, power = current[order], power[order]
+    peak = np.argmax(power)
+    rising = slice(0, peak + 1)
+    fit = (power[rising] >= low * power[peak]) & (power[rising] <= high * power[peak])
+    if fit.sum() < 2:
+        return np.nan, np.nan
+    slope, intercept = np.polyfit(current[rising][fit], power[rising][fit], 1)
+    return -intercept / slope, slope * 1e3
+
+
+class AdaptiveSweep:
+    """
+    Current steps of one L-I run, chosen while the run is measured.
+
+        sweep = AdaptiveSweep(0, 200, coarse=4, fine=0.5)
+        for current in sweep:
+            ...                          # set the current, read the power
+            sweep.record(current, power)
+        sweep.threshold, sweep.slope, sweep.rollover
+
+    The sweep climbs in coarse steps and fits the L-I curve after every
+    point. As soon as a lasing threshold can be extracted, the `window`
+    around it is filled in with fine steps, on multiples of `fine` so that
+    repeated runs measure the same currents and share the bins of
+    PIVAggregator (use a tolerance that divides `fine`, and a start that is
+    a multiple of it for the coarse steps), then the coarse climb resumes
+    from the highest current measured so far. The refinement goes back down
+    by at most window/2 + coarse, a small enough step to set directly.
+    Rollover is flagged once the power has dropped `rollover_drop` below its
+    peak at a higher current.
+    """
+
+    def __init__(self, start, stop, coarse=4.0, fine=0.5, window=10.0, min_power=1e-4,
+                 rollover_drop=0.05, stop_at_rollover=False):
+        """
+        :param start, stop, coarse, fine, window: in mA
+        :param min_power: power in W the curve has to exceed before a
+            threshold is looked for, so noise below lasing is not fitted
+        :param stop_at_rollover: end the run once rollover is detected
+        """
+        self.start = start
+        self.stop = stop
+        self.coarse = coarse
+        self.fine = fine
+        self.window = window
+        self.min_power = min_power
+        self.rollover_drop = rollover_drop
+        self.stop_at_rollover = stop_at_rollover
+        self.currents = []
+        self.powers = []
+        self.threshold = None
+        self.slope = None
+        self.rollover = None
+        self.refined = False
+
+    def record(self, current, power):
+        """
+        Add one measured point and update threshold, slope efficiency and
+        rollover. Returns the names of the events first seen at this point,
+        a subset of {'threshold', 'rollover'}.
+        """
+        self.currents.append(float(current))
+        self.powers.append(float(power))
+        current, power = self.curve()
+        events = set()
+
+        peak = np.argmax(power)
+        if power[peak] < self.min_power:
+            return events
+        threshold, slope = threshold_current(current, power)
+        if not np.isnan(threshold) and slope > 0 and current[0] <= threshold <= current[peak]:
+            if self.threshold is None:
+                events.add('threshold')
+            self.threshold, self.slope = threshold, slope
+        if (self.rollover is None and current[-1] > current[peak]
+                and power[-1] < (1 - self.rollover_drop) * power[peak]):
+            self.rollover = current[peak]
+            events.add('rollover')
+        return events
+
+    def curve(self):
+        """
+        (current, power) arrays of the points so far, sorted by current.
+        """
+        current = np.array(self.currents)
+        order = np.argsort(current, kind='stable')
+        return current[order], np.array(self.powers)[order]
+
+    def __iter__(self):
+        eps = 1e-9
+        queue = [self.start]
+        while queue:
+            current = queue.pop(0)
+            yield current
+            if self.rollover is not None and self.stop_at_rollover:
+                return
+            if queue:
+                continue
+            if self.threshold is not None and not self.refined:
+                self.refined = True
+                measured = np.array(self.currents)
+                # On multiples of fine, not offset from this run's threshold,
+                # so the fine currents of repeated runs coincide
+                lo = max(self.start, self.threshold - self.window/2)
+                hi = min(self.stop, self.threshold + self.window/2)
+                grid = np.arange(np.ceil(lo/self.fine - eps)*self.fine, hi + eps, self.fine)
+                queue.extend(round(float(c), 9) for c in grid if np.min(np.abs(measured - c)) > self.fine/2)
+            if not queue:
+                top = max(self.currents) if self.currents else current
+                if top < self.stop - eps:
+                    queue.append(min(top + self.coarse, self.stop))
@@ -1,22 +1,21 @@
 import glob
 import matplotlib.pyplot as plt
-import pandas as pd
+from piv_analysis import PIVAggregator, threshold_current
 
 # Define the file pattern for all runs
 file_pattern = 'c:/UO/Characterization/W112_5CB12_PIV_DFB_roomtemp/All_Runs_data/PIV_new_chip_wateroff_2avg_MAX140mW_run*.csv'
 files = glob.glob(file_pattern)
 
-# Initialize an empty list to store data from all files
-all_data = []
-
-# Loop through each file and append the data to the list
+# Fold the runs in one at a time; currents within 0.05 mA share a bin
+aggregator = PIVAggregator(tolerance=0.05)
 for file in files:
-    df = pd.read_csv(file)
-    all_data.append(df)
+    aggregator.add_run(file)
+
+# Mean, std and 95% confidence band of 'Average Power (W)' per current
+averaged_df = aggregator.table(confidence=0.95)
 
-# Concatenate all data and group by 'Current (mA)' to calculate the mean of 'Average Power (W)'
-combined_df = pd.concat(all_data)
-averaged_df = combined_df.groupby('Current (mA)').mean().reset_index()
+threshold, slope = threshold_current(averaged_df['Current (mA)'], averaged_df['Average Power (W)'])
+print(f'{aggregator.runs} runs, threshold {threshold:.2f} mA, slope efficiency {slope:.4f} W/A')
 
 # Save the averaged data to a new CSV file
 output_file = 'c:/UO/Characterization/W112_5CB12_PIV_DFB_roomtemp/averaged_power_values.csv'
@@ -25,9 +24,13 @@ averaged_df.to_csv(output_file, index=False)
 # Plot the results
 plt.figure()
 plt.plot(averaged_df['Current (mA)'], averaged_df['Average Power (W)'], marker='o')
+plt.fill_between(averaged_df['Current (mA)'], averaged_df['Average Power (W) low'],
+                 averaged_df['Average Power (W) high'], alpha=0.3, label='95% confidence')
+plt.axvline(threshold, color='k', linestyle='--', label=f'I_th = {threshold:.1f} mA')
 plt.xlabel('Current (mA)')
 plt.ylabel('Average Power (W)')
 plt.title('Average Power vs Current')
+plt.legend()
 plt.grid(True)
 plt.show()
 
@@ -11,6 +11,7 @@ import numpy as np
 import pandas as pd
 from scipy.optimize import curve_fit
 from matplotlib.ticker import FormatStrFormatter
+from fp_fit import fit_spectrum
 
 def Pout(beta, eta, R1, R2, a, L, Pinc):
     return (eta*(1-R1)*(1-R2)*np.exp(-a*L)*Pinc)/(1-2*np.sqrt(R1*R2)*np.exp(-a*L)*np.cos(2*beta*L)+R1*R2*np.exp(-2*a*L))
@@ -72,5 +73,22 @@ print('Initial wavelength = ',format(liminf*1e9,".2f"),' nm')
 print('Final wavelength = ',format(limsup*1e9,".2f"),' nm')
 print('Step size = ',format(step*1e9,".4f"),' nm')
 
-
-
+#########################################################
+# Fit of the measured spectrum with the same model
+# (fit_all and cutback in fp_fit.py do this for a whole cut-back set)
+#
+xdata = data.iloc[:, 0].to_numpy(float) # (nm)
+ydata = data.iloc[:, 1].to_numpy(float) # (uW)
+fit = fit_spectrum(xdata, ydata, length, Pinc, neff_guess=neff)
+plt.plot(xdata, ydata, '.', label='Measured')
+plt.plot(xdata, Pout(2*np.pi*fit['neff']/(xdata*1e-9), fit['eta'], fit['R'], fit['R'],
+                     100*fit['alpha'], L, Pinc), label='Fit')
+plt.xlabel('Wavelength (nm)')
+plt.ticklabel_format(axis='x',useOffset=False)
+plt.ylabel('Output power (uW)')
+plt.legend()
+plt.grid()
+plt.show()
+print('Fitted propagation loss = ',format(fit['alpha_db'],".2f"),' +/- ',format(fit['alpha_db_err'],".2f"),' dB/cm')
+print('Fitted effective index = ',format(fit['neff'],".4f"))
+print('Fitted coupling efficiency = ',format(fit['eta'],".3f"))
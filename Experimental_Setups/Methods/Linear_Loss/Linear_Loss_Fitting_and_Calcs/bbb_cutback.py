@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 2026-10-18. Layout from Fabrication/Tapeout/PICs/Basic_Building_Block_Tapeout_att3.py
+
+Cut-back analysis of a basic building block die against its layout manifest.
+
+The tapeout script writes <gds>.manifest.json next to the GDS, one entry per
+test structure with its length, number of bends, bend radius, in-line
+inverse tapers, ring radius and gap. Measured insertion losses are joined to
+it on the device name ('straight_loss-3', 'bend_loss_1-7', ...) and
+
+    IL = a*length_cm + b*bends + c*couplers + d*rings + facets
+
+is solved by least squares over all sets at once: a in dB/cm, b in dB/bend,
+c in dB/coupler (one in-line inverse taper), d the off-resonance excess of a
+ring in dB and facets the coupling loss of the two facet edge couplers. With
+one column per wavelength the whole spectrum is solved in one lstsq call:
+
+    manifest = load_manifest('NOI-BBBs.manifest.json')
+    table = join(manifest, measured)           # measured: device, [wavelength], il
+    losses = fit_losses(table)                 # one row per wavelength
+    losses = fit_losses(table, bends_by='bend_radius')   # dB/bend per radius
+
+measured may also give power and pinc (same unit) instead of il, e.g. the
+output of fp_fit.fit_all() with a device column added.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+TERMS = ('length_cm', 'bends', 'couplers', 'rings')
+
+
+def load_manifest(filename):
+    """
+    Test structures of a manifest as a DataFrame, one row per device, with
+    length_cm added. The layout parameters are kept in .attrs.
+    """
+    with open(filename) as f:
+        manifest = json.load(f)
+    structures = pd.DataFrame(manifest['structures'])
+    structures['length_cm'] = structures['length'] / 1e4
+    structures.attrs = {k: manifest[k] for k in ('die', 'gds', 'written', 'parameters') if k in manifest}
+    return structures
+
+
+def join(manifest, measured, on='device'):
+    """
+    Attach the layout parameters to every measurement. Measurements of
+    devices missing from the manifest are dropped. An il column (dB) is
+    computed from power and pinc if not given.
+    """
+    measured = pd.DataFrame(measured)
+    if 'il' not in measured:
+        measured = measured.assign(il=-10 * np.log10(measured['power'] / measured['pinc']))
+    columns = [c for c in manifest.columns if c == on or c not in measured.columns]
+    return measured.merge(manifest[columns], on=on, how='inner', validate='many_to_one')
+
+
+def _columns(devices, terms, bends_by):
+    columns = {}
+    for term in terms:
+        if term == 'bends' and bends_by is not None:
+            for value in sorted(devices.loc[devices['bends'] > 0, bends_by].unique()):
+                name = 'bends@{:g}'.format(value) if isinstance(value, float) else 'bends@{}'.format(value)
+                columns[name] = np.where(devices[bends_by] == value, devices['bends'], 0)
+        else:
+            columns[term] = devices[term].to_numpy(float)
+    columns['facets'] = np.ones(len(devices))
+    return columns
+
+
+def design(devices, terms=TERMS, bends_by=None):
+    """
+    Design matrix of the loss model, one row per device, and the names of
+    its columns. With bends_by (e.g. 'bend_radius' or 'bend_type') the
+    bends column is split into one column per value, named 'bends@<value>'.
+    Columns that are zero for every device are left out, as nothing can be
+    said about them.
+    """
+    columns = _columns(devices, terms, bends_by)
+    names = [k for k, v in columns.items() if np.any(v != 0)]
+    return np.column_stack([columns[k] for k in names]), names
+
+
+def fit_losses(table, terms=TERMS, bends_by=None, loss='il'):
+    """
+    Least-squares loss coefficients over every measured device, solved for
+    all wavelengths at once (one per wavelength column value, or a single
+    row without one). Wavelengths where any device is missing are dropped.
+
+    Returns a DataFrame with, per wavelength, each coefficient, its standard
+    error (<name>_err), the rms residual (dB), the degrees of freedom and
+    the number of devices. Raises ValueError if the measured devices do not
+    separate the terms.
+    """
+    if 'wavelength' in table:
+        Y = table.pivot_table(index='device', columns='wavelength', values=loss, aggfunc='mean')
+    else:
+        Y = table.groupby('device')[[loss]].mean()
+    Y = Y.dropna(how='all').dropna(axis=1)
+    devices = table.drop_duplicates('device').set_index('device').loc[Y.index]
+    A, names = design(devices, terms, bends_by)
+
+    rank = np.linalg.matrix_rank(A)
+    if rank < A.shape[1]:
+        raise ValueError('The measured devices do not separate the terms {} ({} devices, rank {})'
+                         .format(names, len(A), rank))
+
+    coef, *_ = np.linalg.lstsq(A, Y.to_numpy(float), rcond=None)
+    resid = Y.to_numpy(float) - A @ coef
+    dof = len(A) - A.shape[1]
+    s2 = np.sum(resid**2, axis=0) / max(dof, 1)
+    err = np.sqrt(np.outer(np.diag(np.linalg.inv(A.T @ A)), s2))
+
+    losses = pd.DataFrame(index=Y.columns)
+    for k, name in enumerate(names):
+        losses[name] = coef[k]
+        losses[name + '_err'] = err[k] if dof > 0 else np.nan
+    losses['rms'] = np.sqrt(np.mean(resid**2, axis=0))
+    losses['dof'] = dof
+    losses['devices'] = len(A)
+    return losses.rename_axis(Y.columns.name).reset_index() if 'wavelength' in table else losses.reset_index(drop=True)
+
+
+def residuals(table, losses, terms=TERMS, bends_by=None, loss='il'):
+    """
+    Measured minus modelled loss of every row of `table`, to spot badly
+    cleaved or damaged devices.
+    """
+    columns = _columns(table, terms, bends_by)
+    names = [k for k in columns if k in losses.columns]
+    A = np.column_stack([columns[k] for k in names])
+    if 'wavelength' in table:
+        coef = losses.set_index('wavelength').loc[table['wavelength'], names].to_numpy(float)
+    else:
+        coef = np.broadcast_to(losses[names].to_numpy(float)[0], A.shape)
+    model = np.sum(A * coef, axis=1)
+    return table.assign(model=model, residual=table[loss] - model)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 2026-10-18. Model as in Linear_loss_fitting.py, after G Tittelbach et al 1993 Pure Appl. Opt. 2 683
+
+Least-squares fit of the Fabry-Perot model to measured spectra, for every
+waveguide of a cut-back set in parallel.
+
+The model of Linear_loss_fitting.py, with R1 = R2 = R(neff),
+
+    Pout = eta (1-R)^2 e^{-aL} Pinc / (1 - 2 R e^{-aL} cos(2 beta L) + R^2 e^{-2aL}),
+    beta = 2 pi neff / lambda,
+
+is fitted for eta, a and neff with scipy's least_squares and the analytic
+Jacobian below. Starting values come from fp_loss.extract() on the same
+spectrum, with neff moved to the nearest value that puts a fringe maximum on
+the highest measured peak: the phase 2 beta L is some 1e5 rad, so a start
+from the fringe spacing alone would land several orders away. The fringe
+order itself is not observable; the fitted neff is the one closest to the
+spacing estimate. Fit spans of a few nm, where dispersion is negligible.
+
+    fits = fit_all(wavelength, spectra, lengths_mm, pinc)     # one row per waveguide
+    cutback(fits)          # loss vs length regression over the set
+
+Scripts calling fit_all must keep their top level code under
+if __name__ == "__main__", since the workers import the script's module.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import least_squares
+
+from fp_loss import extract, DB
+
+
+def reflectance(neff):
+    return (neff - 1)**2 / (neff + 1)**2
+
+
+def pout(params, wavelength, L, Pinc):
+    """
+    Model output power. params = (eta, a, neff) with a in 1/m; wavelength
+    and L in m.
+    """
+    eta, a, neff = params
+    R = reflectance(neff)
+    x = np.exp(-a * L)
+    phase = 4 * np.pi * neff * L / wavelength
+    return eta * (1 - R)**2 * x * Pinc / (1 - 2 * R * x * np.cos(phase) + R**2 * x**2)
+
+
+def jacobian(params, wavelength, L, Pinc):
+    """
+    d Pout / d (eta, a, neff), shape (n_points, 3).
+    """
+    eta, a, neff = params
+    R = reflectance(neff)
+    x = np.exp(-a * L)
+    phase = 4 * np.pi * neff * L / wavelength
+    c, s = np.cos(phase), np.sin(phase)
+    D = 1 - 2 * R * x * c + R**2 * x**2
+    P = eta * (1 - R)**2 * x * Pinc / D
+
+    d_eta = P / eta
+    # through x = e^{-aL}
+    d_x = P / x - P * (2 * R**2 * x - 2 * R * c) / D
+    d_a = d_x * (-L * x)
+    # through R(neff) and the phase
+    d_R = P * (-2 / (1 - R) - (2 * R * x**2 - 2 * x * c) / D)
+    d_neff = d_R * 4 * (neff - 1) / (neff + 1)**3 - P * (2 * R * x * s) / D * 4 * np.pi * L / wavelength
+    return np.column_stack([d_eta, d_a, d_neff])
+
+
+def initial_guess(wavelength, power, length, Pinc, neff_guess=None, alpha_db=3.0):
+    """
+    (eta, a, neff) to start the fit from, wavelength in nm and length in mm.
+    Raises ValueError if the spectrum shows no fringes and no neff_guess is
+    given.
+    """
+    fringes = extract(wavelength, power[None, :], [length], neff_guess=neff_guess)
+    neff = fringes['neff'].median() if len(fringes) else neff_guess
+    if neff is None or not np.isfinite(neff):
+        raise ValueError('No fringes found in the {} mm spectrum and no neff_guess given'.format(length))
+    alpha = fringes['alpha_db'].median() if len(fringes) else np.nan
+    if not np.isfinite(alpha) or alpha <= 0:
+        alpha = alpha_db
+    a = 100 * alpha / DB
+    L = length * 1e-3
+
+    # Put a fringe maximum (2 beta L = 2 pi m) on the highest peak
+    peak = wavelength[np.nanargmax(power)] * 1e-9
+    order = np.round(2 * L * neff / peak)
+    neff = order * peak / (2 * L)
+
+    # The mean of the Airy function over a period is 1/(1 - R^2 x^2)
+    R = reflectance(neff)
+    x = np.exp(-a * L)
+    eta = np.nanmean(power) * (1 - R**2 * x**2) / ((1 - R)**2 * x * Pinc)
+    return np.array([eta, a, neff])
+
+
+def fit_spectrum(wavelength, power, length, Pinc, neff_guess=None, guess=None):
+    """
+    Fit one spectrum. wavelength in nm, length in mm, Pinc in the unit of
+    power. Returns a dict with eta, alpha (1/cm), alpha_db (dB/cm), neff, R,
+    their standard errors (*_err), the insertion loss il (dB) from the mean
+    power, the rms residual relative to the mean power, and the optimizer
+    status.
+    """
+    wavelength = np.asarray(wavelength, dtype=float)
+    power = np.asarray(power, dtype=float)
+    ok = np.isfinite(power)
+    if guess is None:
+        guess = initial_guess(wavelength, power, length, Pinc, neff_guess)
+    lam = wavelength[ok] * 1e-9
+    L = length * 1e-3
+    y = power[ok]
+
+    result = least_squares(lambda p: pout(p, lam, L, Pinc) - y, guess,
+                           jac=lambda p: jacobian(p, lam, L, Pinc),
+                           bounds=([0, 0, 1], [np.inf, np.inf, np.inf]), x_scale='jac', method='trf')
+    eta, a, neff = result.x
+    dof = max(len(y) - 3, 1)
+    s2 = 2 * result.cost / dof
+    try:
+        cov = np.linalg.inv(result.jac.T @ result.jac) * s2
+        err = np.sqrt(np.diag(cov))
+    except np.linalg.LinAlgError:
+        err = np.full(3, np.nan)
+    # Single-pass insertion loss from the mean measured power, the Airy
+    # average 1/(1 - R^2 x^2) taken out
+    x = np.exp(-a * L)
+    il = -10 * np.log10(np.mean(y) * (1 - reflectance(neff)**2 * x**2) / Pinc)
+    return {'length': length, 'il': il, 'eta': eta, 'eta_err': err[0],
+            'alpha': a / 100, 'alpha_err': err[1] / 100,
+            'alpha_db': a / 100 * DB, 'alpha_db_err': err[1] / 100 * DB,
+            'neff': neff, 'neff_err': err[2], 'R': reflectance(neff),
+            'rms': np.sqrt(s2) / np.mean(y), 'success': result.success, 'nfev': result.nfev}
+
+
+def _fit_row(args):
+    wavelength, power, length, Pinc, neff_guess = args
+    try:
+        return fit_spectrum(wavelength, power, length, Pinc, neff_guess)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        return {'length': length, 'success': False, 'error': str(e)}
+
+
+def fit_all(wavelength, spectra, lengths, Pinc, neff_guess=None, workers=None):
+    """
+    Fit every spectrum (rows of `spectra`) on a process pool. Pinc and
+    neff_guess may be scalars or one value per spectrum. Returns one row
+    per waveguide, in input order.
+    """
+    spectra = np.atleast_2d(spectra)
+    n = len(spectra)
+    lengths = np.broadcast_to(lengths, (n,))
+    Pinc = np.broadcast_to(Pinc, (n,))
+    neff_guess = [neff_guess] * n if np.ndim(neff_guess) == 0 else neff_guess
+    jobs = [(wavelength, spectra[i], float(lengths[i]), float(Pinc[i]), neff_guess[i]) for i in range(n)]
+    with ProcessPoolExecutor(workers) as pool:
+        rows = list(pool.map(_fit_row, jobs, chunksize=max(1, n // (4 * (workers or 8)))))
+    fits = pd.DataFrame(rows)
+    fits.insert(0, 'waveguide', np.arange(n))
+    return fits
+
+
+def cutback(fits):
+    """
+    Cut-back regression over a set of fitted waveguides: the insertion loss
+    il of each waveguide against length. il comes from the mean measured
+    power and uses the fit only for the small Airy average correction
+    1 - R^2 e^{-2aL}. The slope is the propagation loss and the intercept the
+    coupling plus facet loss. Returns a dict with slope (dB/cm), intercept
+    (dB), their standard errors and r2, next to the error-weighted mean of
+    the per-waveguide alpha_db from the Fabry-Perot fits.
+    """
+    fits = fits[fits['success'].astype(bool)]
+    L = fits['length'].to_numpy(float) / 10  # cm
+    il = fits['il'].to_numpy(float)
+
+    A = np.column_stack([L, np.ones_like(L)])
+    coef, *_ = np.linalg.lstsq(A, il, rcond=None)
+    resid = il - A @ coef
+    dof = max(len(L) - 2, 1)
+    cov = np.linalg.inv(A.T @ A) * (np.sum(resid**2) / dof)
+    ss_tot = np.sum((il - il.mean())**2)
+    aw = 1 / fits['alpha_db_err'].to_numpy(float)**2
+    return {'slope': coef[0], 'slope_err': np.sqrt(cov[0, 0]),
+            'intercept': coef[1], 'intercept_err': np.sqrt(cov[1, 1]),
+            'r2': 1 - np.sum(resid**2) / ss_tot if ss_tot > 0 else np.nan,
+            'alpha_db_mean': np.average(fits['alpha_db'], weights=aw),
+            'alpha_db_mean_err': 1 / np.sqrt(aw.sum()), 'waveguides': len(L)}
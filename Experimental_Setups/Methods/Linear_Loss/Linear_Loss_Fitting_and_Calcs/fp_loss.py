@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 2026-10-18. Formulas as given in G Tittelbach et al 1993 Pure Appl. Opt. 2 683
+
+Fabry-Perot loss extraction over whole transmission spectra.
+
+Linear_loss_calculation.py works on one peak/valley pair typed in by hand.
+Here every fringe of every spectrum is used: the spectra of a die are stacked
+into one (n_waveguides, n_points) array and the peaks, the valley between
+each pair of neighbouring peaks, and the Tittelbach quantities of every
+fringe are computed on the whole array at once:
+
+    wavelength, spectra = load_spectra(['NW-Ref1.lvm', 'NW-Ref2.lvm', ...])
+    fringes = extract(wavelength, spectra, lengths_mm, neff_guess=4.0)
+    curve = loss_curve(fringes, bin_width=1.0)   # dB/cm vs nm, with sem
+
+Per fringe, with Pmax the mean of the two peaks and Pmin the valley between:
+    K     = (Pmax - Pmin)/(Pmax + Pmin)
+    neff  = lambdam^2/(2 L deltalambda)
+    R     = (neff - 1)^2/(neff + 1)^2
+    alpha = -ln((1 - sqrt(1 - K^2))/(R K))/L
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from spectrum_store import SpectrumStore
+except ImportError:
+    SpectrumStore = None
+
+DB = 10 * np.log10(np.exp(1))  # dB per neper
+
+
+def load_lvm(datafile, columns=(0, 1)):
+    """
+    (wavelength in nm, power) of a LabVIEW .lvm sweep, read as in
+    Linear_loss_fitting.py.
+    """
+    data = pd.read_csv(datafile, sep=' ')
+    return data.iloc[:, columns[0]].to_numpy(float), data.iloc[:, columns[1]].to_numpy(float)
+
+
+def load_store(filename, rows=None, dbm=True):
+    """
+    Spectra of a spectrum_store.SpectrumStore campaign file as
+    (wavelength, spectra). OSA levels in dBm are converted to mW.
+    """
+    with SpectrumStore(filename, 'r') as store:
+        rows = range(len(store.sweeps())) if rows is None else rows
+        traces = [store.spectrum(r) for r in rows]
+    if dbm:
+        traces = [(x, 10**(np.asarray(y)/10)) for x, y in traces]
+    return common_grid(traces)
+
+
+def load_spectra(datafiles, **kwargs):
+    """
+    Load many .lvm sweeps onto one wavelength grid, one row per file.
+    """
+    return common_grid([load_lvm(f, **kwargs) for f in datafiles])
+
+
+def common_grid(traces):
+    """
+    Stack (wavelength, power) pairs into one array, interpolating onto the
+    grid of the first trace where the grids differ.
+    """
+    grid = np.asarray(traces[0][0], dtype=float)
+    spectra = np.empty((len(traces), len(grid)))
+    for i, (x, y) in enumerate(traces):
+        if len(x) == len(grid) and np.allclose(x, grid):
+            spectra[i] = y
+        else:
+            spectra[i] = np.interp(grid, x, y, left=np.nan, right=np.nan)
+    return grid, spectra
+
+
+def smooth(spectra, points):
+    """
+    Moving average over `points` samples along the last axis.
+    """
+    if points <= 1:
+        return spectra
+    pad = points // 2
+    padded = np.pad(spectra, [(0, 0)] * (spectra.ndim - 1) + [(pad, points - 1 - pad)], mode='edge')
+    c = np.cumsum(padded, axis=-1)
+    c = np.concatenate([np.zeros(c.shape[:-1] + (1,)), c], axis=-1)
+    return (c[..., points:] - c[..., :-points]) / points
+
+
+def running_max(spectra, window):
+    """
+    Maximum over the centred window of `window` samples (odd) along the
+    last axis, in O(n) per row (van Herk / Gil-Werman).
+    """
+    n, p = spectra.shape
+    half = window // 2
+    blocks = -(-(p + 2 * half) // window)
+    padded = np.full((n, blocks * window), -np.inf)
+    padded[:, half:half + p] = spectra
+    b = padded.reshape(n, blocks, window)
+    prefix = np.maximum.accumulate(b, axis=2).reshape(n, -1)
+    suffix = np.maximum.accumulate(b[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n, -1)
+    start = np.arange(p)
+    return np.maximum(suffix[:, start], prefix[:, start + window - 1])
+
+
+def tittelbach(pmax, pmin, lambda1, lambda2, L):
+    """
+    Contrast K, neff, facet reflectance R and alpha (1/m) of a fringe from
+    its peak and valley powers, the wavelengths (m) of two neighbouring
+    peaks and the length L (m). Works elementwise on arrays; alpha is NaN
+    where the contrast is outside what the facets allow.
+    """
+    deltalambda = np.abs(lambda2 - lambda1)
+    lambdam = (lambda1 + lambda2) / 2
+    neff = lambdam**2 / (2 * L * deltalambda)
+    R = (neff - 1)**2 / (neff + 1)**2
+    K = (pmax - pmin) / (pmax + pmin)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        alpha = -np.log((1 - np.sqrt(1 - K**2)) / (R * K)) / L
+    alpha = np.where((K > 0) & (K < 1), alpha, np.nan)
+    return K, neff, R, alpha
+
+
+def extract(wavelength, spectra, lengths, neff_guess=None, tolerance=0.3, smoothing=1, distance=None,
+            pinc=None):
+    """
+    Tittelbach analysis of every fringe of every spectrum.
+
+    :param wavelength: common grid in nm, shape (n_points,)
+    :param spectra: linear output power, shape (n_waveguides, n_points)
+    :param lengths: waveguide lengths in mm, one per spectrum
+    :param neff_guess: if given, fringes whose period is more than
+        `tolerance` away from lambda^2/(2 neff_guess L) are dropped, which
+        removes peaks found on noise
+    :param smoothing: moving average in samples applied before looking for
+        the peaks and valleys, against detector noise; keep it well below
+        the fringe period
+    :param distance: a peak has to be the highest point within this many
+        samples either side; by default a third of the shortest expected
+        period with neff_guess, otherwise 1 (every local maximum)
+    :param pinc: incident power per waveguide, same unit as the spectra;
+        adds total and coupling loss columns
+
+    Returns a DataFrame with one row per fringe: waveguide, length (mm),
+    wavelength (nm, centre of the fringe), period (pm), pmax, pmin, K,
+    neff, R, alpha (1/cm), alpha_db (dB/cm), and with pinc also TL, PL, RL
+    and CL in dB as in Linear_loss_calculation.py.
+    """
+    spectra = np.atleast_2d(np.asarray(spectra, dtype=float))
+    lengths = np.broadcast_to(np.asarray(lengths, dtype=float), spectra.shape[:1])
+    n, p = spectra.shape
+    # Gaps (outside a trace's own grid) are filled with its minimum so they
+    # neither hold peaks nor spread NaN through the smoothing
+    s = smooth(np.where(np.isnan(spectra), np.nanmin(spectra, axis=1, keepdims=True), spectra), smoothing)
+
+    if distance is None:
+        distance = 1
+        if neff_guess is not None:
+            period = np.nanmean(wavelength)**2 / (2 * neff_guess * np.max(lengths) * 1e6)
+            distance = max(1, int(period / np.abs(np.median(np.diff(wavelength))) / 3))
+
+    # All peaks of all spectra, as flat indices in row order; the first
+    # sample of a flat top counts
+    peak = np.zeros_like(s, dtype=bool)
+    peak[:, 1:-1] = (s[:, 1:-1] > s[:, :-2]) & (s[:, 1:-1] >= running_max(s, 2 * distance + 1)[:, 1:-1])
+    dev, idx = np.nonzero(peak)
+    if len(idx) < 2:
+        return pd.DataFrame()
+
+    # Sub-sample peak positions from a parabola through the three samples
+    y0, y1, y2 = s[dev, idx - 1], s[dev, idx], s[dev, idx + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.nan_to_num(0.5 * (y0 - y2) / (y0 - 2 * y1 + y2))
+    step = np.gradient(wavelength)[idx]
+    position = wavelength[idx] + np.clip(shift, -0.5, 0.5) * step
+
+    # Valley between neighbouring peaks: minimum from one peak to the next,
+    # one reduceat over the flattened array
+    valley = np.minimum.reduceat(np.where(np.isnan(spectra), np.inf, s).ravel(), dev * p + idx)
+    same = dev[:-1] == dev[1:]
+    pair = np.nonzero(same)[0]
+
+    d = dev[pair]
+    L = lengths[d] * 1e-3
+    lambda1 = position[pair] * 1e-9
+    lambda2 = position[pair + 1] * 1e-9
+    pmax = (s[d, idx[pair]] + s[d, idx[pair + 1]]) / 2
+    pmin = valley[pair]
+    K, neff, R, alpha = tittelbach(pmax, pmin, lambda1, lambda2, L)
+
+    fringes = pd.DataFrame({'waveguide': d, 'length': lengths[d],
+                            'wavelength': (position[pair] + position[pair + 1]) / 2,
+                            'period': np.abs(lambda2 - lambda1) * 1e12,
+                            'pmax': pmax, 'pmin': pmin, 'K': K, 'neff': neff, 'R': R,
+                            'alpha': alpha / 100, 'alpha_db': alpha / 100 * DB})
+    if neff_guess is not None:
+        expected = (fringes['wavelength'] * 1e-9)**2 / (2 * neff_guess * L) * 1e12
+        fringes = fringes[np.abs(fringes['period'] / expected - 1) <= tolerance]
+    if pinc is not None:
+        pinc = np.broadcast_to(np.asarray(pinc, dtype=float), (n,))[fringes['waveguide']]
+        fringes = fringes.assign(
+            TL=-10 * np.log10((fringes['pmax'] + fringes['pmin']) / 2 / pinc),
+            PL=fringes['alpha_db'] * fringes['length'] / 10,
+            RL=-10 * np.log10(1 - fringes['R']))
+        fringes['CL'] = fringes['TL'] - fringes['PL'] - 2 * fringes['RL']
+    return fringes.reset_index(drop=True)
+
+
+def loss_curve(fringes, bin_width=1.0, by='waveguide'):
+    """
+    Propagation loss vs wavelength: fringes grouped into wavelength bins of
+    `bin_width` nm (and per `by` column, None to pool all waveguides), with
+    the mean, std and standard error of alpha_db and neff per bin.
+    """
+    fringes = fringes.dropna(subset=['alpha_db'])
+    keys = [] if by is None else [by]
+    centre = (np.floor(fringes['wavelength'] / bin_width) + 0.5) * bin_width
+    grouped = fringes.assign(bin=centre).groupby(keys + ['bin'])
+    curve = grouped.agg(alpha_db=('alpha_db', 'mean'), alpha_db_std=('alpha_db', 'std'),
+                        neff=('neff', 'mean'), neff_std=('neff', 'std'),
+                        fringes=('alpha_db', 'size')).reset_index()
+    curve['alpha_db_sem'] = curve['alpha_db_std'] / np.sqrt(curve['fringes'])
+    return curve.rename(columns={'bin': 'wavelength'})
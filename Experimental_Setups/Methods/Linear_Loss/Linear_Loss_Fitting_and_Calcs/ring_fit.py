@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on 2026-10-18. All-pass ring model after W Bogaerts et al 2012 Laser Photonics Rev. 6 47
+
+Resonance extraction for the all-pass rings of the critical-coupling set of
+Basic_Building_Block_Tapeout_att3.py and the ring_resonator_tapeout_*.py dies.
+
+A laser sweep of 1e5-1e6 points is read in chunks of `chunk` samples, each
+with enough overlap on both sides to hold the fit window of a dip at its
+edge. In every chunk the dips are found on the whole array at once (local
+minima of the smoothed trace over a running window, deep enough below the
+running-max baseline), and a window around each dip is sent to a process
+pool and fitted with a Lorentzian on a linear baseline or the all-pass ring
+
+    T = B(lambda) (a^2 - 2 a r cos phi + r^2) / (1 - 2 a r cos phi + (a r)^2),
+    phi = 2 pi (lambda - lambda0) / FSR.
+
+Only one chunk and its windows are in memory at a time, so the trace may be a
+np.load(..., mmap_mode='r') array or an h5py dataset.
+
+    res = resonances(wavelength, transmission, spacing=1.0, length=ring_length(25))
+    res = resolve_coupling(res_with_gap)  # regime per gap from the sweep
+    critical_coupling(res)                # gap at which Q_coupling = Q_intrinsic
+
+With the dip depth Tmin (linear, relative to the baseline) and the loaded Q,
+    Q_intrinsic = 2 Q_loaded / (1 +- sqrt(Tmin)),   + under-, - over-coupled
+    Q_coupling  = 2 Q_loaded / (1 -+ sqrt(Tmin))
+    ng = lambda0^2 / (FSR L),  alpha = 2 pi ng / (Q_intrinsic lambda0)
+The coupling regime cannot be told from one transmission trace: every row
+is computed for the `coupling` assumed. resolve_coupling() picks the regime
+per gap from the sweep instead, as the single switch from over- to
+under-coupled with increasing gap that keeps Q_intrinsic most constant.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import least_squares
+
+from fp_loss import smooth, running_max, DB
+
+
+def ring_length(radius, length_x=4.0, length_y=0.6):
+    """
+    Round-trip length in um of gdsfactory's ring_single with these
+    parameters (um).
+    """
+    return 2 * np.pi * radius + 2 * length_x + 2 * length_y
+
+
+def lorentzian(params, x):
+    """
+    Dip of relative depth D and full width w (nm) at x0 on the baseline
+    b0 + b1 (x - x0); params = (b0, b1, D, x0, w).
+    """
+    b0, b1, D, x0, w = params
+    u = 2 * (x - x0) / w
+    return (b0 + b1 * (x - x0)) * (1 - D / (1 + u**2))
+
+
+def lorentzian_jacobian(params, x):
+    b0, b1, D, x0, w = params
+    dx = x - x0
+    u = 2 * dx / w
+    L = 1 / (1 + u**2)
+    b = b0 + b1 * dx
+    dL_dx = -4 * u * L**2 / w
+    return np.column_stack([1 - D * L, dx * (1 - D * L), -b * L,
+                            -(b1 * (1 - D * L) - b * D * dL_dx),
+                            -b * D * 2 * u**2 * L**2 / w])
+
+
+def allpass(params, x, fsr):
+    """
+    All-pass ring transmission; params = (b0, b1, a, r, x0), a the round-trip
+    amplitude transmission and r the self-coupling.
+    """
+    b0, b1, a, r, x0 = params
+    c = np.cos(2 * np.pi * (x - x0) / fsr)
+    return (b0 + b1 * (x - x0)) * (a**2 - 2 * a * r * c + r**2) / (1 - 2 * a * r * c + (a * r)**2)
+
+
+def _estimate(x, y):
+    # Baseline, depth and full width at half depth of the dip of a window
+    k = int(np.argmin(y))
+    b0 = np.percentile(y, 90)
+    D = np.clip(1 - y[k] / b0, 1e-3, 1 - 1e-6)
+    below = y < b0 * (1 - D / 2)
+    left = k - np.argmin(below[k::-1]) if not below[:k + 1].all() else 0
+    right = k + np.argmin(below[k:]) if not below[k:].all() else len(y) - 1
+    step = np.abs(np.median(np.diff(x)))
+    return b0, D, x[k], max(abs(x[right] - x[left]), 2 * step)
+
+
+def fit_resonance(wavelength, transmission, fsr=np.nan, model='lorentzian', coupling='under', width_factor=8):
+    """
+    Fit one dip in a window of a trace, wavelength in nm. The window is
+    narrowed to `width_factor` estimated linewidths either side. The
+    all-pass model needs the FSR (nm); without one the Lorentzian is used.
+
+    Returns a dict with wavelength (nm), fwhm (pm), Q_loaded, Q_intrinsic,
+    Q_coupling, extinction (dB), Tmin, and for the all-pass fit a and r,
+    next to the rms residual relative to the baseline and the optimizer
+    status.
+    """
+    x = np.asarray(wavelength, dtype=float)
+    y = np.asarray(transmission, dtype=float)
+    ok = np.isfinite(y)
+    x, y = x[ok], y[ok]
+    b0, D, x0, w = _estimate(x, y)
+    near = np.abs(x - x0) <= width_factor * w
+    if near.sum() >= 7:
+        x, y = x[near], y[near]
+    if model == 'allpass' and not np.isfinite(fsr):
+        model = 'lorentzian'
+
+    if model == 'lorentzian':
+        result = least_squares(lambda p: lorentzian(p, x) - y, [b0, 0, D, x0, w],
+                               jac=lambda p: lorentzian_jacobian(p, x),
+                               bounds=([0, -np.inf, 0, x[0], 0], [np.inf, np.inf, 1, x[-1], np.inf]),
+                               x_scale='jac', method='trf')
+        b0, b1, D, x0, w = result.x
+        tmin = 1 - D
+        Q = x0 / w
+        extra = {}
+    elif model == 'allpass':
+        # Start from the Lorentzian estimate: linewidth w = FSR (1 - ar)/(pi sqrt(ar))
+        ar = 1 - np.pi * w / fsr
+        tmin = 1 - D
+        # Tmin = (r - a)^2 / (1 - ar)^2 fixes the difference, the regime the sign
+        diff = np.sqrt(tmin) * (1 - ar)
+        s = np.sqrt(max(diff**2 + 4 * ar, 0))
+        big, small = (s + diff) / 2, (s - diff) / 2
+        a, r = (small, big) if coupling == 'under' else (big, small)
+        guess = np.clip([b0, 0, a, r, x0], [0, -np.inf, 1e-6, 1e-6, x[0]], [np.inf, np.inf, 1 - 1e-9, 1 - 1e-9, x[-1]])
+        result = least_squares(lambda p: allpass(p, x, fsr) - y, guess,
+                               bounds=([0, -np.inf, 0, 0, x[0]], [np.inf, np.inf, 1, 1, x[-1]]),
+                               x_scale='jac', method='trf')
+        b0, b1, a, r, x0 = result.x
+        a, r = (min(a, r), max(a, r)) if coupling == 'under' else (max(a, r), min(a, r))
+        tmin = (r - a)**2 / (1 - a * r)**2
+        w = fsr * (1 - a * r) / (np.pi * np.sqrt(a * r))
+        Q = x0 / w
+        extra = {'a': a, 'r': r}
+    else:
+        raise ValueError("model must be 'lorentzian' or 'allpass', not {!r}".format(model))
+
+    sign = 1 if coupling == 'under' else -1
+    with np.errstate(divide='ignore'):
+        Qi = 2 * Q / (1 + sign * np.sqrt(tmin))
+        Qc = 2 * Q / (1 - sign * np.sqrt(tmin))
+        extinction = -10 * np.log10(tmin)
+    rms = np.sqrt(2 * result.cost / len(y)) / b0
+    return {'wavelength': x0, 'fwhm': w * 1e3, 'Q_loaded': Q, 'Q_intrinsic': Qi, 'Q_coupling': Qc,
+            'extinction': extinction, 'Tmin': tmin, **extra, 'coupling': coupling, 'baseline': b0, 'rms': rms,
+            'model': model, 'success': result.success}
+
+
+def _fit_window(args):
+    x, y, fsr, model, coupling, width_factor = args
+    try:
+        return fit_resonance(x, y, fsr, model, coupling, width_factor)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        return {'wavelength': x[np.nanargmin(y)], 'success': False, 'error': str(e)}
+
+
+def find_dips(wavelength, transmission, spacing, min_depth=0.1, smoothing=1):
+    """
+    Indices of the dips of a trace: samples that are the lowest of the
+    smoothed trace within `spacing` nm either side and at least `min_depth`
+    (relative) below the running-max baseline over the same window.
+    """
+    x = np.asarray(wavelength, dtype=float)
+    s = smooth(np.asarray(transmission, dtype=float)[None, :], smoothing)
+    half = max(1, int(round(spacing / np.abs(np.median(np.diff(x))))))
+    window = 2 * half + 1
+    baseline = running_max(s, window)[0]
+    s = s[0]
+    dip = np.zeros(len(s), dtype=bool)
+    dip[1:-1] = (s[1:-1] < s[:-2]) & (-s[1:-1] >= running_max(-s[None, :], window)[0, 1:-1])
+    dip &= s <= (1 - min_depth) * baseline
+    return np.nonzero(dip)[0]
+
+
+def resonances(wavelength, transmission, spacing=1.0, min_depth=0.1, smoothing=1, model='lorentzian',
+               coupling='under', fsr=None, length=None, width_factor=8, chunk=2**16, workers=None):
+    """
+    Find and fit every resonance of a wideband trace.
+
+    :param wavelength: nm, ascending, uniformly sampled
+    :param transmission: linear, same length; dBm traces need converting
+    :param spacing: nm, the closest two resonances can be; the fit window
+        of a dip reaches at most this far and never past the midpoint to
+        its neighbours. Less than the FSR, more than a few linewidths
+    :param fsr: nm; by default from the distance to the neighbouring dips
+    :param length: round-trip length in um (see ring_length) for ng and
+        the propagation loss
+    :param chunk: samples per chunk; memory use scales with this, not with
+        the trace length
+
+    Returns a DataFrame with one row per resonance: fit_resonance() columns
+    plus fsr (nm), and with length ng and alpha_db (dB/cm).
+    """
+    n = len(transmission)
+    step = abs(float(wavelength[1]) - float(wavelength[0]))
+    half = max(1, int(round(spacing / step)))
+    overlap = 3 * half
+    rows = []
+    with ProcessPoolExecutor(workers) as pool:
+        for start in range(0, n, chunk):
+            lo, hi = max(0, start - overlap), min(n, start + chunk + overlap)
+            x = np.asarray(wavelength[lo:hi], dtype=float)
+            y = np.asarray(transmission[lo:hi], dtype=float)
+            idx = find_dips(x, y, spacing, min_depth, smoothing)
+            if len(idx) == 0:
+                continue
+            # Neighbouring dips, also those in the overlaps, bound the windows
+            # and give the local FSR
+            left = np.concatenate([[idx[0] - half], idx[:-1]])
+            right = np.concatenate([idx[1:], [idx[-1] + half]])
+            lower = np.clip(np.maximum(idx - half, (idx + left) // 2), 0, None)
+            upper = np.clip(np.minimum(idx + half, (idx + right) // 2), None, len(x) - 1)
+            if fsr is None:
+                positions = x[idx]
+                local = np.gradient(positions) if len(idx) > 1 else np.full(1, np.nan)
+            else:
+                local = np.full(len(idx), float(fsr))
+            core = (lo + idx >= start) & (lo + idx < start + chunk)
+            jobs = [(x[lower[k]:upper[k] + 1], y[lower[k]:upper[k] + 1], local[k], model, coupling, width_factor)
+                    for k in np.nonzero(core)[0]]
+            fits = list(pool.map(_fit_window, jobs, chunksize=max(1, len(jobs) // (4 * (workers or 8)))))
+            for fit, f in zip(fits, local[core]):
+                fit['fsr'] = f
+            rows += fits
+
+    res = pd.DataFrame(rows)
+    if length is not None and len(res):
+        lam = res['wavelength'] * 1e-9
+        res['ng'] = lam**2 / (res['fsr'] * 1e-9 * length * 1e-6)
+        res['alpha_db'] = 2 * np.pi * res['ng'] / (res['Q_intrinsic'] * lam) / 100 * DB
+    return res
+
+
+def resolve_coupling(res, by='gap'):
+    """
+    Coupling regime of every resonance of a gap sweep. The two roots
+    2 Q_loaded / (1 +- sqrt(Tmin)) of a dip are Q_intrinsic and Q_coupling
+    in one order or the other. Q_coupling grows with the gap while
+    Q_intrinsic does not depend on it, so the rings are over-coupled below
+    some gap and under-coupled above it; of all such switch points the one
+    giving the least spread of ln Q_intrinsic over the gaps (medians per
+    gap) is taken. Returns a copy of res with Q_intrinsic, Q_coupling, a, r
+    and alpha_db swapped where needed and the coupling column set.
+    """
+    res = res.copy()
+    low = 2 * res['Q_loaded'] / (1 + np.sqrt(res['Tmin']))
+    high = 2 * res['Q_loaded'] / (1 - np.sqrt(res['Tmin']))
+    gaps = np.sort(res[by].dropna().unique())
+    per_gap = pd.DataFrame({by: res[by], 'low': np.log(low), 'high': np.log(high)}).groupby(by).median().loc[gaps]
+    # Switch k: gaps[:k] over-coupled (Q_intrinsic the high root), the rest under
+    spread = [np.var(np.concatenate([per_gap['high'].to_numpy()[:k], per_gap['low'].to_numpy()[k:]]))
+              for k in range(len(gaps) + 1)]
+    k = int(np.argmin(spread))
+    over = res[by].isin(gaps[:k]).to_numpy()
+    res['coupling'] = np.where(over, 'over', 'under')
+    res['Q_intrinsic'] = np.where(over, high, low)
+    res['Q_coupling'] = np.where(over, low, high)
+    if 'a' in res and 'r' in res:
+        a, r = res['a'].to_numpy(float), res['r'].to_numpy(float)
+        res['a'] = np.where(over, np.maximum(a, r), np.minimum(a, r))
+        res['r'] = np.where(over, np.minimum(a, r), np.maximum(a, r))
+    if 'ng' in res:
+        lam = res['wavelength'] * 1e-9
+        res['alpha_db'] = 2 * np.pi * res['ng'] / (res['Q_intrinsic'] * lam) / 100 * DB
+    return res
+
+
+def critical_coupling(res, by='gap', resolve=True):
+    """
+    Gap (in the unit of column `by`) at which the ring would be critically
+    coupled: ln Q_coupling is fitted linearly against the gap, since the
+    coupling falls off exponentially with it, and set equal to the median
+    Q_intrinsic. The regime of every gap is taken from resolve_coupling(),
+    or from the coupling column of res as it is with resolve=False.
+    Returns (gap, slope of ln Q_coupling, median Q_intrinsic).
+    """
+    res = res[res['success'].astype(bool)].dropna(subset=[by, 'Q_coupling', 'Q_intrinsic'])
+    if resolve:
+        res = resolve_coupling(res, by)
+    A = np.column_stack([res[by].to_numpy(float), np.ones(len(res))])
+    (c1, c0), *_ = np.linalg.lstsq(A, np.log(res['Q_coupling'].to_numpy(float)), rcond=None)
+    Qi = np.median(res['Q_intrinsic'])
+    return (np.log(Qi) - c0) / c1, c1, Qi
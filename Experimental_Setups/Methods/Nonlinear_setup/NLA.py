@@ -20,6 +20,12 @@ import datetime
 from Newport2936R import Newport2936R
 from KDC101 import KDC101
 from OPO import OPO
+from NLA_sampling import AdaptiveHWPSampler, hwp_measure
+from pin_calibration import CalibrationCache
+
+# Tap calibrations written by Pinc_Measurement.py
+SETUP = 'SPM-OPO'
+CALIBRATION_DIR = 'calibrations'
 
 def calibration(x,m,b):
     return m*x+b
@@ -38,7 +44,13 @@ def main():
     opo = OPO(serial_port, baud_rate)
     
     m = 0.45059
-    b = -476.216*(10**-7) #
+    b = -476.216*(10**-7) # fallback when no calibration has been saved
+
+    try:
+        pin_calibration = CalibrationCache(CALIBRATION_DIR).load(SETUP, max_age=30)
+    except FileNotFoundError:
+        logging.warning(f"No {SETUP} calibration in {CALIBRATION_DIR}, using m={m}, b={b}")
+        pin_calibration = None
     
     # Define power levels at which to take OSA sweeps (in mW)
     # power_levels = range(1, 21, 1) #Change to 60
@@ -53,7 +65,13 @@ def main():
         ### 330 is low power ~1 uW in the PM screen
         ### 290 is ~170  in the PM screen
         # hwp_position = range(204, 209, 0.5) #Change to 60
-        hwp_position = np.arange(204, 213, 1) #Change to 60
+        # hwp_position = np.arange(204, 213, 1) #Change to 60
+        # Positions are chosen per sweep: coarse climb from 204 to 212, stop at
+        # saturation, then bisection where Pout vs Pin bends
+        # Pin and Pout of every point are averaged over this many readings
+        samples_per_point = 5
+        sampler = AdaptiveHWPSampler(hwp_measure(kdc, pm, lambda x: calibration(x, m, b), samples=samples_per_point),
+                                     204, 212, initial=5, min_step=0.25, max_points=15)
         # kdc.SetPosition(330)  # Initial position set to 160 (arbitrary units)
         #time.sleep(1)
         average_number = range(1, 4, 1)
@@ -79,22 +97,20 @@ def main():
         
         for wavelength in wavelengths:
             opo.SetWavelength(wavelength)
+            if pin_calibration is not None:
+                # m and b of this OPO wavelength (angstroms to nm)
+                sampler.measure = hwp_measure(kdc, pm, pin_calibration.function(wavelength*0.1),
+                                              samples=samples_per_point)
             time.sleep(1)
             
             for num in average_number:
                 
                 power_measurements = np.array([['P_in in W', 'P_out in W']], dtype = object)
             
-                for position in hwp_position:
-                
-                    kdc.SetPosition(position)
-                
-                    time.sleep(1)
-                    
-                    power_in = calibration(pm.GetPowerCH1()*1000,m,b)
-                    power_out = pm.GetPowerCH2()
-                    new_row = np.array([[power_in, power_out]], dtype=object)
-                    power_measurements = np.vstack([power_measurements, new_row])
+                rows = sampler.run()
+                if sampler.saturated is not None:
+                    print("Saturation point reached at {} deg".format(sampler.saturated))
+                power_measurements = np.vstack([power_measurements, rows[:, 1:].astype(object)])
                 
                 time.sleep(1)
                 
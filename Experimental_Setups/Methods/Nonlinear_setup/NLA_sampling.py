@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:24:40 2026
+
+Adaptive HWP sampling of Pout vs Pin for the nonlinear absorption sweep.
+
+NLA.py used to step the HWP over a fixed grid at every OPO wavelength. The
+sampler below instead
+    - climbs a coarse grid of HWP positions and stops climbing once the
+      output power has risen and then levelled off (the check that was
+      commented out in NLA.py, made relative to the rise so a flat start
+      near the detector floor does not count),
+    - then bisects where Pout vs Pin bends most: for every inner point the
+      deviation from the straight line through its neighbours is a second
+      difference estimate of the curvature, and the wider of the two
+      intervals next to the worst point is split,
+    - until every deviation is below `tolerance` of the Pout range, no
+      interval can be split below `min_step`, or `max_points` is reached.
+
+New positions are placed at the Pin midpoint of the interval, read off the
+measured Pin vs position (monotonic between the HWP minimum and maximum), so
+the grid follows Pin rather than the angle.
+
+    sampler = AdaptiveHWPSampler(hwp_measure(kdc, pm, lambda x: calibration(x, m, b)),
+                                 204, 212)
+    rows = sampler.run()          # [[position, P_in, P_out], ...] by position
+"""
+
+import time
+
+import numpy as np
+
+
+def hwp_measure(kdc, pm, calibration, settle_time=1, samples=1):
+    """
+    Measurement function for AdaptiveHWPSampler: moves the HWP, waits and
+    returns (P_in, P_out) in W, P_in from the tap reading in mW. With
+    samples > 1 both are the mean of that many readings of each channel
+    (Newport2936R.GetPowersBoth).
+    """
+    def measure(position):
+        kdc.SetPosition(position)
+        time.sleep(settle_time)
+        if samples == 1:
+            tap_power, power_out = pm.GetPowerBoth()
+        else:
+            tap_power, power_out = (p.mean() for p in pm.GetPowersBoth(samples))
+        return calibration(tap_power*1000), power_out
+    return measure
+
+
+class AdaptiveHWPSampler:
+
+    def __init__(self, measure, start, stop, initial=5, min_step=0.25, max_points=15, tolerance=0.02,
+                 saturation_points=3, saturation_tolerance=0.02, saturation_min_points=None, noise=5e-9):
+        """
+        :param measure: function position -> (P_in, P_out), see hwp_measure
+        :param start, stop: HWP positions in degrees, from low to high power
+        :param initial: number of points of the coarse climb
+        :param min_step: smallest HWP step in degrees
+        :param max_points: total number of points per sweep
+        :param tolerance: curvature deviation, as a fraction of the Pout
+            range, below which the curve is considered resolved
+        :param saturation_points: the climb stops once this many consecutive
+            points have Pout within `saturation_tolerance` of the Pout range
+            so far, all in the upper half of that range, after at least
+            `saturation_min_points` points and a rise of more than ten
+            times `noise` (W)
+        :param saturation_min_points: by default two thirds of the coarse
+            climb, and at least one point more than `saturation_points`
+            (6 of the 9 steps the commented-out check in NLA.py used)
+        """
+        self.measure = measure
+        self.start = start
+        self.stop = stop
+        self.initial = initial
+        self.min_step = min_step
+        self.max_points = max_points
+        self.tolerance = tolerance
+        self.saturation_points = saturation_points
+        self.saturation_tolerance = saturation_tolerance
+        if saturation_min_points is None:
+            saturation_min_points = max(saturation_points + 1, int(np.ceil(2 * initial / 3)))
+        self.saturation_min_points = saturation_min_points
+        self.noise = noise
+        self.points = []  # (position, P_in, P_out) in measurement order
+        self.saturated = None
+
+    def _take(self, position):
+        power_in, power_out = self.measure(position)
+        self.points.append((float(position), float(power_in), float(power_out)))
+
+    def _is_saturated(self):
+        if len(self.points) < max(self.saturation_min_points, self.saturation_points):
+            return False
+        power_out = np.array([p[2] for p in self.points])
+        span = np.ptp(power_out)
+        if span <= 10 * self.noise:
+            return False  # nothing has risen above the floor yet
+        last = power_out[-self.saturation_points:]
+        # Levelled off in the upper half of the range, not still at the start
+        return (np.ptp(last) <= self.saturation_tolerance * span
+                and last.min() - power_out.min() >= span / 2)
+
+    def climb(self):
+        for position in np.linspace(self.start, self.stop, self.initial):
+            self._take(position)
+            if self._is_saturated():
+                self.saturated = self.points[-self.saturation_points][0]
+                break
+
+    def next_position(self):
+        """
+        Position to measure next, or None once the curve is resolved.
+        """
+        position, power_in, power_out = np.array(sorted(self.points)).T
+        if len(position) < 3:
+            return None
+        span = np.ptp(power_out)
+        if span == 0:
+            return None
+
+        # Deviation of every inner point from the chord through its neighbours
+        x0, x1, x2 = power_in[:-2], power_in[1:-1], power_in[2:]
+        y0, y1, y2 = power_out[:-2], power_out[1:-1], power_out[2:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chord = y0 + (y2 - y0) * (x1 - x0) / (x2 - x0)
+        deviation = np.nan_to_num(np.abs(y1 - chord)) / span
+
+        for i in np.argsort(deviation)[::-1] + 1:
+            if deviation[i - 1] < self.tolerance:
+                return None
+            # Split the wider side, in Pin, of the worst point first
+            sides = sorted([(abs(power_in[i] - power_in[i - 1]), i - 1),
+                            (abs(power_in[i + 1] - power_in[i]), i)], reverse=True)
+            for _, j in sides:
+                if position[j + 1] - position[j] < 2 * self.min_step:
+                    continue
+                target = (power_in[j] + power_in[j + 1]) / 2
+                if power_in[j + 1] != power_in[j]:
+                    new = np.interp(target, *zip(*sorted([(power_in[j], position[j]),
+                                                          (power_in[j + 1], position[j + 1])])))
+                else:
+                    new = (position[j] + position[j + 1]) / 2
+                new = np.clip(new, position[j] + self.min_step, position[j + 1] - self.min_step)
+                return round(float(new), 4)
+        return None
+
+    def run(self):
+        """
+        Coarse climb, then refinement. Returns an array of rows
+        [position, P_in, P_out] sorted by position.
+        """
+        self.points = []
+        self.saturated = None
+        self.climb()
+        while len(self.points) < self.max_points:
+            position = self.next_position()
+            if position is None:
+                break
+            self._take(position)
+        return np.array(sorted(self.points))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:31 2026
+
+Pipelined SPM acquisition built on the AQ6315B, KDC101, Newport2936R and OPO
+drivers.
+
+The serial loop in SPM_wOPO_control.py waits for every step in turn. Here the
+OSA only blocks for the sweep itself:
+    - the power meter is read while the OSA is sweeping,
+    - the HWP moves to the next position while the trace is downloaded,
+    - traces are written to disk on a separate thread, either as one CSV
+      file per sweep or as rows of a spectrum_store.SpectrumStore.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SPMAcquisition:
+
+    def __init__(self, osa, kdc, pm, opo, calibration=None, settle_time=1):
+        """
+        :param osa: AQ6315B instance
+        :param kdc: KDC101 instance holding the HWP, stage model already set
+        :param pm: Newport2936R instance, channel 1 on the tap
+        :param opo: OPO instance, connected
+        :param calibration: function mapping the tap reading in mW to the
+            incident power in W, e.g. lambda x: calibration(x, m, b), or a
+            pin_calibration.PinCalibration, evaluated at each OPO wavelength
+        :param settle_time: time in seconds to let the power settle after
+            each HWP move
+        """
+        self.osa = osa
+        self.kdc = kdc
+        self.pm = pm
+        self.opo = opo
+        self.calibration = calibration
+        self._calibrate = calibration
+        self.settle_time = settle_time
+        self.records = []
+
+    def _measure(self):
+        self.osa.SingleScan()
+        # Tap power is read during the sweep instead of before it.
+        power = self.pm.GetPowerCH1()
+        if self._calibrate is not None:
+            power = self._calibrate(power*1000)/0.001
+        self.osa.WaitForSweepFinish()
+        return power
+
+    def run(self, wavelengths, positions, averages=1, filename_fmt='SPM-{center}nm-{power:.5f}mW.csv',
+            window=(-20, 15), park_position=None, store=None):
+        """
+        Take an OSA sweep at every HWP position for every OPO wavelength.
+
+        :param wavelengths: OPO wavelengths in angstroms
+        :param positions: HWP positions in degrees
+        :param averages: number of repeats of the HWP sweep per wavelength
+        :param filename_fmt: output file name, formatted with center (nm),
+            power (mW), position (deg) and num (repeat index starting at 1)
+        :param window: OSA start and stop offsets from the center in nm
+        :param park_position: HWP position to return to at the end, if any
+        :param store: SpectrumStore to append the sweeps to; filename_fmt is
+            ignored and no CSV files are written if given
+
+        Returns a list of dicts, one per sweep, with the file written or the
+        row of the store.
+        """
+        points = [(position, num) for num in range(1, averages+1) for position in positions]
+        writer = ThreadPoolExecutor(max_workers=1)
+        writes = []
+        try:
+            for wavelength in wavelengths:
+                # Start the first HWP move while the OPO tunes.
+                move = self.kdc.move_async(points[0][0])
+                self.opo.SetWavelength(wavelength)
+                center = wavelength*0.1
+                if hasattr(self.calibration, 'function'):
+                    self._calibrate = self.calibration.function(center)
+                self.osa.configure(center+window[0], center+window[1])
+
+                for i, (position, num) in enumerate(points):
+                    move.result()
+                    time.sleep(self.settle_time)
+                    power = self._measure()
+
+                    # The sweep is done: move on while the trace comes over the bus.
+                    if i+1 < len(points):
+                        move = self.kdc.move_async(points[i+1][0])
+                    trace = self.osa.GetTrace()
+
+                    record = {'wavelength': center, 'position': position, 'num': num,
+                              'power': power, 'time': time.time()}
+                    if store is not None:
+                        writes.append(writer.submit(store.append, trace, **record))
+                        record['file'] = store.filename
+                    else:
+                        record['file'] = filename_fmt.format(**record, center=center)
+                        writes.append(writer.submit(self.osa.SaveTrace, trace, record['file']))
+                    self.records.append(record)
+                    logging.info('SPM sweep saved to {}'.format(record['file']))
+                move.result()
+
+            if park_position is not None:
+                self.kdc.SetPosition(park_position)
+            for record, w in zip(self.records[-len(writes):], writes):
+                row = w.result()
+                if store is not None:
+                    record['row'] = row
+        finally:
+            writer.shutdown(wait=True)
+        return self.records
@@ -16,32 +16,34 @@ import logging
 from OSA import AQ6315B
 from Newport2936R import Newport2936R
 from KDC101 import KDC101
-from OPO import OPO
+import power_control
+from pin_calibration import CalibrationCache
+from SPM_acquisition import SPMAcquisition
+from spectrum_store import SpectrumStore
 
+import sys
 import csv
 import datetime
 
 
 
 # Constants for power adjustment loop
-MAX_ITERATIONS = 100  # Max iterations for reaching the target power level
+MAX_MOVES = 5  # Max HWP moves for reaching the target power level
 TOLERANCE = 1e-6  # Tolerance for difference between actual and target power level
 
+# Tap calibrations written by Pinc_Measurement.py
+SETUP = 'SPM-OPO'
+CALIBRATION_DIR = 'calibrations'
+
 # Initialize logging
 logging.basicConfig(filename='lab_log.log', level=logging.INFO)
 
 # Function to adjust the power level to the desired value
 def adjust_power_level(target, pm, kdc):
-    iteration = 0
-    while abs(pm.GetPowerCH1() - target) > TOLERANCE:
-        if iteration >= MAX_ITERATIONS:
-            logging.warning("Max iterations reached for power adjustment. Exiting.")
-            return False
-        if pm.GetPowerCH1() < target:
-            kdc.StepFwd()  # Increase power
-        else:
-            kdc.StepBwd()  # Decrease power
-        iteration += 1
+    # Malus-law fit of the HWP on first use, then direct angle plus Newton steps
+    if not power_control.adjust_power_level(target, pm, kdc, atol=TOLERANCE, max_moves=MAX_MOVES):
+        logging.warning("Max moves reached for power adjustment. Exiting.")
+        return False
     return True
 
 def calibration(x,m,b):
@@ -49,20 +51,28 @@ def calibration(x,m,b):
 
 
 # Main function
-def main():
+def main(simulate=False, speedup=1):
     # Initialize instruments with their addresses
     osa_address = 'GPIB2::1::INSTR'
-    osa = AQ6315B(osa_address)
-    
     pm_address = 'USB0::0x104D::0xCEC7::NI-VISA-10002::RAW'    
-    pm =  Newport2936R(pm_address)
-    
     index_number = 1
-    kdc =  KDC101(index_number)
-    
     serial_port = "COM21"
     baud_rate = 9600
-    opo = OPO(serial_port, baud_rate)
+
+    if simulate:
+        # Offline run against the simulated bench, e.g. to time the acquisition loop
+        from simulators import Simulation
+        sim = Simulation(speedup=speedup)
+        osa = AQ6315B(osa_address, resource_manager=sim.rm)
+        pm =  Newport2936R(pm_address, resource_manager=sim.rm)
+        kdc =  KDC101(index_number, device=sim.kinesis_motor())
+        opo = sim.opo()
+    else:
+        from OPO import OPO
+        osa = AQ6315B(osa_address)
+        pm =  Newport2936R(pm_address)
+        kdc =  KDC101(index_number)
+        opo = OPO(serial_port, baud_rate)
     
     # Parameters for OSA (Optical Spectrum Analyzer)
     
@@ -80,7 +90,16 @@ def main():
     # power_levels = range(14,15,1) #[50, 60] # range(50, 51, 1) #Change to 60
     
     m = 0.45059
-    b = -476.216*(10**-7) #
+    b = -476.216*(10**-7) # fallback when no calibration has been saved
+
+    # Per-wavelength calibration from the cache, interpolated at each OPO wavelength
+    try:
+        pin_calibration = CalibrationCache(CALIBRATION_DIR).load(SETUP, max_age=30)
+        calibration_id = pin_calibration.name
+    except FileNotFoundError:
+        logging.warning(f"No {SETUP} calibration in {CALIBRATION_DIR}, using m={m}, b={b}")
+        pin_calibration = lambda x: calibration(x,m,b)
+        calibration_id = (m, b)
 
     try:
         # Initialize KDC101 stage with its model
@@ -125,39 +144,12 @@ def main():
 # #Attempt 3 - Dynamic Power Tuning for more accurate measurements. It works!!!
          
   
-        for wavelength in wavelengths:
-            opo.SetWavelength(wavelength)
-            time.sleep(1)
-            center = wavelength*0.1
-            start_wavelength = center -20  # Start wavelength for the scan (in nm)
-            stop_wavelength = center +15  # Stop wavelength for the scan (in nm)
-            # wavelength = 15500 # wavelength in angstrons
-            osa.SetStartWavelength(start_wavelength)
-            time.sleep(1)
-            
-            osa.SetStopWavelength(stop_wavelength)
-            time.sleep(1) 
-            
-            for position in hwp_position:
-                
-                time.sleep(1)
-                print('shit here')
-                kdc.SetPosition(position)
-                 
-                time.sleep(1)
-            
-                power = calibration(pm.GetPowerCH1()*1000,m,b)/0.001
-               
-                print("Taking an OSA sweep...")
-               
-                time.sleep(1)  # Time to allow the power to stabilize
-               
-                osa.SingleScan()
-                osa.WaitForSweepFinish()
-               
-                osa.ExportScan("SPM-NA-WG-SERP-L1-D0-{}nm-{:.5f}mW-18dec23.csv".format(center,power))
-               
-            kdc.SetPosition(204)
+        # HWP moves, trace downloads and file writes overlap with the sweeps.
+        # All sweeps of the campaign go to one HDF5 file instead of one CSV each.
+        with SpectrumStore("SPM-NA-WG-SERP-L1-D0-18dec23.h5", device="NA-WG-SERP-L1-D0",
+                           date="18dec23", resolution=resolution, calibration=calibration_id) as store:
+            acquisition = SPMAcquisition(osa, kdc, pm, opo, calibration=pin_calibration)
+            acquisition.run(wavelengths, hwp_position, park_position=204, store=store)
         
 
         
@@ -173,4 +165,4 @@ def main():
         opo.close()
         
 if __name__ == "__main__":
-    main()
+    main(simulate='--simulate' in sys.argv)
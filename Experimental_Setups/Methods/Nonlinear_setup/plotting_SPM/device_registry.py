@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:20:45 2026
+
+Registry of device geometry by chip and label, loaded from layout metadata.
+
+Two YAML layouts are understood. Layout metadata files, one per chip, as in
+layouts/ next to this file:
+
+    chip: NA-WG-STRAIGHT
+    type: huygens
+    units: um                 # or mm; lengths are stored in um
+    devices:
+      L03-D0: {length: 2300, width: 0.5}
+      L04-D0: {length: null}    # not recorded; length is None (NaN in join)
+
+and gdsfactory netlists (Component.get_netlist() written to YAML, or the
+.yml written next to a GDS with with_metadata=True), where every instance
+whose settings carry a length becomes a device named after the instance:
+
+    name: NA-WG-STRAIGHT
+    instances:
+      L03-D0: {component: straight, settings: {length: 2300, width: 0.5}}
+
+Labels are matched without dashes and case, so 'L03-D0' and 'L03D0' are the
+same device:
+
+    registry = DeviceRegistry.from_directory('layouts')
+    registry.get('L03-D0', chip='NA-WG-STRAIGHT').length     # 2300.0 um
+    records = registry.join(index.query(series='NA-WG-STRAIGHT'))
+"""
+
+import os
+import glob
+from collections import namedtuple
+
+import pandas as pd
+import yaml
+
+Device = namedtuple('Device', ['chip', 'label', 'length', 'width', 'type', 'component'])
+
+UNITS = {'nm': 1e-3, 'um': 1.0, 'mm': 1e3, 'cm': 1e4}
+
+
+def label_key(label):
+    return str(label).replace('-', '').replace('_', '').upper()
+
+
+class DeviceRegistry:
+
+    def __init__(self):
+        self.devices = {}  # (chip key, label key) -> Device
+        self.labels = {}   # label key -> [Device, ...] across chips
+
+    def add(self, device):
+        key = (label_key(device.chip), label_key(device.label))
+        if key in self.devices:
+            self.labels[key[1]].remove(self.devices[key])
+        self.devices[key] = device
+        self.labels.setdefault(key[1], []).append(device)
+
+    def load(self, path):
+        """
+        Add the devices of one layout metadata file or gdsfactory netlist.
+        Returns the number of devices added.
+        """
+        with open(path) as f:
+            doc = yaml.safe_load(f) or {}
+        n = len(self.devices)
+        if 'instances' in doc:
+            self._load_netlist(doc, path)
+        else:
+            self._load_layout(doc, path)
+        return len(self.devices) - n
+
+    def _load_layout(self, doc, path):
+        chip = doc.get('chip', os.path.splitext(os.path.basename(path))[0])
+        scale = UNITS[doc.get('units', 'um')]
+        for label, geometry in (doc.get('devices') or {}).items():
+            geometry = geometry or {}
+            length = geometry.get('length')
+            width = geometry.get('width')
+            self.add(Device(chip, label,
+                            None if length is None else float(length)*scale,
+                            None if width is None else float(width)*scale,
+                            geometry.get('type', doc.get('type')),
+                            geometry.get('component')))
+
+    def _load_netlist(self, doc, path):
+        # gdsfactory lengths and widths are in um
+        chip = doc.get('name', os.path.splitext(os.path.basename(path))[0])
+        for name, instance in doc['instances'].items():
+            settings = instance.get('settings') or {}
+            if 'length' not in settings:
+                continue
+            component = instance.get('component')
+            self.add(Device(chip, name, float(settings['length']),
+                            float(settings['width']) if 'width' in settings else None,
+                            instance.get('info', {}).get('type', component), component))
+
+    @classmethod
+    def from_directory(cls, directory, patterns=('*.yml', '*.yaml')):
+        registry = cls()
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(directory, pattern))):
+                registry.load(path)
+        return registry
+
+    def get(self, label, chip=None):
+        """
+        Device with `label`, on `chip` if given. Without a chip the label
+        must be unique across the registry. Raises KeyError if unknown.
+        """
+        if chip is not None:
+            return self.devices[(label_key(chip), label_key(label))]
+        matches = self.labels.get(label_key(label), [])
+        if len(matches) != 1:
+            raise KeyError('{} matches {} devices; give the chip'.format(label, len(matches)))
+        return matches[0]
+
+    def lengths(self, chip):
+        """
+        {label: length in um} of one chip, e.g. for SPMIndex.set_lengths().
+        """
+        return {d.label: d.length for (c, _), d in self.devices.items() if c == label_key(chip)}
+
+    def table(self):
+        return pd.DataFrame(list(self.devices.values()), columns=Device._fields)
+
+    def join(self, measurements, chip='series', label='label'):
+        """
+        Add the geometry columns to a measurement table with chip and label
+        columns, e.g. an SPMIndex query. Existing columns of the same name
+        (such as an empty length) are replaced.
+        """
+        geometry = self.table()
+        geometry['_chip'] = geometry['chip'].map(label_key)
+        geometry['_label'] = geometry['label'].map(label_key)
+        geometry = geometry.drop(columns=['chip', 'label'])
+        left = measurements.drop(columns=[c for c in ['length', 'width', 'type', 'component']
+                                          if c in measurements.columns])
+        left = left.assign(_chip=left[chip].map(label_key), _label=left[label].map(label_key))
+        return left.merge(geometry, on=['_chip', '_label'], how='left').drop(columns=['_chip', '_label'])
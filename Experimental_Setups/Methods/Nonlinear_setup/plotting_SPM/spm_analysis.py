@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:52:18 2026
+
+Vectorized analysis of SPM power series.
+
+All spectra of one device at one pump wavelength are loaded into a single
+(n_power, n_lambda) array on a common wavelength grid, and the per-spectrum
+quantities are computed on the whole array at once:
+
+    index = SPMIndex(...)
+    records = index.query(series='NA-WG-STRAIGHT', label='L03-D0', wavelength=1500)
+    series = analyze_records(records)
+    series.table            # one row per input power, see analyze()
+    series.normalized       # (n_power, n_lambda), peak of every spectrum at 1
+
+The nonlinear phase follows from the RMS broadening of an unchirped
+Gaussian pulse (Agrawal, Nonlinear Fiber Optics, eq. 4.1.14):
+
+    dw_rms/dw0 = sqrt(1 + 4/(3*sqrt(3)) * phi_max**2)
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from spm_index import SPMIndex
+
+SPMSeries = namedtuple('SPMSeries', ['wavelength', 'spectra', 'normalized', 'table'])
+
+
+def mw_to_dbm(power_mw):
+    return 10 * np.log10(power_mw)
+
+
+def common_grid(traces):
+    """
+    Stack (wavelength, level) pairs into one array. Spectra taken with the
+    same OSA settings share their grid and are stacked as they are; others
+    are interpolated onto the grid of the first one.
+
+    Returns (wavelength, spectra) with spectra of shape (n, len(wavelength)).
+    """
+    grid = np.asarray(traces[0][0], dtype=float)
+    spectra = np.empty((len(traces), len(grid)))
+    for i, (x, y) in enumerate(traces):
+        if len(x) == len(grid) and np.allclose(x, grid):
+            spectra[i] = y
+        else:
+            spectra[i] = np.interp(grid, x, y, left=np.nan, right=np.nan)
+    return grid, spectra
+
+
+def analyze(wavelength, spectra, powers, background=5):
+    """
+    Per-spectrum figures of a power series.
+
+    :param wavelength: common grid in nm, shape (n_lambda,)
+    :param spectra: linear spectral power, shape (n_power, n_lambda)
+    :param powers: input power of each spectrum in mW
+    :param background: percentile of each spectrum subtracted as the noise
+        floor before computing widths; None to use the raw levels
+
+    Returns (normalized, table). normalized holds every spectrum divided by
+    its peak. table has one row per spectrum with power_mw, power_dbm,
+    peak, peak_dbm, peak_wavelength, center, rms_width (nm), broadening
+    (rms_width over that of the lowest power) and phi_max (rad).
+    """
+    spectra = np.asarray(spectra, dtype=float)
+    powers = np.asarray(powers, dtype=float)
+
+    peak = np.nanmax(spectra, axis=1)
+    peak_index = np.nanargmax(np.nan_to_num(spectra, nan=-np.inf), axis=1)
+    scale = np.where(peak != 0, peak, 1)
+    normalized = spectra / scale[:, None]
+
+    weights = np.nan_to_num(spectra)
+    if background is not None:
+        weights = weights - np.nanpercentile(spectra, background, axis=1)[:, None]
+    weights = np.clip(weights, 0, None)
+    total = weights.sum(axis=1)
+    total = np.where(total > 0, total, np.nan)
+    center = weights @ wavelength / total
+    rms_width = np.sqrt(np.einsum('ij,ij->i', weights, (wavelength[None, :] - center[:, None])**2) / total)
+
+    # Reference is the lowest power, where SPM is weakest.
+    broadening = rms_width / rms_width[np.argmin(powers)]
+    phi_max = np.sqrt(np.clip(broadening**2 - 1, 0, None) * 3*np.sqrt(3)/4)
+
+    table = pd.DataFrame({'power_mw': powers, 'power_dbm': mw_to_dbm(powers),
+                          'peak': peak, 'peak_dbm': mw_to_dbm(peak),
+                          'peak_wavelength': wavelength[peak_index], 'center': center,
+                          'rms_width': rms_width, 'broadening': broadening, 'phi_max': phi_max})
+    return normalized, table
+
+
+def analyze_records(records, background=5):
+    """
+    Load and analyze the spectra of an SPMIndex query, sorted by power.
+    Extra columns of the records (path, label, wavelength, ...) are kept in
+    the table, with the pump wavelength renamed to pump_wavelength.
+    """
+    records = records.sort_values('power').reset_index(drop=True)
+    grid, spectra = common_grid([SPMIndex.load(r) for r in records.itertuples()])
+    normalized, table = analyze(grid, spectra, records['power'].values, background)
+    meta = records.drop(columns=['power']).rename(columns={'wavelength': 'pump_wavelength'})
+    return SPMSeries(grid, spectra, normalized, pd.concat([meta, table], axis=1))
+
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:05:37 2026
+
+SQLite index of the SPM spectra on disk.
+
+The plotting scripts used to glob a data folder for every device and then
+parse the wavelength and power out of every file name, once per wavelength.
+The index scans a folder once, stores what the file names (and HDF5
+campaign files, see spectrum_store.py) say about each spectrum, and only
+rescans files that are new or changed:
+
+    index = SPMIndex(os.path.join(data_directory, 'spm_index.sqlite'))
+    index.update(data_directory)
+    records = index.query(series='NA-WG-STRAIGHT', label='L03-D0', wavelength=1500)
+    for record in records.itertuples():
+        x, y = index.load(record)
+
+File names handled, as written by SPM_wOPO_control.py over time:
+
+    SPM-NA-WG-STRAIGHT-L03-D0-1500.0nm-0.23869mW-19dec23.csv
+    3-SPM-STRIP-SERP-L01D01500.0nm-0.87378mW-20dec23.csv
+    1-SPM-L00D0-1500.0nm-0.5mW.csv
+"""
+
+import os
+import re
+import glob
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+try:
+    from spectrum_store import SpectrumStore
+except ImportError:
+    SpectrumStore = None
+
+FILENAME = re.compile(r'^(?:(?P<num>\d+)-)?SPM-(?P<device>.*?)-?(?P<wavelength>\d{3,4}\.\d+)nm'
+                      r'-(?P<power>[-+\d.eE]+)mW(?:-(?P<date>[^-]+))?\.csv$')
+LABEL = re.compile(r'(?:^|-)(?P<label>L\d+-?D\d+)$')
+
+COLUMNS = ['path', 'row', 'series', 'label', 'device', 'num', 'length', 'wavelength', 'power',
+           'date', 'mtime']
+
+
+def parse_filename(filename):
+    """
+    Metadata encoded in an SPM file name as a dict, or None if the name does
+    not follow any of the known patterns. Power is in mW, wavelength in nm.
+    """
+    match = FILENAME.match(os.path.basename(filename))
+    if match is None:
+        return None
+    device = match.group('device')
+    label = LABEL.search(device)
+    return {'series': device[:label.start()] if label else device,
+            'label': label.group('label') if label else None,
+            'device': device,
+            'num': int(match.group('num')) if match.group('num') else None,
+            'wavelength': float(match.group('wavelength')),
+            'power': float(match.group('power')),
+            'date': match.group('date')}
+
+
+class SPMIndex:
+
+    def __init__(self, database):
+        """
+        :param database: SQLite file holding the index, created if missing
+        """
+        self.database = database
+        self.db = sqlite3.connect(database)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS spectra (
+                               path TEXT, row INTEGER, series TEXT, label TEXT, device TEXT,
+                               num INTEGER, length REAL, wavelength REAL, power REAL,
+                               date TEXT, mtime REAL, PRIMARY KEY (path, row))''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS spectra_lookup ON spectra (series, label, wavelength)')
+        # Lengths are kept apart so they survive re-indexing; series '' applies to all series.
+        self.db.execute('''CREATE TABLE IF NOT EXISTS lengths (
+                               series TEXT, label TEXT, length REAL, PRIMARY KEY (series, label))''')
+        self.db.commit()
+
+    def _rows_csv(self, path, mtime):
+        meta = parse_filename(path)
+        if meta is None:
+            return []
+        return [dict(meta, path=path, row=-1, length=None, mtime=mtime)]
+
+    def _rows_store(self, path, mtime):
+        if SpectrumStore is None:
+            return []
+        with SpectrumStore(path, 'r') as store:
+            device = str(store.file.attrs.get('device', ''))
+            date = store.file.attrs.get('date', None)
+            sweeps = store.sweeps()
+        label = LABEL.search(device)
+        common = {'series': device[:label.start()] if label else device,
+                  'label': label.group('label') if label else None,
+                  'device': device, 'date': str(date) if date is not None else None,
+                  'path': path, 'length': None, 'mtime': mtime}
+        return [dict(common, row=i, num=int(s['num']), wavelength=float(s['wavelength']),
+                     power=float(s['power'])) for i, s in enumerate(sweeps)]
+
+    def update(self, directory, patterns=('*.csv', '*.h5'), recursive=True, lengths=None):
+        """
+        Bring the index up to date with `directory`: new and modified files
+        are (re)parsed, deleted files are dropped, everything else is left
+        alone. Returns the number of files parsed.
+
+        :param lengths: optional {label: length} mapping applied to the
+            indexed spectra, e.g. {'L03-D0': 2300}
+        """
+        directory = os.path.abspath(directory)
+        files = set()
+        for pattern in patterns:
+            files.update(glob.glob(os.path.join(directory, '**' if recursive else '', pattern),
+                                   recursive=recursive))
+        known = dict(self.db.execute('SELECT path, MAX(mtime) FROM spectra WHERE path LIKE ? GROUP BY path',
+                                     (os.path.join(directory, '') + '%',)))
+
+        changed = []
+        rows = []
+        for path in files:
+            mtime = os.path.getmtime(path)
+            if known.get(path) == mtime:
+                continue
+            changed.append(path)
+            if path.endswith('.h5'):
+                rows.extend(self._rows_store(path, mtime))
+            else:
+                rows.extend(self._rows_csv(path, mtime))
+        removed = [p for p in known if p not in files]
+
+        with self.db:
+            self.db.executemany('DELETE FROM spectra WHERE path = ?', [(p,) for p in changed + removed])
+            self.db.executemany('INSERT INTO spectra ({}) VALUES ({})'.format(
+                ', '.join(COLUMNS), ', '.join(':' + c for c in COLUMNS)), rows)
+            self._apply_lengths()
+        if lengths:
+            self.set_lengths(lengths)
+        return len(changed)
+
+    def _apply_lengths(self):
+        self.db.execute('''UPDATE spectra SET length = (
+                               SELECT l.length FROM lengths l WHERE l.label = spectra.label
+                               AND l.series IN (spectra.series, '') ORDER BY l.series DESC LIMIT 1)
+                           WHERE length IS NULL''')
+
+    def set_lengths(self, lengths, series=None):
+        """
+        Store the physical device length for each label, e.g.
+        {'L03-D0': 2300}, optionally only for one series. Kept for files
+        indexed later as well.
+        """
+        series = '' if series is None else series.rstrip('-')
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO lengths VALUES (?, ?, ?)',
+                                [(series, label, length) for label, length in lengths.items()])
+            self.db.execute('UPDATE spectra SET length = NULL')
+            self._apply_lengths()
+
+    def query(self, series=None, label=None, device=None, wavelength=None, power=None, date=None,
+              num=None, directory=None, order='power'):
+        """
+        Indexed spectra matching all given filters, as a DataFrame sorted by
+        `order`.
+
+        :param series: device family, e.g. 'NA-WG-STRAIGHT'; matches with or
+            without a trailing '-'
+        :param wavelength: center wavelength in nm, or a (min, max) range
+        :param power: input power in mW, or a (min, max) range
+        :param num: repeat number, the leading '<num>-' of the file name
+        :param directory: only files below this folder
+        """
+        where, args = [], []
+        for column, value in [('label', label), ('device', device), ('date', date), ('num', num)]:
+            if value is not None:
+                where.append('{} = ?'.format(column))
+                args.append(value)
+        if series is not None:
+            where.append('RTRIM(series, \'-\') = ?')
+            args.append(series.rstrip('-'))
+        for column, value in [('wavelength', wavelength), ('power', power)]:
+            if value is None:
+                continue
+            if np.ndim(value) == 0:
+                where.append('ABS({} - ?) < 1e-6'.format(column))
+                args.append(float(value))
+            else:
+                where.append('{} BETWEEN ? AND ?'.format(column))
+                args.extend([float(value[0]), float(value[1])])
+        if directory is not None:
+            where.append('path LIKE ?')
+            args.append(os.path.join(os.path.abspath(directory), '') + '%')
+        sql = 'SELECT * FROM spectra'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if order:
+            sql += ' ORDER BY {}'.format(order)
+        return pd.read_sql_query(sql, self.db, params=args)
+
+    @staticmethod
+    def load(record):
+        """
+        (wavelength, level) arrays of one indexed spectrum, from a CSV file
+        or a row of an HDF5 store.
+        """
+        if record.row < 0:
+            data = np.loadtxt(record.path, delimiter='\t', ndmin=2)
+            return data[:, 0], data[:, 1]
+        with SpectrumStore(record.path, 'r') as store:
+            return store.spectrum(int(record.row))
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:12:40 2026
+
+Normalized 2.5D SPM plots for every waveguide type in one call.
+
+The SPM_plot_*_nomalized_2.5D.py scripts differed only in the chip series,
+the devices, the measurement date, the offset between traces, the figure
+style and where the figures go. Those are the entries of PLOTS below, and
+one call plots every device of a type, one figure per pump wavelength:
+
+    plot_devices('NA', data_directory, save_directory)
+    plot_devices('strip', data_directory, save_directory, wavelengths=(1500, 1560, 10))
+
+Figures are rendered on a process pool by FigureRenderer, so calls must sit
+under if __name__ == "__main__".
+"""
+
+import os
+import re
+
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import matplotlib.cm as cm
+
+from spm_index import SPMIndex
+from spm_analysis import analyze_records
+from spm_render import FigureRenderer
+from device_registry import DeviceRegistry
+
+LAYOUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+
+
+def _pump(wavelength):
+    # '1500.0nm' -> 1500
+    return int(re.search(r'\d+', wavelength).group())
+
+
+def draw_reference(fig, data, table, wavelength, offset_step, device, length):
+    # Runs in a render worker; fig is the current figure
+    offset = 0  # Initialize offset for the highest power plot
+
+    for row in table.index[::-1]:  # Reverse the list to start from the highest power
+        input_power_dbm = table['power_dbm'][row]
+        max_y_dbm = table['peak_dbm'][row]  # Peak power in dBm
+        normalized_y = data['normalized'][row] + offset
+
+        plt.plot(data['wavelength'], normalized_y, label=f'Pin={input_power_dbm:.2f}dBm Pout={max_y_dbm:.2f}dBm')
+
+        # Decrement the offset for the next plot so lower powers are below
+        offset -= offset_step
+
+    plt.xlabel('Wavelength (nm)')
+    plt.ylabel('Normalized Spectral Power (a.u.)')
+    plt.title(f'Spectral Measurements at {wavelength} for Reference {device}')
+    plt.legend(loc='upper right')
+
+
+def draw_huygens(fig, data, table, wavelength, offset_step, device, length):
+    # Runs in a render worker; fig is the current figure
+    offset = 0  # Initialize offset for the highest power plot
+
+    for row in table.index[::-1]:  # Reverse the list to start from the highest power
+        input_power_dbm = table['power_dbm'][row]
+        normalized_y = data['normalized'][row] + offset
+
+        plt.plot(data['wavelength'], normalized_y, label=f'P_in={input_power_dbm:.2f}dBm')
+
+        # Decrement the offset for the next plot so lower powers are below
+        offset -= offset_step
+
+    plt.xlabel('Wavelength (nm)', fontsize=24)
+    plt.ylabel('Normalized Spectral Power (a.u.)', fontsize=24)
+    plt.xticks(fontsize=20)
+    plt.yticks(fontsize=20)
+    plt.legend(loc='upper right',fontsize=16)
+    plt.text(_pump(wavelength)-20, 0.8, f'Huygens L={length}um', fontsize=20)
+
+
+def draw_strip(fig, data, table, wavelength, offset_step, device, length):
+    # Runs in a render worker; fig is the current figure
+    offset = 0  # Initialize offset for the highest power plot
+
+    # Create a colormap
+    cmap = cm.plasma
+    colors = cmap(np.linspace(0.1, 0.9, len(table)))
+
+    for counter, row in enumerate(table.index[::-1]):  # Reverse the list to start from the highest power
+        input_power_dbm = table['power_dbm'][row]
+        normalized_y = data['normalized'][row] + offset
+
+        plt.plot(data['wavelength'], normalized_y, label=f'{input_power_dbm:.2f}', color=colors[counter],linewidth=2)
+
+        # Decrement the offset for the next plot so lower powers are below
+        offset -= offset_step
+
+    mpl.rcParams['axes.linewidth'] = 1
+    plt.tick_params(width=2)
+    plt.xlim(data['wavelength'].min(), data['wavelength'].max()-4)
+    plt.ylim(-2.7, 1.1)
+    plt.gca().set_yticks([])
+    plt.gca().set_yticklabels([])
+
+    plt.xlabel('Wavelength (nm)', fontsize=24)
+    plt.ylabel('Normalized Spectral Power (a.u.)', fontsize=24)
+    plt.xticks(fontsize=20)
+    plt.yticks(fontsize=20)
+    plt.legend(title='$\\mathregular{P_{in-avg}}$ (dBm)', title_fontsize = 20, loc='lower left',
+                fontsize=20,handleheight=2.22, bbox_to_anchor=(0, 0.0075), framealpha=1,
+                edgecolor='black', frameon = True, fancybox=True )
+    plt.text(_pump(wavelength)-19.5, 0.8, f'Strip WG L={length}mm', fontsize=24)
+
+
+# Per waveguide type: query, devices, style and file name. length_unit is
+# the unit of the length in the labels (um or mm); the file name is taken
+# relative to the save directory and may use {device}, {length} and
+# {wavelength}.
+PLOTS = {
+    'NA': {'series': 'NA-WG-STRAIGHT', 'date': None,
+           'devices': [f"L0{i}-D0" for i in range(11)],
+           'draw': draw_huygens, 'offset_step': 0.3, 'figsize': (12, 8), 'length_unit': 'um',
+           'filename': 'Huygens SPM L={length}um at {wavelength}.png'},
+    'NA_serp': {'series': 'NA-WG-SERP', 'date': '18dec23',
+                'devices': [f"L{i}-D0" for i in range(5)],
+                'draw': draw_reference, 'offset_step': 0.15, 'figsize': (12, 8), 'length_unit': None,
+                'filename': os.path.join('{device}', 'offset_plot_{wavelength}.png')},
+    'ref': {'series': 'STRIP-SERP', 'date': '20dec23',
+            'devices': [f"L0{i}D0" for i in range(5)],
+            'draw': draw_reference, 'offset_step': 0.15, 'figsize': (12, 8), 'length_unit': None,
+            'filename': os.path.join('{device}', 'offset_plot_{wavelength}.png')},
+    'strip': {'series': 'STRIP-SERP', 'date': '20dec23',
+              'devices': [f"L0{i}D0" for i in range(5)],
+              'draw': draw_strip, 'offset_step': 0.3, 'figsize': (12, 10), 'length_unit': 'mm',
+              'filename': 'Si Strip WG SPM L={length}mm at {wavelength}.png'},
+}
+
+UNITS = {'um': 1.0, 'mm': 1e3}
+
+
+def device_length(registry, device, series, unit):
+    """
+    Length of a device for the labels, in `unit`, or 'unknown' if the
+    layout does not record it.
+    """
+    if unit is None:
+        return None
+    length = registry.get(device, chip=series).length
+    return 'unknown' if length is None else f"{length/UNITS[unit]:g}"
+
+
+def plot_devices(kind, data_directory, save_directory=None, wavelengths=(1500, 1560, 10),
+                 devices=None, renderer=None):
+    """
+    Queue and render the normalized offset plots of every device of one
+    waveguide type.
+
+    :param kind: key of PLOTS, e.g. 'NA', 'NA_serp', 'ref' or 'strip'
+    :param data_directory: folder of the SPM CSV files; the index is kept
+        there and only rescans new or changed files
+    :param save_directory: folder the file names of PLOTS are relative to,
+        the data directory if None
+    :param wavelengths: (first, last, step) pump wavelength in nm
+    :param devices: subset of the devices of the type
+    :param renderer: FigureRenderer to queue on; with one given, rendering
+        is left to the caller so several types can share a pool
+
+    Returns {device: {wavelength: path}}.
+    """
+    plot = PLOTS[kind]
+    save_directory = data_directory if save_directory is None else save_directory
+    index = SPMIndex(os.path.join(data_directory, 'spm_index.sqlite'))
+    index.update(data_directory)
+    registry = DeviceRegistry.from_directory(LAYOUTS)
+    run = renderer is None
+    if run:
+        renderer = FigureRenderer(save_directory)
+
+    start, stop, step = wavelengths
+    saved = {}
+    for device in devices or plot['devices']:
+        # All spectra of the current device, from the index
+        records = index.query(series=plot['series'], label=device, date=plot['date'])
+        length = device_length(registry, device, plot['series'], plot['length_unit'])
+        saved[device] = {}
+        for w in range(start, stop + 1, step):
+            wavelength = f"{w}.0nm"
+            filtered = records[np.isclose(records['wavelength'], w)]
+            if filtered.empty:
+                continue
+
+            # All spectra at this wavelength in one array, ascending power
+            series = analyze_records(filtered)
+            path = os.path.join(save_directory, plot['filename'].format(device=device, length=length,
+                                                                        wavelength=wavelength))
+            saved[device][wavelength] = renderer.add(
+                plot['draw'], path,
+                arrays={'wavelength': series.wavelength, 'normalized': series.normalized},
+                table=series.table[['power_dbm', 'peak_dbm']], figsize=plot['figsize'],
+                wavelength=wavelength, offset_step=plot['offset_step'], device=device, length=length)
+
+    if run:
+        # Only figures whose data or style changed are redrawn
+        renderer.run()
+    return saved
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python spm_plots.py <type> <data directory> [<save directory>]
+    kind, data_directory = sys.argv[1], sys.argv[2]
+    saved = plot_devices(kind, data_directory, sys.argv[3] if len(sys.argv) > 3 else None)
+    for device, paths in saved.items():
+        for wavelength, path in paths.items():
+            print(f'Device: {device}, Wavelength: {wavelength}, Saved Path: {path}')
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:34:06 2026
+
+Parallel rendering of SPM figures.
+
+The plotting scripts queue one job per figure instead of drawing it on the
+spot. A job is a module level draw function, the arrays it needs and its
+parameters:
+
+    renderer = FigureRenderer(save_directory)
+    renderer.add(draw_offsets, os.path.join(save_directory, 'plot_1500.0nm.png'),
+                 arrays={'wavelength': series.wavelength, 'normalized': series.normalized},
+                 table=series.table[['power_dbm']], figsize=(12, 8), offset_step=0.3)
+    saved = renderer.run()
+
+    def draw_offsets(fig, data, table, offset_step):
+        ax = fig.gca()
+        ...
+
+run() renders the queued figures on a process pool with the Agg backend. The
+arrays reach the workers through shared memory rather than being pickled or
+read back from the CSV files. A figure is skipped when its file exists and the
+hash of its inputs, including the source of the draw function, matches the
+last render. Scripts using the renderer must keep their top level code under
+if __name__ == "__main__", since the workers import the script's module.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import inspect
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+Job = namedtuple('Job', ['draw', 'path', 'arrays', 'table', 'figsize', 'params'])
+
+CACHE_FILE = '.render_cache.json'
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render(draw, path, blocks, table, figsize, params):
+    # Runs in a worker: attach to the shared arrays, draw and save.
+    import matplotlib.pyplot as plt
+    handles = []
+    data = {}
+    try:
+        for name, (shm_name, shape, dtype) in blocks.items():
+            shm = shared_memory.SharedMemory(name=shm_name)
+            handles.append(shm)
+            data[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        fig = plt.figure(figsize=figsize)
+        draw(fig, data, table, **params)
+        fig.savefig(path)
+        plt.close(fig)
+    finally:
+        data.clear()
+        for shm in handles:
+            shm.close()
+    return path
+
+
+class FigureRenderer:
+
+    def __init__(self, directory, workers=None):
+        """
+        :param directory: folder holding the hash cache of the last render,
+            usually the one the figures are saved to
+        :param workers: number of processes, os.cpu_count() if None
+        """
+        self.directory = directory
+        self.workers = workers
+        self.jobs = []
+        self.cache_path = os.path.join(directory, CACHE_FILE)
+
+    def add(self, draw, path, arrays=None, table=None, figsize=(12, 8), **params):
+        """
+        Queue one figure, saved to `path` as given (not relative to the
+        renderer's directory). `draw(fig, data, table, **params)` is called
+        in a worker with `data` holding read-only views of `arrays`. Returns
+        the path.
+        """
+        arrays = {k: np.ascontiguousarray(v) for k, v in (arrays or {}).items()}
+        self.jobs.append(Job(draw, path, arrays, table, figsize, params))
+        return path
+
+    @staticmethod
+    def job_hash(job):
+        h = hashlib.sha1()
+        h.update(inspect.getsource(job.draw).encode())
+        for name in sorted(job.arrays):
+            a = job.arrays[name]
+            h.update('{}{}{}'.format(name, a.shape, a.dtype).encode())
+            h.update(a.tobytes())
+        h.update(pickle.dumps((job.table, job.figsize, sorted(job.params.items()))))
+        return h.hexdigest()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def run(self):
+        """
+        Render all queued figures that changed since the last run and clear
+        the queue. Returns the paths of all queued figures, in order.
+        """
+        for folder in {self.directory} | {os.path.dirname(job.path) for job in self.jobs}:
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+        cache = self._load_cache()
+        hashes = [self.job_hash(job) for job in self.jobs]
+        todo = [(job, h) for job, h in zip(self.jobs, hashes)
+                if not (cache.get(job.path) == h and os.path.exists(job.path))]
+
+        blocks = []
+        try:
+            futures = []
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker) as pool:
+                for job, h in todo:
+                    shared = {}
+                    for name, a in job.arrays.items():
+                        shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+                        blocks.append(shm)
+                        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+                        shared[name] = (shm.name, a.shape, a.dtype.str)
+                    futures.append((pool.submit(_render, job.draw, job.path, shared, job.table,
+                                                job.figsize, job.params), job.path, h))
+                for future, path, h in futures:
+                    future.result()
+                    cache[path] = h
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f, indent=1)
+
+        paths = [job.path for job in self.jobs]
+        self.jobs = []
+        return paths
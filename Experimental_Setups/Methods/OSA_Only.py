@@ -15,13 +15,14 @@ import logging
 from OSA import AQ6315B
 from Newport2936R import Newport2936R
 from KDC101 import KDC101
+import power_control
 import csv
 import datetime
 
 
 
 # Constants for power adjustment loop
-MAX_ITERATIONS = 100  # Max iterations for reaching the target power level
+MAX_MOVES = 5  # Max HWP moves for reaching the target power level
 TOLERANCE = 1e-6  # Tolerance for difference between actual and target power level
 
 # Initialize logging
@@ -29,16 +30,10 @@ logging.basicConfig(filename='lab_log.log', level=logging.INFO)
 
 # Function to adjust the power level to the desired value
 def adjust_power_level(target, pm, kdc):
-    iteration = 0
-    while abs(pm.GetPowerCH1() - target) > TOLERANCE:
-        if iteration >= MAX_ITERATIONS:
-            logging.warning("Max iterations reached for power adjustment. Exiting.")
-            return False
-        if pm.GetPowerCH1() < target:
-            kdc.StepFwd()  # Increase power
-        else:
-            kdc.StepBwd()  # Decrease power
-        iteration += 1
+    # Malus-law fit of the HWP on first use, then direct angle plus Newton steps
+    if not power_control.adjust_power_level(target, pm, kdc, atol=TOLERANCE, max_moves=MAX_MOVES):
+        logging.warning("Max moves reached for power adjustment. Exiting.")
+        return False
     return True
 
 def calibration(x,m,b):
@@ -15,6 +15,9 @@ import logging
 from OSA import AQ6315B
 from Newport2936R import Newport2936R
 from KDC101 import KDC101
+from OPO import OPO
+import power_control
+from pin_calibration import PinCalibration, CalibrationCache
 import csv
 import datetime
 
@@ -23,24 +26,22 @@ import datetime
 
 
 # Constants for power adjustment loop
-MAX_ITERATIONS = 100  # Max iterations for reaching the target power level
+MAX_MOVES = 5  # Max HWP moves for reaching the target power level
 TOLERANCE = 1e-6  # Tolerance for difference between actual and target power level
 
+# Where the fitted calibrations go; the acquisition scripts load them from here
+SETUP = 'SPM-OPO'
+CALIBRATION_DIR = 'calibrations'
+
 # Initialize logging
 logging.basicConfig(filename='lab_log.log', level=logging.INFO)
 
 # Function to adjust the power level to the desired value
 def adjust_power_level(target, pm, kdc):
-    iteration = 0
-    while abs(pm.GetPowerCH1() - target) > TOLERANCE:
-        if iteration >= MAX_ITERATIONS:
-            logging.warning("Max iterations reached for power adjustment. Exiting.")
-            return False
-        if pm.GetPowerCH1() < target:
-            kdc.StepFwd()  # Increase power
-        else:
-            kdc.StepBwd()  # Decrease power
-        iteration += 1
+    # Malus-law fit of the HWP on first use, then direct angle plus Newton steps
+    if not power_control.adjust_power_level(target, pm, kdc, atol=TOLERANCE, max_moves=MAX_MOVES):
+        logging.warning("Max moves reached for power adjustment. Exiting.")
+        return False
     return True
 
 # Main function
@@ -52,6 +53,9 @@ def main():
     pm =  Newport2936R(pm_address)
     index_number = 1
     kdc =  KDC101(index_number)
+    serial_port = "COM21"
+    baud_rate = 9600
+    opo = OPO(serial_port, baud_rate)
     
     # Parameters for OSA (Optical Spectrum Analyzer)
     # start_wavelength = 1530  # Start wavelength for the scan (in nm)
@@ -64,11 +68,13 @@ def main():
     
     # Define power levels at which to take OSA sweeps (in mW)
     power_levels = range(10, 120, 10) #Change to 60
+    wavelengths = range(15000, 15601, 100) #OPO wavelengths in angstroms, as in the acquisition scripts
 
     try:
         # Initialize KDC101 stage with its model
         model = 'PRMTZ8'
         kdc.SetStageModel(model)
+        opo.connect()
         
         #kdc.SendHome()
         #kdc.SetPosition(110)  # Initial position set to 160 (arbitrary units)
@@ -77,80 +83,33 @@ def main():
         
         time.sleep(1)
             
-        power_measurements = np.array([['CH1_Power', 'CH2_Power']], dtype=object)
+        power_measurements = np.array([['Wavelength_A', 'CH1_Power', 'CH2_Power']], dtype=object)
 # #Attempt 3 - Dynamic Power Tuning for more accurate measurements. It works!!!
            
-        for level in power_levels:
-            iteration_count = 0
-            max_iterations = 100  # Set a limit to avoid infinite loop
-            
-            print(f"Setting power to {level} mW...")
+        # Tap (CH1, mW) and incident (CH2, W) power, one row per OPO wavelength
+        tap_mw = np.full((len(wavelengths), len(power_levels)), np.nan)
+        pinc_w = np.full((len(wavelengths), len(power_levels)), np.nan)
+
+        for i, wavelength in enumerate(wavelengths):
+            opo.SetWavelength(wavelength)
+            time.sleep(1)
+
+            for j, level in enumerate(power_levels):
+                print(f"Setting power to {level} mW...")
             
-            print(pm.GetPowerCH1())
-            print(level*10**-6)
+                print(pm.GetPowerCH1())
+                print(level*10**-6)
             
-            # while abs(pm.GetPowerCH1() - level*10**-6)/(level*10**-6) > 0.25:  # Adjust to your required precision #Should be > 
-            #     if iteration_count >= max_iterations:
-            #         print("Maximum iterations reached. Breaking the loop.")
-            #         break
-                
-            #     increment = 10000
-        
-            #     if pm.GetPowerCH1() < level*10**-6:
-            #         print("Stepping forward...")
-            #         kdc.StepFwd(increment)
-            #         # kdc.SetPosition(200)
-            #     else:
-            #         print("Stepping backward...")
-            #         kdc.StepBwd(increment)
-            #         # kdc.SetPosition(100)
-                    
-            #     iteration_count += 1
-            #     time.sleep(0.5)  # Time to allow the power to stabilize
-                
-            while abs(pm.GetPowerCH1() - level*10**-6)/(level*10**-6) > 0.10:  # Adjust to your required precision #Should be > 
-                if iteration_count >= max_iterations:
-                    print("Maximum iterations reached. Breaking the loop.")
-                    break
-                
-                increment = 2000
-        
-                if pm.GetPowerCH1() < level*10**-6:
-                    print("Stepping forward...")
-                    kdc.StepFwd(increment)
-                    # kdc.SetPosition(200)
-                else:
-                    print("Stepping backward...")
-                    kdc.StepBwd(increment)
-                    # kdc.SetPosition(100)
-                    
-                iteration_count += 1
-                time.sleep(0.5)  # Time to allow the power to stabilize
-                
-            while abs(pm.GetPowerCH1() - level*10**-6)/(level*10**-6) > 0.025:  # Adjust to your required precision #Should be > 
-                if iteration_count >= max_iterations:
-                    print("Maximum iterations reached. Breaking the loop.")
-                    break
-                
-                increment = 250 # Step which the KDC Cube will take X amount is ~ X degrees
-        
-                if pm.GetPowerCH1() < level*10**-6:
-                    print("Stepping forward...")
-                    kdc.StepFineFwd(increment)
-                    # kdc.SetPosition(200)
-                else:
-                    print("Stepping backward...")
-                    kdc.StepFineBwd(increment)
-                    # kdc.SetPosition(100)
-                    
-                iteration_count += 1
-                time.sleep(0.5)  # Time to allow the power to stabilize
+                # Coarse then fine stepping, now one Malus-law move plus Newton corrections to 2.5%
+                if not power_control.adjust_power_level(level*10**-6, pm, kdc, atol=0, rtol=0.025,
+                                                        max_moves=MAX_MOVES):
+                    print("Maximum moves reached. Keeping the closest power.")
         
  ## Turned off plotting for troubleshooting
-            column1 = pm.GetPowerCH1()
-            column2 = pm.GetPowerCH2() 
-            new_row = np.array([[column1, column2]], dtype=object)
-            power_measurements = np.vstack([power_measurements, new_row])
+                column1, column2 = pm.GetPowerBoth()
+                tap_mw[i, j], pinc_w[i, j] = column1*1000, column2
+                new_row = np.array([[wavelength, column1, column2]], dtype=object)
+                power_measurements = np.vstack([power_measurements, new_row])
 
         with open('power_readingsA2.csv', 'w', newline='') as csvfile:
             # Create a CSV writer object
@@ -163,6 +122,13 @@ def main():
             csvfile.close()
         print(power_measurements)
 
+        # One line Pinc = m*Pref + b per wavelength, saved as a new revision for today
+        pin_calibration = PinCalibration.fit(SETUP, np.array(wavelengths)*0.1, tap_mw, pinc_w,
+                                             power_levels=list(power_levels))
+        path = CalibrationCache(CALIBRATION_DIR).save(pin_calibration)
+        print(f"Calibration {pin_calibration.name} saved to {path}")
+        print(np.column_stack([pin_calibration.wavelengths, pin_calibration.m, pin_calibration.b]))
+
         # # Move the HWP to below 5mW to avoid burning a sample 
         # if pm.GetPowerCH1() < 5*10**-6:
         #     print("Stepping forward...")
@@ -182,6 +148,7 @@ def main():
         pm.close()
         # osa.close()
         kdc.obj.close()
+        opo.close()
         
 if __name__ == "__main__":
     main()
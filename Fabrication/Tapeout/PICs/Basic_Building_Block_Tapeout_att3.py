@@ -7,8 +7,40 @@ from shapely.geometry.polygon import Polygon
 from gdsfactory.cross_section import ComponentAlongPath
 import shapely as sp
 import argparse
+import datetime
+import json
 import numpy as np
 
+MANIFEST_SCHEMA = 1
+
+
+def structure(set_name, index, label, y, length, bends=0, bend_radius=None, bend_type=None, couplers=0,
+              ring_radius=None, gap=None):
+    """
+    Manifest entry of one test structure. Lengths, radii and gaps in um;
+    length is the waveguide between the two facet edge couplers, bends the
+    number of 90 deg bends and couplers the number of in-line inverse tapers.
+    """
+    return {'device': f"{set_name}-{index+1}", 'set': set_name, 'index': index, 'label': label,
+            'y': float(y), 'length': float(length), 'bends': int(bends),
+            'bend_radius': None if bend_radius is None else float(bend_radius), 'bend_type': bend_type,
+            'couplers': int(couplers), 'rings': int(ring_radius is not None),
+            'ring_radius': None if ring_radius is None else float(ring_radius),
+            'gap': None if gap is None else float(gap)}
+
+
+def write_manifest(manifest, gdspath, component, args):
+    """
+    Write the test-structure manifest as JSON next to the GDS, e.g.
+    NOI-BBBs.manifest.json, for the cut-back analysis of the measured die.
+    """
+    path = str(gdspath).rsplit('.', 1)[0] + '.manifest.json'
+    with open(path, 'w') as f:
+        json.dump({'schema': MANIFEST_SCHEMA, 'die': component.name, 'gds': str(gdspath),
+                   'written': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'parameters': vars(args), 'structures': manifest}, f, indent=1)
+    return path
+
 PDK = get_generic_pdk()
 PDK.activate()
 
@@ -16,6 +48,7 @@ PDK.activate()
 def main(args):
 
     c = gf.Component("MKIIIa") # Top Hierarchical Component
+    manifest = [] # One entry per test structure, written next to the GDS
 
     coupler_length = args.coupler_length
     edge_coupling_width = args.edge_coupling_width
@@ -77,10 +110,12 @@ def main(args):
         output_edge_coupler[str(i)] = edge_coupler_array << gf.components.edge_coupler_silicon(length=coupler_length, width1=test_wg_width, width2=edge_coupling_width, with_two_ports=True, cross_section='strip', port_names=('o1', 'o2'), port_types=('optical', 'edge_coupler'), with_bbox=True)
         output_edge_coupler[str(i)].move((die_width-coupler_length, coupler_y_coord[i]))
 
-        text_str_wg[str(i)] = edge_coupler_array << gf.components.text(text=f"test-{i+1}_str-wg_{test_wg_width}um-width_{test_wg_length}um-length", size=10, layer=(1,0))
+        label = f"test-{i+1}_str-wg_{test_wg_width}um-width_{test_wg_length}um-length"
+        text_str_wg[str(i)] = edge_coupler_array << gf.components.text(text=label, size=10, layer=(1,0))
         text_str_wg[str(i)].move((coupler_length/3, coupler_y_coord[i]+25))
 
         gf.routing.route_single(edge_coupler_array, port1=input_edge_coupler[str(i)].ports['o2'], port2=output_edge_coupler[str(i)].ports['o1'], route_width=test_wg_width, cross_section='strip')
+        manifest.append(structure('test_wg', i, label, coupler_y_coord[i], test_wg_length))
 
     
     edge_coupler_array_ref = c.add_ref(edge_coupler_array)
@@ -111,12 +146,15 @@ def main(args):
 
         offset_wg[str(i)].connect('o1', bend_input_edge_coupler[str(i)].ports['o2'])
         
-        gf.routing.route_single(bend_loss_0_measurement, port1=offset_wg[str(i)].ports['o2'], port2=bend_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=(radii_change[i]))
+        route = gf.routing.route_single(bend_loss_0_measurement, port1=offset_wg[str(i)].ports['o2'], port2=bend_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=(radii_change[i]))
         
         straight_length =  die_width-(2*coupler_length)-(2*(radii_change[i]))        #create identifying text for the radii of each bend on the left
         
-        text_bends[str(i)] = bend_loss_0_measurement << gf.components.text(text=f"Two_{radii_change[i]}um-bends_{(die_width/2-(100*i))+gf.routing.route_single(bend_loss_0_measurement, port1=offset_wg[str(i)].ports['o2'], port2=bend_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=(radii_change[i])).length/1000}um-str-wg", size=10, layer=(1,0))
+        label = f"Two_{radii_change[i]}um-bends_{(die_width/2-(100*i))+route.length/1000}um-str-wg"
+        text_bends[str(i)] = bend_loss_0_measurement << gf.components.text(text=label, size=10, layer=(1,0))
         text_bends[str(i)].move((coupler_length/3, bend_coupler_y_coord[i]+25))
+        manifest.append(structure('bend_loss_0', i, label, bend_coupler_y_coord[i], (die_width/2-(100*i))+route.length/1000,
+                                  bends=2, bend_radius=radii_change[i], bend_type='circular'))
     
     bend_loss_0_measurement_ref = c.add_ref(bend_loss_0_measurement)
 
@@ -141,7 +179,8 @@ def main(args):
 
     
     for i in range(straight_loss_wg_rows):
-        text_straight_loss[str(i)] = straight_loss_measurement << gf.components.text(text=f"straight_loss_{die_width-(2*coupler_length)+2*(straight_loss_min_wg_length+length_change[i])}um-straight_with_{straight_loss_bend_radius}um-bends", size=10, layer=(1,0))
+        label = f"straight_loss_{die_width-(2*coupler_length)+2*(straight_loss_min_wg_length+length_change[i])}um-straight_with_{straight_loss_bend_radius}um-bends"
+        text_straight_loss[str(i)] = straight_loss_measurement << gf.components.text(text=label, size=10, layer=(1,0))
         text_straight_loss[str(i)].move((coupler_length/3, straight_loss_coupler_y_coord[i]+25 )) 
 
         straight_loss_input_edge_coupler[str(i)] = straight_loss_measurement << gf.components.edge_coupler_silicon(length=coupler_length, width1=edge_coupling_width, width2=test_wg_width, with_two_ports=True, cross_section='strip', port_names=('o1', 'o2'), port_types=('edge_coupler', 'optical'), with_bbox=True)
@@ -163,7 +202,11 @@ def main(args):
         straight_loss_circular_bends3[str(i)].connect('o2', sraight_loss_wg_2[str(i)].ports['o2'])
         straight_loss_circular_bends4[str(i)].connect('o2', straight_loss_circular_bends3[str(i)].ports['o1'])
 
-        gf.routing.route_single(straight_loss_measurement, port1=straight_loss_circular_bends4[str(i)].ports['o1'], port2=straight_loss_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=straight_loss_bend_radius)
+        route = gf.routing.route_single(straight_loss_measurement, port1=straight_loss_circular_bends4[str(i)].ports['o1'], port2=straight_loss_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=straight_loss_bend_radius)
+        # Two straights, two U-turns of two 90 deg bends each, and the route to the output
+        manifest.append(structure('straight_loss', i, label, straight_loss_coupler_y_coord[i],
+                                  2*(straight_loss_min_wg_length+length_change[i])+4*(np.pi*straight_loss_bend_radius/2)+route.length/1000,
+                                  bends=4, bend_radius=straight_loss_bend_radius, bend_type='circular'))
 #############################################################################################################################################################################################
     # 2nd Confirmation of bend loss measurement
     bend_loss_1_measurement = gf.Component("Bend_loss_measurement_cst_radii")
@@ -214,10 +257,14 @@ def main(args):
     
         bend_loss_1_path[str(i)] = bend_loss_1_measurement << gf.path.extrude(P,layer=(1,0), width=test_wg_width)
         bend_loss_1_path[str(i)].connect('o1', bend_loss_1_input_edge_coupler[str(i)].ports['o2'])
-        gf.routing.route_single(bend_loss_1_measurement, port1=bend_loss_1_path[str(i)].ports['o2'], port2=bend_loss_1_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=bend_loss_1_ring_radii)
+        route = gf.routing.route_single(bend_loss_1_measurement, port1=bend_loss_1_path[str(i)].ports['o2'], port2=bend_loss_1_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=bend_loss_1_ring_radii)
 
-        text_bend_loss_1[str(i)] = bend_loss_1_measurement << gf.components.text(text=f"{4*(2*(i+1))}_bends_of_{bend_loss_1_ring_radii}um-radius_with_{gf.routing.route_single(bend_loss_1_measurement, port1=bend_loss_1_path[str(i)].ports['o2'], port2=bend_loss_1_output_edge_coupler[str(i)].ports['o1'], cross_section='strip', route_width=test_wg_width, radius=bend_loss_1_ring_radii).length/1000}um_straight", size=10, layer=(1,0))
+        label = f"{4*(2*(i+1))}_bends_of_{bend_loss_1_ring_radii}um-radius_with_{route.length/1000}um_straight"
+        text_bend_loss_1[str(i)] = bend_loss_1_measurement << gf.components.text(text=label, size=10, layer=(1,0))
         text_bend_loss_1[str(i)].move((coupler_length/3, bend_loss_1_coupler_y_coord[i]-25))
+        # P keeps growing by eight Euler bends per row
+        manifest.append(structure('bend_loss_1', i, label, bend_loss_1_coupler_y_coord[i], P.length()+route.length/1000,
+                                  bends=4*(2*(i+1)), bend_radius=bend_loss_1_ring_radii, bend_type='euler'))
 
 
     bend_loss_1_coupler = c.add_ref(bend_loss_1_measurement)
@@ -240,8 +287,12 @@ def main(args):
 
     for i in range(TE_inverse_taper_coupler_loss_rows):
         # Add text to identify the edge coupler test
-        text_edge_coupler_test[str(i)] = edge_coupler_test << gf.components.text(text=f"{(2+((i+1)*2))}_TE_Inverse_tapers_with_{die_width-((2+((i+1)*2))*coupler_length)}um_straight", size=10, layer=(1,0))
+        label = f"{(2+((i+1)*2))}_TE_Inverse_tapers_with_{die_width-((2+((i+1)*2))*coupler_length)}um_straight"
+        text_edge_coupler_test[str(i)] = edge_coupler_test << gf.components.text(text=label, size=10, layer=(1,0))
         text_edge_coupler_test[str(i)].move((coupler_length/3, edge_coupler_test_y_coord[i]+25))
+        # The facet pair is common to every structure; count the in-line tapers only
+        manifest.append(structure('inverse_taper', i, label, edge_coupler_test_y_coord[i],
+                                  die_width-((2+((i+1)*2))*coupler_length), couplers=(i+1)*2))
 
 
         inverse_edge_coupler_pair[str(i)] = gf.Component("inverse_edge_coupler_pair_{}".format(i))
@@ -291,8 +342,12 @@ def main(args):
     text_edge_coupler_test= {}
 
     for i in range(crit_coupling_ring_rows):
-        text_str_wg[str(i)] = crit_coupling_ring_res << gf.components.text(text=f"Crit_coupl_with_{crit_coupling_ring_radius}um_ring_radii_with_{int((gap_change[i])*1000)}nm_gap", size=10, layer=(1,0))
+        label = f"Crit_coupl_with_{crit_coupling_ring_radius}um_ring_radii_with_{int((gap_change[i])*1000)}nm_gap"
+        text_str_wg[str(i)] = crit_coupling_ring_res << gf.components.text(text=label, size=10, layer=(1,0))
         text_str_wg[str(i)].move((coupler_length/3, crit_coupling_test_y_coord[i]+25))
+        # Straight bus across the die, the ring at its middle
+        manifest.append(structure('crit_coupling', i, label, crit_coupling_test_y_coord[i], die_width-(2*coupler_length),
+                                  ring_radius=crit_coupling_ring_radius, gap=gap_change[i]))
 
         crit_coupling_edge_coupler_input[str(i)] = crit_coupling_ring_res << gf.components.edge_coupler_silicon(length=coupler_length, width1=edge_coupling_width, width2=test_wg_width, with_two_ports=True, cross_section='strip', port_names=('o1', 'o2'), port_types=('edge_coupler', 'optical'), with_bbox=True)
         crit_coupling_edge_coupler_input[str(i)].move((0, crit_coupling_test_y_coord[i]))
@@ -320,6 +375,7 @@ def main(args):
 ###########################################################################################################################################################################################
     # Now for the writing of the GDS file and viewing it in KLayout. Ensure Klayout is open for the viewing to work with KLive
     gdspath = c.write_gds("NOI-BBBs.gds", precision=1e-9, unit=1e-6,with_metadata=True)
+    write_manifest(manifest, gdspath, c, args)
     gf.show(gdspath)
 
 ###########################################################################################################################################################################################
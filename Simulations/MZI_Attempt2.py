@@ -6,22 +6,25 @@
 import numpy as np
 import pyvisa
 
+from globalsFile import *
+from __santecTSL1__ import *
+from SantecTSL710 import SantecTSL710
+from OSA import AQ6315B
+from osa_stitch import TraceStitcher, source_for, acquire
+
 class OSAController:
 
     def __init__(self):
         self.initialize_instruments()
 
     def initialize_instruments(self):
-        from globalsFile import *
-        from __santecTSL1__ import *
-        from SantecTSL710 import SantecTSL710
-
         # Initialize the VISA resource manager
         rm = pyvisa.ResourceManager()
 
         # Open the laser and OSA resources
         self.laser = SantecTSL710('GPIB0::0::INSTR')
-        self.ANDO = rm.open_resource('GPIB0::1::INSTR')
+        self.osa = AQ6315B('GPIB0::1::INSTR', resource_manager=rm)
+        self.ANDO = self.osa.instrument
 
     def get_trace(self, trace):
         wl = self.ANDO.query('WDAT'+trace).strip().split(',')[1:]
@@ -59,17 +62,12 @@ class OSAController:
         wl, intensity = self.get_trace(trace)
         self.save_trace(wl, intensity, f"{filename_prefix}_{wl[0]}_to_{wl[-1]}")
 
-    def combine_traces(self, filenames, output_filename):
-        combined_data = []
-
-        for filename in filenames:
-            with open(filename + '.txt', 'r') as file:
-                data = [line.strip().split() for line in file.readlines()]
-                combined_data.extend(data)
-
-        with open(output_filename + '.txt', 'w') as output_file:
-            for line in combined_data:
-                output_file.write(" ".join(line) + "\n")
+    def stitched_trace(self, start, stop, window=1.0, overlap=0.2, step=None):
+        # Steps the OSA window with the laser at its centre and blends the
+        # overlaps into one trace, see Drivers/osa_stitch.py
+        stitcher = TraceStitcher(start, stop, step=step, overlap=overlap/2)
+        return acquire(source_for(self.osa), stitcher, window=window, overlap=overlap,
+                       before_sweep=lambda a, b: self.set_laser_wavelength((a + b)/2))
     
     def close_instruments(self):
         self.laser.close()
@@ -79,21 +77,9 @@ class OSAController:
 # Create an instance of the OSAController class
 osa_controller = OSAController()
 
-# Set the initial wavelength range, perform measurements, save traces, and combine them
-# (same as the previous example)
-osa_controller.change_range("1500", "1501")
-osa_controller.set_laser_wavelength(1500)
-osa_controller.perform_measurement_and_save_trace('A', 'filename')
-filenames = ['filename_1500.0_to_1600.0']
-
-for _ in range(5):  # Change the number of iterations as needed
-    osa_controller.increment_wavelength()
-    osa_controller.perform_measurement_and_save_trace('A', 'filename')
-    start_wl = float(osa_controller.ANDO.query('STAWL?'))
-    stop_wl = float(osa_controller.ANDO.query('STPWL?'))
-    filenames.append(f"filename_{start_wl}_to_{stop_wl}")
-
-osa_controller.combine_traces(filenames, 'combined_traces')
+# Sweep 1500-1506 nm in 1 nm windows sharing 0.2 nm and save the stitched trace
+wl, intensity = osa_controller.stitched_trace(1500, 1506, window=1.0, overlap=0.2)
+osa_controller.save_trace(wl, intensity, 'combined_traces')
 
 # Close the laser and OSA connections
 osa_controller.close_instruments()